@@ -4,7 +4,6 @@ import logging
 from omegaconf import OmegaConf
 import os
 import sys
-import numpy as np
 
 
 DIR = os.path.dirname(os.path.realpath(__file__))
@@ -25,30 +24,22 @@ from torch_points3d.metrics.model_checkpoint import ModelCheckpoint
 
 # Utils import
 from torch_points3d.utils.colors import COLORS
+from torch_points3d.utils.prediction_writer import PredictionWriter
 
 log = logging.getLogger(__name__)
 
 
-def save(prefix, predicted):
-    for key, value in predicted.items():
-        filename = os.path.splitext(key)[0]
-        out_file = filename + "_pred"
-        np.save(os.path.join(prefix, out_file), value)
-
-
-def run(model: BaseModel, dataset: BaseDataset, device, output_path):
+def run(model: BaseModel, dataset: BaseDataset, device, writer: PredictionWriter):
     loaders = dataset.test_dataloaders
-    predicted = {}
     for loader in loaders:
-        loader.dataset.name
         with Ctq(loader) as tq_test_loader:
             for data in tq_test_loader:
                 with torch.no_grad():
                     model.set_input(data, device)
                     model.forward()
-                predicted = {**predicted, **dataset.predict_original_samples(data, model.conv_type, model.get_output())}
-
-    save(output_path, predicted)
+                predicted = dataset.predict_original_samples(data, model.conv_type, model.get_output())
+                for filename, prediction in predicted.items():
+                    writer.write(filename, prediction)
 
 
 @hydra.main(config_path="conf/config.yaml")
@@ -79,6 +70,12 @@ def main(cfg):
     # Create dataset and mdoel
     dataset = instantiate_dataset(checkpoint.data_config)
     model = checkpoint.create_model(dataset, weight_name=cfg.weight_name)
+
+    # Files that already have a prediction are skipped when resuming
+    writer = PredictionWriter(cfg.output_path)
+    if cfg.get("skip_existing", False):
+        for test_dataset in dataset.test_dataset:
+            test_dataset.skip(writer.exists)
     log.info(model)
     log.info("Model size = %i", sum(param.numel() for param in model.parameters() if param.requires_grad))
 
@@ -94,10 +91,9 @@ def main(cfg):
     model = model.to(device)
 
     # Run training / evaluation
-    if not os.path.exists(cfg.output_path):
-        os.makedirs(cfg.output_path)
-
-    run(model, dataset, device, cfg.output_path)
+    with writer:
+        run(model, dataset, device, writer)
+    log.info("%i predictions written to %s", writer.num_written, cfg.output_path)
 
 
 if __name__ == "__main__":
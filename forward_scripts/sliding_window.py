@@ -0,0 +1,84 @@
+""" Segmentation of a large point cloud with a trained model and overlapping windows.
+Ctrl+C pauses the inference after the current batch, running the script again resumes it.
+"""
+import os
+import sys
+import signal
+import logging
+import numpy as np
+import torch
+import hydra
+from omegaconf import OmegaConf
+from torch_geometric.data import Data
+
+DIR = os.path.dirname(os.path.realpath(__file__))
+ROOT = os.path.join(DIR, "..")
+sys.path.insert(0, ROOT)
+
+from torch_points3d.datasets.dataset_factory import instantiate_dataset
+from torch_points3d.metrics.model_checkpoint import ModelCheckpoint
+from torch_points3d.inference import SlidingWindowInference
+from torch_points3d.utils.pointcloud_io import read_ply
+
+log = logging.getLogger(__name__)
+
+
+def read_cloud(path):
+    vertex = read_ply(path)["vertex"]
+    data = Data(pos=torch.from_numpy(np.stack([vertex[c] for c in "xyz"], -1).astype(np.float32)))
+    if all(c in vertex.dtype.names for c in ["red", "green", "blue"]):
+        rgb = np.stack([vertex[c] for c in ["red", "green", "blue"]], -1).astype(np.float32) / 255.0
+        data.rgb = torch.from_numpy(rgb)
+    return data
+
+
+@hydra.main(config_path="conf/sliding_window.yaml")
+def main(cfg):
+    OmegaConf.set_struct(cfg, False)
+
+    # Get device
+    device = torch.device("cuda" if (torch.cuda.is_available() and cfg.cuda) else "cpu")
+    log.info("DEVICE : {}".format(device))
+
+    # Enable CUDNN BACKEND
+    torch.backends.cudnn.enabled = cfg.enable_cudnn
+
+    # Checkpoint
+    checkpoint = ModelCheckpoint(cfg.checkpoint_dir, cfg.model_name, cfg.weight_name, strict=True)
+
+    # Create model and datasets
+    dataset = instantiate_dataset(checkpoint.data_config)
+    model = checkpoint.create_model(dataset, weight_name=cfg.weight_name)
+    log.info(model)
+
+    model.eval()
+    if cfg.enable_dropout:
+        model.enable_dropout_in_eval()
+    model = model.to(device)
+
+    engine = SlidingWindowInference(
+        model,
+        cfg.sliding_window.radius,
+        overlap=cfg.sliding_window.overlap,
+        window=cfg.sliding_window.window,
+        transform=dataset.inference_transform,
+        batch_size=cfg.sliding_window.batch_size,
+        device=device,
+        blending=cfg.sliding_window.blending,
+        precompute_multi_scale=cfg.precompute_multi_scale,
+        checkpoint_every=cfg.sliding_window.checkpoint_every,
+    )
+    signal.signal(signal.SIGINT, lambda signum, frame: engine.pause())
+
+    output_dir = os.path.dirname(cfg.output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    labels = engine.run(read_cloud(cfg.input_path), cfg.output_path)
+    if labels is None:
+        log.info("Inference paused, run the script again to resume")
+    else:
+        log.info("Labels written to %s", cfg.output_path)
+
+
+if __name__ == "__main__":
+    main()
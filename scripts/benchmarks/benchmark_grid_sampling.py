@@ -0,0 +1,136 @@
+""" Throughput of the voxel grid sampling (GridSampling3D in mean and last mode, GridSampler) with the fused
+single pass voxelisation against the previous path: shuffle of every tensor in last mode, grid_cluster /
+voxel_grid, consecutive_cluster and group_data with a one hot majority vote of the labels.
+
+    python scripts/benchmarks/benchmark_grid_sampling.py --num_points 100000 1000000 --grid_size 0.05
+"""
+import os
+import re
+import sys
+import time
+import argparse
+import numpy as np
+import torch
+import torch.nn.functional as F
+from torch_scatter import scatter_add, scatter_mean
+from torch_geometric.data import Data
+from torch_geometric.nn import voxel_grid
+from torch_geometric.nn.pool.consecutive import consecutive_cluster
+from torch_geometric.nn.pool.pool import pool_pos, pool_batch
+from torch_cluster import grid_cluster
+
+DIR = os.path.dirname(os.path.realpath(__file__))
+ROOT = os.path.join(DIR, "..", "..")
+sys.path.insert(0, ROOT)
+
+from torch_points3d.core.data_transform import GridSampling3D, shuffle_data
+from torch_points3d.core.spatial_ops import GridSampler
+
+
+def previous_grid_sampling(data, grid_size, mode):
+    if mode == "last":
+        data = shuffle_data(data)
+    coords = (data.pos / grid_size).int()
+    if "batch" not in data:
+        cluster = grid_cluster(coords, torch.tensor([1, 1, 1]))
+    else:
+        cluster = voxel_grid(coords, data.batch, 1)
+    cluster, unique_pos_indices = consecutive_cluster(cluster)
+    num_nodes = data.num_nodes
+    for key, item in data:
+        if bool(re.search("edge", key)):
+            raise ValueError("Edges not supported. Wrong data type.")
+        if torch.is_tensor(item) and item.size(0) == num_nodes:
+            if mode == "last" or key == "batch":
+                data[key] = item[unique_pos_indices]
+            elif key == "y":
+                item_min = item.min()
+                item = F.one_hot(item - item_min)
+                item = scatter_add(item, cluster, dim=0)
+                data[key] = item.argmax(dim=-1) + item_min
+            else:
+                data[key] = scatter_mean(item, cluster, dim=0)
+    return data
+
+
+def previous_grid_sampler(pos, x, batch, grid_size):
+    pool = voxel_grid(pos, batch, grid_size)
+    pool, perm = consecutive_cluster(pool)
+    return pool_pos(pool, x), pool_pos(pool, pos), pool_batch(perm, batch)
+
+
+def make_data(args, num_points, device):
+    torch.manual_seed(0)
+    # Points on a few surfaces of a 10m room so that voxels hold a realistic number of points
+    pos = torch.rand(num_points, 3, device=device) * 10
+    axis = torch.randint(0, 3, (num_points,), device=device)
+    pos[torch.arange(num_points, device=device), axis] = torch.randint(0, 2, (num_points,), device=device).float() * 10
+    batch = torch.arange(args.batch_size, device=device).repeat_interleave(num_points // args.batch_size)
+    batch = torch.cat([batch, batch.new_full((num_points - batch.shape[0],), args.batch_size - 1)])
+    return Data(
+        pos=pos,
+        x=torch.randn(num_points, args.num_features, device=device),
+        y=torch.randint(-1, args.num_classes, (num_points,), device=device),
+        batch=batch,
+    )
+
+
+def timeit(fn, device, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        if device.type == "cuda":
+            torch.cuda.synchronize(device)
+        times.append(time.perf_counter() - start)
+    return np.min(times)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Voxel grid sampling benchmark")
+    parser.add_argument("--num_points", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--grid_size", type=float, default=0.05)
+    parser.add_argument("--batch_size", type=int, default=8)
+    parser.add_argument("--num_features", type=int, default=4)
+    parser.add_argument("--num_classes", type=int, default=20)
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    device = torch.device(args.device)
+    print(
+        "grid size {}, {} features, {} classes on {}".format(
+            args.grid_size, args.num_features, args.num_classes, device
+        )
+    )
+    for num_points in args.num_points:
+        data = make_data(args, num_points, device)
+        single = Data(pos=data.pos, x=data.x, y=data.y)
+        cases = []
+        for mode in ["mean", "last"]:
+            for name, sample in [("", single), (" batch", data)]:
+                transform = GridSampling3D(args.grid_size, mode=mode)
+                cases.append(
+                    (
+                        "GridSampling3D {}{}".format(mode, name),
+                        lambda s=sample, m=mode: previous_grid_sampling(s.clone(), args.grid_size, m),
+                        lambda s=sample, t=transform: t(s.clone()),
+                    )
+                )
+        sampler = GridSampler(subsampling_param=args.grid_size)
+        cases.append(
+            (
+                "GridSampler",
+                lambda: previous_grid_sampler(data.pos, data.x, data.batch, args.grid_size),
+                lambda: sampler.sample(data.pos, data.x, data.batch),
+            )
+        )
+
+        for name, previous, fused in cases:
+            previous_time = timeit(previous, device, args.repeat)
+            fused_time = timeit(fused, device, args.repeat)
+            print(
+                "{:>8} points {:<26} previous {:>10.0f} points/s fused {:>10.0f} points/s (x{:.2f})".format(
+                    num_points, name, num_points / previous_time, num_points / fused_time, previous_time / fused_time
+                )
+            )
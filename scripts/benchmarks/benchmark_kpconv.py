@@ -0,0 +1,103 @@
+""" Peak memory and throughput of the KPConv layers with and without the chunked execution mode (max_memory)
+on random point clouds, forward and backward pass.
+
+    python scripts/benchmarks/benchmark_kpconv.py --num_points 50000 --max_memory 64 256
+"""
+import os
+import sys
+import time
+import resource
+import argparse
+import multiprocessing
+import numpy as np
+import torch
+
+DIR = os.path.dirname(os.path.realpath(__file__))
+ROOT = os.path.join(DIR, "..", "..")
+sys.path.insert(0, ROOT)
+
+from torch_points3d.modules.KPConv.kernels import KPConvLayer, KPConvDeformableLayer
+
+
+def make_inputs(args, device):
+    torch.manual_seed(0)
+    support_points = torch.rand(args.num_points, 3, device=device) * 5
+    query_points = support_points[: args.num_points // 2]
+    neighbors = torch.randint(0, args.num_points, (query_points.shape[0], args.num_neighbors), device=device)
+    neighbors[torch.rand(neighbors.shape, device=device) < 0.1] = -1
+    features = torch.randn(args.num_points, args.in_features, device=device, requires_grad=True)
+    return query_points, support_points, neighbors, features
+
+
+def peak_memory(device):
+    """ Peak memory in bytes, process wide maximum resident set size on the CPU
+    """
+    if device.type == "cuda":
+        return torch.cuda.max_memory_allocated(device)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def run(args, deformable, max_memory, queue):
+    device = torch.device(args.device)
+    layer_cls = KPConvDeformableLayer if deformable else KPConvLayer
+    layer = layer_cls(args.in_features, args.out_features, point_influence=0.1, max_memory=max_memory).to(device)
+    inputs = make_inputs(args, device)
+
+    def step():
+        output = layer(*inputs)
+        output.sum().backward()
+        if device.type == "cuda":
+            torch.cuda.synchronize(device)
+
+    if device.type == "cuda":
+        torch.cuda.reset_peak_memory_stats(device)
+    baseline = peak_memory(device) if device.type == "cpu" else torch.cuda.memory_allocated(device)
+    times = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        step()
+        times.append(time.perf_counter() - start)
+    queue.put((peak_memory(device) - baseline, np.min(times)))
+
+
+def measure(args, deformable, max_memory):
+    """ Each configuration runs in its own process so that CPU peak memory measurements are independent
+    """
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=run, args=(args, deformable, max_memory, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="KPConv chunked execution benchmark")
+    parser.add_argument("--num_points", type=int, default=50000)
+    parser.add_argument("--num_neighbors", type=int, default=34)
+    parser.add_argument("--in_features", type=int, default=64)
+    parser.add_argument("--out_features", type=int, default=64)
+    parser.add_argument("--max_memory", type=int, nargs="+", default=[64, 256], help="Budgets in MB")
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(
+        "{} query points, {} neighbors, {} -> {} features on {}".format(
+            args.num_points // 2, args.num_neighbors, args.in_features, args.out_features, args.device
+        )
+    )
+    for deformable in [False, True]:
+        name = "KPConvDeformableLayer" if deformable else "KPConvLayer"
+        reference = None
+        for max_memory in [None] + [mb * 1024 ** 2 for mb in args.max_memory]:
+            memory, duration = measure(args, deformable, max_memory)
+            throughput = (args.num_points // 2) / duration
+            reference = reference or throughput
+            budget = "full" if max_memory is None else "{} MB".format(max_memory // 1024 ** 2)
+            print(
+                "{:<22} {:>8} peak {:>8.1f} MB {:>10.0f} points/s (x{:.2f})".format(
+                    name, budget, memory / 1024 ** 2, throughput, throughput / reference
+                )
+            )
@@ -0,0 +1,102 @@
+""" Compares the throughput (MB/s) of the point cloud readers of torch_points3d.utils.pointcloud_io with
+pandas and plyfile on synthetic S3DIS-like text files and ScanNet-like ply meshes.
+
+    python scripts/benchmarks/benchmark_pointcloud_io.py --num_points 2000000
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+from plyfile import PlyData, PlyElement
+
+DIR = os.path.dirname(os.path.realpath(__file__))
+ROOT = os.path.join(DIR, "..", "..")
+sys.path.insert(0, ROOT)
+
+from torch_points3d.utils.pointcloud_io import read_txt, read_ply, read_ply_fields, write_ply
+
+
+def timeit(func, repeat):
+    func()  # Warm up (numba compilation, page cache)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return np.min(times)
+
+
+def report(name, size, duration, reference=None):
+    speedup = " (x{:.1f})".format(reference / duration) if reference else ""
+    print("{:<40} {:>9.1f} MB/s{}".format(name, size / 1e6 / duration, speedup))
+
+
+def make_cloud(num_points):
+    pos = (np.random.rand(num_points, 3) * 10).astype("f4")
+    rgb = np.random.randint(0, 255, (num_points, 3)).astype("u1")
+    faces = np.random.randint(0, num_points, (num_points * 2, 3)).astype("i4")
+    return pos, rgb, faces
+
+
+def bench_txt(directory, pos, rgb, repeat):
+    path = os.path.join(directory, "room.txt")
+    np.savetxt(path, np.concatenate([pos, rgb], -1), fmt=["%.3f"] * 3 + ["%d"] * 3)
+    size = os.path.getsize(path)
+    print("Text file: {:.1f} MB".format(size / 1e6))
+    reference = timeit(lambda: pd.read_csv(path, sep=" ", header=None).values, repeat)
+    report("pandas.read_csv", size, reference)
+    report("pointcloud_io.read_txt", size, timeit(lambda: read_txt(path), repeat), reference)
+
+
+def bench_ply(directory, pos, rgb, faces, repeat):
+    path = os.path.join(directory, "mesh.ply")
+    write_ply(path, [pos, rgb], ["x", "y", "z", "red", "green", "blue"], triangular_faces=faces)
+    size = os.path.getsize(path)
+    print("Binary ply file: {:.1f} MB".format(size / 1e6))
+
+    def plyfile_read():
+        vertex = PlyData.read(path)["vertex"].data
+        return np.stack([vertex[k] for k in ["x", "y", "z", "red", "green", "blue"]], -1).astype(np.float32)
+
+    reference = timeit(plyfile_read, repeat)
+    report("plyfile vertices", size, reference)
+    report(
+        "pointcloud_io.read_ply_fields",
+        size,
+        timeit(lambda: read_ply_fields(path, ["x", "y", "z", "red", "green", "blue"]), repeat),
+        reference,
+    )
+    report("pointcloud_io.read_ply (no copy)", size, timeit(lambda: read_ply(path), repeat), reference)
+
+    out_path = os.path.join(directory, "out.ply")
+    vertex_size = pos.nbytes + rgb.nbytes
+
+    def plyfile_write():
+        vertex = np.empty(
+            pos.shape[0], dtype=[("x", "f4"), ("y", "f4"), ("z", "f4"), ("red", "u1"), ("green", "u1"), ("blue", "u1")]
+        )
+        for i, key in enumerate(["x", "y", "z"]):
+            vertex[key] = pos[:, i]
+        for i, key in enumerate(["red", "green", "blue"]):
+            vertex[key] = rgb[:, i]
+        PlyData([PlyElement.describe(vertex, "vertex")]).write(out_path)
+
+    reference = timeit(plyfile_write, repeat)
+    report("plyfile write", vertex_size, reference)
+    duration = timeit(lambda: write_ply(out_path, [pos, rgb], ["x", "y", "z", "red", "green", "blue"]), repeat)
+    report("pointcloud_io.write_ply", vertex_size, duration, reference)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Point cloud IO benchmark")
+    parser.add_argument("--num_points", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pos, rgb, faces = make_cloud(args.num_points)
+    with tempfile.TemporaryDirectory() as directory:
+        bench_txt(directory, pos, rgb, args.repeat)
+        bench_ply(directory, pos, rgb, faces, args.repeat)
@@ -0,0 +1,26 @@
+import os
+import sys
+import argparse
+from glob import glob
+
+DIR = os.path.dirname(os.path.realpath(__file__))
+ROOT = os.path.join(DIR, "..", "..")
+sys.path.insert(0, ROOT)
+
+from torch_points3d.datasets.columnar_storage import convert_to_columnar
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Converts processed datasets (collated .pt files) to columnar storage")
+    parser.add_argument("paths", nargs="+", help="Processed .pt files or processed directories")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        files = sorted(glob(os.path.join(path, "*.pt"))) if os.path.isdir(path) else [path]
+        for f in files:
+            try:
+                convert_to_columnar(f)
+            except ValueError as e:
+                print("Skipping {}: not a collated dataset ({})".format(f, e))
+            else:
+                print("Converted {}".format(f))
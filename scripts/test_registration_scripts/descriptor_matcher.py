@@ -1,7 +1,9 @@
 import pandas as pd
 import hydra
 import numpy as np
-from sklearn.neighbors import KDTree
+import functools
+import multiprocessing
+import torch
 import os
 import os.path as osp
 from omegaconf import OmegaConf
@@ -13,6 +15,8 @@ DIR = os.path.dirname(os.path.realpath(__file__))
 ROOT = os.path.join(DIR, "..", "..")
 sys.path.insert(0, ROOT)
 
+from torch_points3d.metrics.descriptor_matching import match_descriptors
+
 
 def read_gt_log(path):
     """
@@ -37,23 +41,15 @@ def read_gt_log(path):
     return list_pair, list_mat
 
 
-def compute_matches(feature_source, feature_target, kp_source, kp_target, ratio=False, sym=False):
+def compute_matches(feature_source, feature_target, kp_source, kp_target, ratio=None, sym=False):
     """
-    compute matches between features
+    compute matches between features: each target keypoint is matched with the source keypoint
+    of nearest feature. sym only keeps mutual nearest neighbours and ratio applies the ratio test.
     """
 
-    tree_source = KDTree(feature_source)
-    tree_target = KDTree(feature_target)
-    _, nn_ind_source = tree_target.query(feature_source, k=1)
-    _, nn_ind_target = tree_source.query(feature_target, k=1)
-
-    # symetric test
-    if sym:
-        indmatch = np.where(nn_ind_source.T[0][nn_ind_target.T[0]] == np.arange(len(feature_source)))[0]
-    else:
-        indmatch = np.arange(len(feature_target))
-    new_kp_source = np.copy(kp_source[nn_ind_target.T[0][indmatch]])
-    new_kp_target = np.copy(kp_target[indmatch])
+    matches = match_descriptors(feature_target, feature_source, mutual=sym, ratio=ratio).numpy()
+    new_kp_source = np.copy(kp_source[matches[:, 1]])
+    new_kp_target = np.copy(kp_target[matches[:, 0]])
 
     return new_kp_source, new_kp_target
 
@@ -80,25 +76,28 @@ def compute_mean_correct_matches(dist, list_tau, is_leq=True):
     return res
 
 
-def pair_evaluation(path_descr_source, path_descr_target, gt_trans, list_tau, res_path):
+@functools.lru_cache(maxsize=None)
+def load_descriptors(path_descr):
     """
-    save matches (indices)
+    features and positions of the keypoints of a fragment, each fragment is only read once per process
     """
+    data = np.load(path_descr)
+    feat = data["feat"]
+    if len(feat) != len(data["keypoints"]):
+        # Sampled features using keypoints.
+        feat = feat[data["keypoints"]]
+    return feat, data["pcd"][data["keypoints"]]
 
-    data_source = np.load(path_descr_source)
-    data_target = np.load(path_descr_target)
 
-    feat_s = data_source["feat"]
-    feat_t = data_target["feat"]
+def pair_evaluation(path_descr_source, path_descr_target, gt_trans, list_tau, res_path, sym=False, ratio=None):
+    """
+    save matches (indices)
+    """
 
-    if len(data_source["feat"]) != len(data_source["keypoints"]):
-        # Sampled features using keypoints.
-        feat_s = feat_s[data_source["keypoints"]]
-        feat_t = feat_t[data_target["keypoints"]]
+    feat_s, kp_s = load_descriptors(path_descr_source)
+    feat_t, kp_t = load_descriptors(path_descr_target)
 
-    kp_source, kp_target = compute_matches(
-        feat_s, feat_t, data_source["pcd"][data_source["keypoints"]], data_target["pcd"][data_target["keypoints"]],
-    )
+    kp_source, kp_target = compute_matches(feat_s, feat_t, kp_s, kp_t, ratio=ratio, sym=sym)
 
     dist = compute_dists(kp_source, kp_target, gt_trans)
 
@@ -120,16 +119,29 @@ def pair_evaluation(path_descr_source, path_descr_target, gt_trans, list_tau, re
     return dico
 
 
-def compute_recall_scene(scene_name, list_pair, list_trans, list_tau1, list_tau2, res_path):
+def _pair_evaluation(args):
+    return pair_evaluation(*args)
+
+
+def _init_worker():
+    # Pairs are spread over the processes, each matching runs on a single thread
+    torch.set_num_threads(1)
+
+
+def compute_recall_scene(
+    scene_name, list_pair, list_trans, list_tau1, list_tau2, res_path, num_workers=1, sym=False, ratio=None
+):
     """
-    evaluate the recall for each scene
+    evaluate the recall for each scene, pairs are evaluated in num_workers processes
     """
-    list_frac_correct = []
-    list_dico = []
-    for i, pair in enumerate(list_pair):
-        dico = pair_evaluation(pair[0], pair[1], list_trans[i], list_tau1, res_path)
-        list_frac_correct.append(dico["frac_correct"])
-        list_dico.append(dico)
+    list_args = [(pair[0], pair[1], list_trans[i], list_tau1, res_path, sym, ratio) for i, pair in enumerate(list_pair)]
+    if num_workers > 1:
+        with multiprocessing.Pool(num_workers, initializer=_init_worker) as pool:
+            list_dico = list(pool.imap(_pair_evaluation, list_args))
+    else:
+        list_dico = [_pair_evaluation(args) for args in list_args]
+    load_descriptors.cache_clear()
+    list_frac_correct = [dico["frac_correct"] for dico in list_dico]
 
     list_recall = compute_mean_correct_matches(np.asarray(list_frac_correct), list_tau2, is_leq=False)
     print("Save the matches")
@@ -141,7 +153,7 @@ def compute_recall_scene(scene_name, list_pair, list_trans, list_tau1, list_tau2
     return dico
 
 
-def evaluate(path_raw_fragment, path_results, list_tau1, list_tau2):
+def evaluate(path_raw_fragment, path_results, list_tau1, list_tau2, num_workers=1, sym=False, ratio=None):
 
     """
     launch the evaluation procedure
@@ -163,7 +175,9 @@ def evaluate(path_raw_fragment, path_results, list_tau1, list_tau2):
         res_path = osp.join(path_results, "matches", scene)
         if not osp.exists(res_path):
             os.makedirs(res_path, exist_ok=True)
-        dico = compute_recall_scene(scene, list_pair, list_mat, list_tau1, list_tau2, res_path)
+        dico = compute_recall_scene(
+            scene, list_pair, list_mat, list_tau1, list_tau2, res_path, num_workers=num_workers, sym=sym, ratio=ratio
+        )
         list_total_res.append(dico)
     total_recall = np.mean([d["list_recall"] for d in list_total_res], axis=0)
     list_total_res.append(dict(scene_name="total", list_tau2=list_tau2, list_recall=list(total_recall)))
@@ -175,7 +189,15 @@ def evaluate(path_raw_fragment, path_results, list_tau1, list_tau2):
 def main(cfg):
     OmegaConf.set_struct(cfg, False)
     print(cfg)
-    evaluate(cfg.path_raw_fragment, cfg.path_results, cfg.list_tau1, cfg.list_tau2)
+    evaluate(
+        cfg.path_raw_fragment,
+        cfg.path_results,
+        cfg.list_tau1,
+        cfg.list_tau2,
+        num_workers=cfg.get("num_workers", 1),
+        sym=cfg.get("sym", False),
+        ratio=cfg.get("ratio", None),
+    )
 
 
 if __name__ == "__main__":
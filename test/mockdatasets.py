@@ -64,7 +64,7 @@ class MockDataset(torch.utils.data.Dataset):
 
     def set_strategies(self, model):
         strategies = model.get_spatial_ops()
-        transform = MultiScaleTransform(strategies)
+        transform = MultiScaleTransform(strategies, conv_type=model.conv_type)
         self._ms_transform = transform
 
 
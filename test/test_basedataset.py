@@ -161,6 +161,42 @@ class TestDataset(unittest.TestCase):
         repr = "Dataset: MultiTestDataset \n\x1b[0;95mpre_transform \x1b[0m= None\n\x1b[0;95mtest_transform \x1b[0m= None\n\x1b[0;95mtrain_transform \x1b[0m= None\n\x1b[0;95mval_transform \x1b[0m= None\n\x1b[0;95minference_transform \x1b[0m= None\nSize of \x1b[0;95mtrain_dataset \x1b[0m= 10\nSize of \x1b[0;95mtest_dataset \x1b[0m= 10, 20\nSize of \x1b[0;95mval_dataset \x1b[0m= 10\n\x1b[0;95mBatch size =\x1b[0m 5"
         self.assertEqual(dataset.__repr__(), repr)
 
+    def test_point_budget(self):
+        opt = Options()
+        opt.dataset_name = os.path.join(os.getcwd(), "test")
+        opt.dataroot = os.path.join(os.getcwd(), "test")
+        opt.batch_num_points = 40
+
+        sizes = [10, 30, 5, 25, 20, 10, 15, 5, 30, 10]
+
+        class SizedMockDataset(CustomMockDataset):
+            sample_num_points = sizes
+
+            def __getitem__(self, idx):
+                self.num_points = sizes[idx]
+                return super().__getitem__(idx)
+
+        class BudgetDataset(BaseDataset):
+            def __init__(self, dataset_opt):
+                super(BudgetDataset, self).__init__(dataset_opt)
+
+                self.train_dataset = SizedMockDataset(10, 1, 3, 10)
+                self.val_dataset = SizedMockDataset(10, 1, 3, 10)
+
+        dataset = BudgetDataset(opt)
+        model_config = MockModelConfig()
+        model_config.conv_type = "partial_dense"
+        model = MockModel(model_config)
+        dataset.create_dataloaders(model, 5, True, 0, False)
+
+        self.assertEqual(dataset.num_batches["val"], 5)
+        num_samples = 0
+        for batch in dataset.train_dataloader:
+            self.assertLessEqual(batch.pos.shape[0], 40)
+            num_samples += dataset.get_batch_num_samples(batch)
+        self.assertEqual(num_samples, 10)
+        self.assertEqual([batch.pos.shape[0] for batch in dataset.val_dataloader], [40, 30, 30, 20, 40])
+
     def test_normal(self):
         dataset_opt = MockDatasetConfig()
         setattr(dataset_opt, "dataroot", os.path.join(DIR, "temp_dataset"))
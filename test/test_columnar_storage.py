@@ -0,0 +1,86 @@
+import os
+import sys
+import unittest
+import tempfile
+import torch
+from torch_geometric.data import Data, InMemoryDataset
+
+ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from torch_points3d.datasets.columnar_storage import (
+    save_processed,
+    load_processed,
+    convert_to_columnar,
+    columns_dir,
+    save_data_list,
+    load_data_list,
+)
+
+
+class TestColumnarStorage(unittest.TestCase):
+    def setUp(self):
+        self.data_list = [
+            Data(pos=torch.randn((10, 3)), rgb=torch.rand((10, 3)), y=torch.randint(0, 5, (10,))),
+            Data(pos=torch.randn((5, 3)), rgb=torch.rand((5, 3)), y=torch.randint(0, 5, (5,))),
+        ]
+        self.collated = InMemoryDataset.collate(None, self.data_list)
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "train.pt")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _check(self, data, slices):
+        expected_data, expected_slices = self.collated
+        for key in ["pos", "rgb", "y"]:
+            self.assertEqual(data[key].dtype, expected_data[key].dtype)
+            torch.testing.assert_allclose(data[key], expected_data[key])
+            torch.testing.assert_allclose(slices[key], expected_slices[key])
+
+    def test_save_load(self):
+        save_processed(self.collated, self.path, columnar=True)
+        self.assertTrue(os.path.exists(os.path.join(columns_dir(self.path), "pos.bin")))
+        self._check(*load_processed(self.path))
+        self._check(*load_processed(self.path, mmap=False))
+
+    def test_legacy(self):
+        save_processed(self.collated, self.path)
+        self._check(*load_processed(self.path))
+        self.assertFalse(os.path.exists(columns_dir(self.path)))
+
+    def test_convert(self):
+        torch.save(self.collated, self.path)
+        convert_to_columnar(self.path)
+        convert_to_columnar(self.path)
+        self.assertTrue(os.path.exists(columns_dir(self.path)))
+        self._check(*load_processed(self.path))
+
+    def test_convert_on_load(self):
+        torch.save(self.collated, self.path)
+        self._check(*load_processed(self.path, columnar=True))
+        self.assertTrue(os.path.exists(columns_dir(self.path)))
+
+    def _check_list(self, data_list):
+        self.assertEqual(len(data_list), len(self.data_list))
+        for data, expected in zip(data_list, self.data_list):
+            for key in ["pos", "rgb", "y"]:
+                torch.testing.assert_allclose(data[key], expected[key])
+
+    def test_data_list(self):
+        save_data_list(self.data_list, self.path, columnar=True)
+        self.assertTrue(os.path.exists(os.path.join(columns_dir(self.path), "pos.bin")))
+        self._check_list(load_data_list(self.path))
+        self._check_list(load_data_list(self.path, mmap=False))
+
+    def test_data_list_convert_on_load(self):
+        save_data_list(self.data_list, self.path)
+        self._check_list(load_data_list(self.path))
+        self.assertFalse(os.path.exists(columns_dir(self.path)))
+        self._check_list(load_data_list(self.path, columnar=True))
+        self.assertTrue(os.path.exists(columns_dir(self.path)))
+        self._check_list(load_data_list(self.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
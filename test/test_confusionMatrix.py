@@ -1,6 +1,7 @@
 import os
 import sys
 import numpy as np
+import torch
 import unittest
 import tempfile
 import h5py
@@ -46,6 +47,19 @@ class TestConfusionMatrix(unittest.TestCase):
         self.assertAlmostEqual(confusion.get_average_intersection_union(missing_as_one=False), (0.5 + 0.5) / 2)
         self.assertAlmostEqual(confusion.get_average_intersection_union(missing_as_one=True), (0.5 + 1 + 0.5) / 3)
 
+    def test_countPredictedBatch(self):
+        confusion = ConfusionMatrix(3)
+        confusion.count_predicted_batch(np.asarray([0, 1, 2, 2]), np.asarray([0, 2, 2, 1]))
+        confusion.count_predicted_batch(torch.tensor([1, 1]), torch.tensor([1, 2]))
+        npt.assert_array_equal(confusion.get_confusion_matrix(), np.asarray([[1, 0, 0], [0, 1, 2], [0, 1, 1]]))
+        self.assertAlmostEqual(confusion.get_overall_accuracy(), 3 / 6.0)
+        self.assertAlmostEqual(confusion.get_mean_class_accuracy(), (1 + 1 / 3.0 + 1 / 2.0) / 3)
+
+    def test_countPredictedBatchOutOfRange(self):
+        confusion = ConfusionMatrix(3)
+        confusion.count_predicted_batch(torch.tensor([-1, 0, 3, 1, 2, 2]), torch.tensor([0, 3, 1, 1, 2, -1]))
+        npt.assert_array_equal(confusion.get_confusion_matrix(), np.asarray([[0, 0, 0], [0, 1, 0], [0, 0, 1]]))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,57 @@
+import os
+import sys
+import unittest
+import numpy as np
+import torch
+from sklearn.neighbors import KDTree
+
+ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from torch_points3d.metrics.descriptor_matching import nearest_neighbours, match_descriptors
+
+
+class TestDescriptorMatching(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.source = rng.randn(500, 32).astype(np.float32)
+        self.target = rng.randn(400, 32).astype(np.float32)
+        self.dist, self.idx = KDTree(self.target).query(self.source, k=2)
+
+    def test_nearest_neighbours(self):
+        # Small blocks to go through several blocks
+        idx, dist = nearest_neighbours(self.source, self.target, k=2, block_elements=1000)
+        np.testing.assert_array_equal(idx.numpy(), self.idx)
+        np.testing.assert_allclose(dist.numpy(), self.dist ** 2, rtol=1e-4)
+
+    def test_mutual(self):
+        matches = match_descriptors(self.source, self.target, mutual=True).numpy()
+        _, idx_inv = KDTree(self.source).query(self.target, k=1)
+        mutual = np.where(idx_inv[self.idx[:, 0], 0] == np.arange(len(self.source)))[0]
+        np.testing.assert_array_equal(matches[:, 0], mutual)
+        np.testing.assert_array_equal(matches[:, 1], self.idx[mutual, 0])
+
+    def test_ratio(self):
+        matches = match_descriptors(self.source, self.target, ratio=0.9).numpy()
+        kept = np.where(self.dist[:, 0] < 0.9 * self.dist[:, 1])[0]
+        self.assertGreater(len(kept), 0)
+        np.testing.assert_array_equal(matches[:, 0], kept)
+        np.testing.assert_array_equal(matches[:, 1], self.idx[kept, 0])
+
+    def test_batch(self):
+        source, target = torch.from_numpy(self.source), torch.from_numpy(self.target)
+        batch_source = torch.cat([torch.zeros(200), torch.full((300,), 2)]).long()
+        batch_target = torch.cat([torch.zeros(150), torch.ones(50), torch.full((200,), 2)]).long()
+        matches = match_descriptors(source, target, batch_source=batch_source, batch_target=batch_target)
+        self.assertEqual(matches.shape, (500, 2))
+        np.testing.assert_array_equal(batch_source[matches[:, 0]].numpy(), batch_target[matches[:, 1]].numpy())
+        for b in [0, 2]:
+            s, t = batch_source == b, batch_target == b
+            expected = match_descriptors(source[s], target[t]) + torch.tensor(
+                [s.nonzero()[0, 0].item(), t.nonzero()[0, 0].item()]
+            )
+            np.testing.assert_array_equal(matches[batch_source[matches[:, 0]] == b].numpy(), expected.numpy())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,238 @@
+import os
+import sys
+import socket
+import unittest
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+from torch_geometric.data import Data
+
+ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from torch_points3d.datasets.samplers import BalancedRandomSampler, PointBudgetBatchSampler, DistributedSamplerWrapper
+from torch_points3d.metrics.segmentation_tracker import SegmentationTracker
+from torch_points3d.metrics.s3dis_tracker import S3DISTracker
+from torch_points3d.metrics.classification_tracker import ClassificationTracker
+from torch_points3d.metrics.shapenet_part_tracker import ShapenetPartTracker
+from torch_points3d.metrics.registration_tracker import PatchRegistrationTracker, FragmentRegistrationTracker
+from torch_points3d.core.data_transform import SaveOriginalPosId
+from torch_points3d.utils import distributed
+
+WORLD_SIZE = 2
+
+
+class MockDataset:
+    num_classes = 3
+    INV_OBJECT_LABEL = {0: "a", 1: "b", 2: "c"}
+    class_to_segments = {"a": [0, 1], "b": [2]}
+
+    @property
+    def test_data(self):
+        return Data(pos=torch.tensor([[0.0, 0, 0], [1, 0, 0], [2, 0, 0], [3, 0, 0]]), y=torch.tensor([0, 1, 2, 1]))
+
+
+class MockModel:
+    def __init__(self, labels, predictions, loss, origin_ids=None, batch=None):
+        self.labels = labels
+        self.outputs = torch.nn.functional.one_hot(predictions, 3).float()
+        self.loss = loss
+        self.origin_ids = origin_ids
+        self.batch = batch
+        self.device = torch.device("cpu")
+
+    def get_input(self):
+        return {SaveOriginalPosId.KEY: self.origin_ids}
+
+    def get_output(self):
+        return self.outputs
+
+    def get_labels(self):
+        return self.labels
+
+    def get_batch(self):
+        return self.batch
+
+    def get_current_losses(self):
+        return {"loss": self.loss}
+
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("", 0))
+        return s.getsockname()[1]
+
+
+def _run_process(rank, port):
+    os.environ.update(
+        {"MASTER_ADDR": "127.0.0.1", "MASTER_PORT": str(port), "WORLD_SIZE": str(WORLD_SIZE), "RANK": str(rank)}
+    )
+    assert distributed.init_distributed("gloo")
+    assert distributed.get_rank() == rank and distributed.is_main_process() == (rank == 0)
+
+    # Averaged gradients of the shards are the gradients of the whole batch
+    torch.manual_seed(rank)
+    linear = torch.nn.Linear(4, 2)
+    unused = torch.nn.Linear(4, 2)
+    distributed.broadcast_module(linear)
+    torch.manual_seed(10)
+    x = torch.rand(8, 4)
+    linear(x).pow(2).mean().backward()
+    expected = [p.grad.clone() for p in linear.parameters()]
+    linear.zero_grad()
+    linear(x[rank * 4 : (rank + 1) * 4]).pow(2).mean().backward()
+    distributed.all_reduce_gradients(list(linear.parameters()) + list(unused.parameters()))
+    for p, grad in zip(linear.parameters(), expected):
+        torch.testing.assert_allclose(p.grad, grad)
+    assert all(p.grad is None for p in unused.parameters())
+
+    # Confusion matrices and losses of all the processes
+    tracker = SegmentationTracker(MockDataset())
+    if rank == 0:
+        tracker.track(MockModel(torch.tensor([0, 1, 2]), torch.tensor([0, 1, 1]), 1.0))
+        tracker.track(MockModel(torch.tensor([2]), torch.tensor([2]), 2.0))
+    else:
+        tracker.track(MockModel(torch.tensor([1, 1]), torch.tensor([0, 1]), 6.0))
+    tracker.finalise()
+    np.testing.assert_array_equal(tracker.confusion_matrix, [[1, 0, 0], [1, 2, 0], [0, 1, 1]])
+    metrics = tracker.get_metrics()
+    np.testing.assert_allclose(metrics["train_loss"], 3.0)
+    np.testing.assert_allclose(metrics["train_acc"], 100 * 4 / 6.0)
+
+    # A process that evaluated nothing
+    tracker.reset("val")
+    if rank == 0:
+        tracker.track(MockModel(torch.tensor([0, 1]), torch.tensor([0, 1]), 1.0))
+    tracker.finalise()
+    np.testing.assert_array_equal(tracker.confusion_matrix, [[1, 0, 0], [0, 1, 0], [0, 0, 0]])
+    np.testing.assert_allclose(tracker.get_metrics()["val_loss"], 1.0)
+
+    # Votes for the spheres of the test area evaluated by each process, dense and sparse
+    tracker = S3DISTracker(MockDataset(), stage="test")
+    origin_ids = torch.tensor([[0, 1], [1, 2]])[rank]
+    y = MockDataset().test_data.y
+    tracker.track(MockModel(y[origin_ids], y[origin_ids], 1.0, origin_ids), full_res=True, sparse_votes=rank == 0)
+    tracker.finalise(full_res=True)
+    ids, votes = tracker._votes.predicted()
+    assert ids.tolist() == [0, 1, 2]
+    assert votes.tolist() == [[1, 0, 0], [0, 2, 0], [0, 0, 1]]
+    metrics = tracker.get_metrics(verbose=True)
+    np.testing.assert_allclose(metrics["test_vote_miou"], 100)
+    # The last point gets the prediction of its closest voted point, class 2 instead of 1
+    np.testing.assert_allclose(metrics["test_full_vote_miou"], 100 * (1 + 0.5 + 0.5) / 3)
+
+    # A process that voted for nothing
+    tracker.reset("test")
+    if rank == 1:
+        origin_ids = torch.tensor([0, 3])
+        tracker.track(MockModel(y[origin_ids], y[origin_ids], 1.0, origin_ids), full_res=True)
+    tracker.finalise(full_res=True)
+    ids, votes = tracker._votes.predicted()
+    assert ids.tolist() == [0, 3]
+    assert votes.tolist() == [[1, 0, 0], [0, 1, 0]]
+
+    _check_metric_trackers(rank)
+
+
+def _check_metric_trackers(rank):
+    # Mean of the accuracies of all the batches
+    tracker = ClassificationTracker(MockDataset(), stage="val")
+    if rank == 0:
+        tracker.track(MockModel(torch.tensor([0, 1]), torch.tensor([0, 1]), 1.0))
+    else:
+        tracker.track(MockModel(torch.tensor([0, 1, 2]), torch.tensor([1, 1, 1]), 1.0))
+        tracker.track(MockModel(torch.tensor([0, 1]), torch.tensor([1, 0]), 1.0))
+    tracker.finalise()
+    np.testing.assert_allclose(tracker.get_metrics()["val_acc"], (100 + 100 / 3.0 + 0) / 3)
+
+    # Shape ious of all the processes
+    tracker = ShapenetPartTracker(MockDataset(), stage="val")
+    if rank == 0:
+        tracker.track(MockModel(torch.tensor([0, 1]), torch.tensor([0, 1]), 1.0, batch=torch.tensor([0, 0])))
+    else:
+        labels, predictions = torch.tensor([0, 0, 1, 1, 2]), torch.tensor([0, 1, 1, 1, 2])
+        tracker.track(MockModel(labels, predictions, 1.0, batch=torch.tensor([0, 0, 0, 0, 1])))
+    tracker.finalise()
+    metrics = tracker.get_metrics()
+    shape_iou = (0.5 + 2 / 3.0) / 2
+    np.testing.assert_allclose(metrics["val_Cmiou"], 100 * ((1 + shape_iou) / 2 + 1) / 2)
+    np.testing.assert_allclose(metrics["val_Imiou"], 100 * (1 + shape_iou + 1) / 3)
+
+    # Accuracy of the last batch of each process
+    tracker = PatchRegistrationTracker(MockDataset(), stage="val")
+    predictions = torch.tensor([[0, 1, 0, 1], [0, 1, 1, 0]])[rank]
+    tracker.track(MockModel(predictions, predictions, 1.0))
+    tracker.finalise()
+    np.testing.assert_allclose(tracker.get_metrics()["val_acc"], 50)
+
+    tracker = FragmentRegistrationTracker(MockDataset(), stage="val")
+    for hit in [[0.1], [0.2, 0.6]][rank]:
+        tracker._hit_ratio.add(hit)
+    tracker._rot_error.add(rank + 1.0)
+    tracker.finalise()
+    metrics = tracker.get_metrics()
+    np.testing.assert_allclose(metrics["val_hit_ratio"], 0.3)
+    np.testing.assert_allclose(metrics["val_rot_error"], 1.5)
+
+
+class TestDistributedSamplerWrapper(unittest.TestCase):
+    def test_shards(self):
+        labels = np.asarray([0] * 20 + [1] * 3)
+        samplers = [
+            DistributedSamplerWrapper(BalancedRandomSampler(labels), num_replicas=WORLD_SIZE, rank=rank)
+            for rank in range(WORLD_SIZE)
+        ]
+        for epoch in range(2):
+            draws = []
+            for sampler in samplers:
+                sampler.set_epoch(epoch)
+                draws.append(list(sampler))
+                self.assertEqual(len(draws[-1]), len(sampler))
+            # Same sequence drawn by every process, one item out of two each
+            np.random.seed(epoch)
+            expected = list(BalancedRandomSampler(labels))
+            expected.append(expected[0])
+            self.assertEqual(draws, [expected[0::2], expected[1::2]])
+
+    def test_batches(self):
+        num_points = np.asarray([5, 5, 5, 10, 1, 4, 8])
+        for pad in [True, False]:
+            batches = []
+            for rank in range(WORLD_SIZE):
+                batch_sampler = PointBudgetBatchSampler(
+                    torch.utils.data.RandomSampler(range(len(num_points))), num_points, 10
+                )
+                sampler = DistributedSamplerWrapper(batch_sampler, num_replicas=WORLD_SIZE, rank=rank, pad=pad)
+                batches.append(list(sampler))
+            for batch in batches[0] + batches[1]:
+                self.assertLessEqual(num_points[batch].sum(), 10)
+            indices = sorted(i for b in batches[0] + batches[1] for i in b)
+            if pad:
+                self.assertEqual(len(batches[0]), len(batches[1]))
+                self.assertEqual(set(indices), set(range(len(num_points))))
+            else:
+                self.assertIn(len(batches[0]) - len(batches[1]), [0, 1])
+                self.assertEqual(indices, list(range(len(num_points))))
+
+    def test_rng_untouched(self):
+        np.random.seed(0)
+        expected = np.random.rand()
+        np.random.seed(0)
+        list(DistributedSamplerWrapper(BalancedRandomSampler(np.arange(10)), num_replicas=2, rank=0))
+        self.assertEqual(np.random.rand(), expected)
+
+
+class TestDistributed(unittest.TestCase):
+    def test_not_distributed(self):
+        self.assertFalse(distributed.is_distributed())
+        self.assertEqual(distributed.get_world_size(), 1)
+        self.assertEqual(distributed.all_gather_object({"a": 1}), [{"a": 1}])
+        t = torch.ones(3)
+        self.assertIs(distributed.all_reduce_sum(t), t)
+
+    def test_gloo(self):
+        mp.spawn(_run_process, args=(_free_port(),), nprocs=WORLD_SIZE)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import sys
+import unittest
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from torch_points3d.datasets.registration.fusion import TSDFVolume, SparseTSDFVolume, get_view_frustum
+
+INTRINSIC = np.array([[60.0, 0, 32], [0, 60.0, 24], [0, 0, 1]])
+
+
+def look_at(eye, target):
+    z = target - eye
+    z /= np.linalg.norm(z)
+    x = np.cross(z, [0, 0, 1.0])
+    x /= np.linalg.norm(x)
+    pose = np.eye(4)
+    pose[:3, 0], pose[:3, 1], pose[:3, 2], pose[:3, 3] = x, np.cross(z, x), z, eye
+    return pose
+
+
+def render_floor(pose, height=48, width=64):
+    """ Depth image of the plane z = 0
+    """
+    v, u = np.mgrid[0:height, 0:width]
+    rays = np.stack([(u - INTRINSIC[0, 2]) / INTRINSIC[0, 0], (v - INTRINSIC[1, 2]) / INTRINSIC[1, 1]], -1)
+    rays = np.concatenate([rays, np.ones((height, width, 1))], -1) @ pose[:3, :3].T
+    with np.errstate(divide="ignore"):
+        depth = -pose[2, 3] / rays[..., 2]
+    depth[(depth <= 0) | (depth > 4)] = 0
+    return depth
+
+
+class TestSparseTSDFVolume(unittest.TestCase):
+    def test_same_as_dense(self):
+        poses = [look_at(np.array([0.2 * i, -1.0, 1.0]), np.array([1.0, 1.0, 0.0])) for i in range(3)]
+        depths = [render_floor(pose) for pose in poses]
+        frustums = np.concatenate([get_view_frustum(d, INTRINSIC, p) for d, p in zip(depths, poses)], 1)
+        vol_bnds = np.stack([frustums.min(1), frustums.max(1)], 1)
+
+        dense = TSDFVolume(vol_bnds.copy(), 0.05, use_gpu=False)
+        sparse = SparseTSDFVolume(vol_bnds.copy(), 0.05)
+        for depth, pose in zip(depths, poses):
+            dense.integrate(depth, INTRINSIC, pose)
+            sparse.integrate(depth, INTRINSIC, pose)
+
+        tsdf_vol, weight_vol = sparse.get_volume()
+        np.testing.assert_array_equal(tsdf_vol, dense._tsdf_vol_cpu)
+        np.testing.assert_array_equal(weight_vol, dense._weight_vol_cpu)
+        np.testing.assert_array_equal(sparse.get_point_cloud(0.35, 0.0), dense.get_point_cloud(0.35, 0.0))
+        self.assertLess(sparse.num_allocated_blocks, np.prod(sparse._num_blocks))
+
+
+if __name__ == "__main__":
+    unittest.main()
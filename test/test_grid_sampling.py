@@ -12,6 +12,8 @@ DIR_PATH = os.path.dirname(os.path.realpath(__file__))
 sys.path.insert(0, os.path.join(DIR_PATH, ".."))
 
 import torch_points3d.core.data_transform as cT
+from torch_points3d.core.spatial_ops import GridSampler
+from torch_points3d.core.spatial_ops.voxelize import voxelize, voxel_keys, voxel_majority
 
 
 class TestGridSampling3D(unittest.TestCase):
@@ -66,5 +68,44 @@ class TestGridSampling3D(unittest.TestCase):
         self.assertEqual(quantized.pos.dtype, torch.int)
 
 
+class TestVoxelize(unittest.TestCase):
+    def test_voxelize(self):
+        coords = torch.tensor([[0, 0, 0], [1, 0, 0], [0, 0, 0], [0, 1, 0], [1, 0, 0], [0, 0, -1]])
+        cluster, unique_pos_indices, counts = voxelize(coords)
+        # Voxels are ordered by z, then y then x
+        self.assertEqual(cluster.tolist(), [1, 2, 1, 3, 2, 0])
+        self.assertEqual(unique_pos_indices.tolist(), [5, 2, 4, 3])
+        self.assertEqual(counts.tolist(), [1, 2, 2, 1])
+
+        batch = torch.tensor([0, 0, 1, 1, 1, 1])
+        cluster, unique_pos_indices, counts = voxelize(coords, batch)
+        self.assertEqual(cluster.tolist(), [0, 1, 3, 5, 4, 2])
+        self.assertEqual(counts.tolist(), [1] * 6)
+
+        cluster, unique_pos_indices, counts = voxelize(coords, mode="last")
+        self.assertEqual(cluster[unique_pos_indices].tolist(), [0, 1, 2, 3])
+
+    def test_keys(self):
+        coords = torch.randint(-5, 5, (100, 3))
+        keys = voxel_keys(coords)
+        self.assertEqual(torch.unique(keys).shape[0], torch.unique(coords, dim=0).shape[0])
+        with self.assertRaises(ValueError):
+            voxel_keys(torch.tensor([[0, 0, 0], [2 ** 30, 2 ** 30, 2 ** 30]]))
+
+    def test_majority(self):
+        labels = torch.tensor([-1, 2, 2, -1, -1, 0])
+        cluster = torch.tensor([0, 0, 0, 1, 1, 2])
+        self.assertEqual(voxel_majority(labels, cluster, 3).tolist(), [2, -1, 0])
+
+    def test_grid_sampler(self):
+        pos = torch.tensor([[0.0, 0, 0], [0.05, 0, 0], [0.2, 0, 0], [0.0, 0, 0]])
+        x = torch.tensor([[1.0], [3.0], [5.0], [7.0]])
+        batch = torch.tensor([0, 0, 0, 1])
+        new_x, new_pos, new_batch = GridSampler(subsampling_param=0.1).sample(pos, x, batch)
+        self.assertEqual(new_x.flatten().tolist(), [2.0, 5.0, 7.0])
+        npt.assert_almost_equal(new_pos[:, 0].numpy(), [0.025, 0.2, 0.0])
+        self.assertEqual(new_batch.tolist(), [0, 0, 1])
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -11,7 +11,14 @@ from torch_geometric.data import Data
 DIR_PATH = os.path.dirname(os.path.realpath(__file__))
 sys.path.insert(0, os.path.join(DIR_PATH, ".."))
 
-from torch_points3d.datasets.registration.utils import tracked_matches
+from torch_points3d.core.data_transform import GridSampling3D, SaveOriginalPosId
+from torch_points3d.datasets.registration.utils import (
+    tracked_matches,
+    inverse_origin_id,
+    to_transformed_index,
+    to_original_index,
+    compose_origin_id,
+)
 
 
 class TestTrackedMatches(unittest.TestCase):
@@ -26,3 +33,44 @@ class TestTrackedMatches(unittest.TestCase):
         res = tracked_matches(data_s, data_t, pair)
         expected = np.array([[1, 0]])
         npt.assert_array_almost_equal(res.detach().cpu().numpy(), expected)
+
+    def test_random(self):
+        torch.manual_seed(0)
+        ind_source = torch.randperm(1000)[:300]
+        ind_target = torch.randperm(800)[:500]
+        data_s = Data(pos=torch.randn(300, 3), origin_id=ind_source)
+        data_t = Data(pos=torch.randn(500, 3), origin_id=ind_target)
+        pair = torch.stack([torch.randint(0, 1000, (2000,)), torch.randint(0, 800, (2000,))], 1)
+
+        table_s = dict(zip(ind_source.tolist(), range(300)))
+        table_t = dict(zip(ind_target.tolist(), range(500)))
+        expected = [[table_s[i], table_t[j]] for i, j in pair.tolist() if i in table_s and j in table_t]
+        res = tracked_matches(data_s, data_t, pair)
+        self.assertEqual(res.tolist(), expected)
+        self.assertEqual(tracked_matches(data_s, data_t, pair[:0]).shape, (0, 2))
+
+    def test_inverse(self):
+        origin_id = torch.tensor([4, 0, 2])
+        self.assertEqual(inverse_origin_id(origin_id).tolist(), [1, -1, 2, -1, 0])
+        self.assertEqual(inverse_origin_id(origin_id, 7).tolist(), [1, -1, 2, -1, 0, -1, -1])
+        self.assertEqual(to_transformed_index(torch.tensor([2, 3, 4, 10]), origin_id).tolist(), [2, -1, 0, -1])
+        self.assertEqual(to_original_index(torch.tensor([2, 0]), origin_id).tolist(), [2, 4])
+
+    def test_chain(self):
+        pos = torch.rand(2000, 3)
+        data = Data(pos=pos.clone(), x=torch.arange(2000).float().unsqueeze(1))
+        first = GridSampling3D(0.05, mode="last")(SaveOriginalPosId()(data.clone()))
+        first_origin_id = first.origin_id
+        del first.origin_id
+        second = GridSampling3D(0.1, mode="last")(SaveOriginalPosId()(first))
+
+        origin_id = compose_origin_id(first_origin_id, second.origin_id)
+        npt.assert_array_equal(data.x[origin_id].numpy(), second.x.numpy())
+        npt.assert_array_equal(
+            to_original_index(torch.tensor([0, 3]), first_origin_id, second.origin_id).numpy(), origin_id[[0, 3]]
+        )
+        data_s = Data(pos=second.pos, origin_id=origin_id)
+        data_t = Data(pos=pos, origin_id=torch.arange(2000))
+        res = tracked_matches(data_s, data_t, torch.stack([origin_id, origin_id], 1))
+        npt.assert_array_equal(res[:, 0].numpy(), np.arange(len(origin_id)))
+        npt.assert_array_equal(res[:, 1].numpy(), origin_id.numpy())
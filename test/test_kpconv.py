@@ -9,6 +9,7 @@ ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
 sys.path.insert(0, ROOT)
 
 from torch_points3d.modules.KPConv.losses import repulsion_loss, fitting_loss, permissive_loss
+from torch_points3d.modules.KPConv.convolution_ops import KPConv_ops, KPConv_deform_ops, kpconv_chunk_size
 
 
 class TestKPConvLosses(unittest.TestCase):
@@ -39,5 +40,75 @@ class TestKPConvLosses(unittest.TestCase):
         npt.assert_almost_equal(loss, 4 * np.sum(arr_), decimal=3)
 
 
+class TestKPConvChunked(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.support_points = torch.rand(200, 3)
+        self.query_points = self.support_points[:100]
+        self.neighbors = torch.randint(0, 200, (100, 10))
+        self.neighbors[torch.rand(100, 10) < 0.2] = -1
+        self.features = torch.randn(200, 4, requires_grad=True)
+        self.weights = torch.randn(15, 4, 8, requires_grad=True)
+        self.K_points = torch.randn(15, 3) * 0.05
+        self.max_memory = 1e5  # Chunks of 15 to 20 query points
+
+    def _grads(self, outputs):
+        self.features.grad = None
+        self.weights.grad = None
+        sum(o.pow(2).sum() for o in outputs).backward()
+        return [self.features.grad.clone(), self.weights.grad.clone()]
+
+    def test_chunk_size(self):
+        self.assertEqual(kpconv_chunk_size(10, 15, 3, 4, 8, 1), 1)
+        chunk_size = kpconv_chunk_size(10, 15, 3, 4, 8, 1e6)
+        self.assertGreater(chunk_size, kpconv_chunk_size(10, 15, 3, 4, 8, 1e6, deformable=True))
+        self.assertEqual(kpconv_chunk_size(10, 15, 3, 4, 8, 2e6), 2 * chunk_size)
+
+    def test_kpconv(self):
+        for influence in ["constant", "linear", "gaussian"]:
+            outputs = []
+            for max_memory in [None, self.max_memory]:
+                output = KPConv_ops(
+                    self.query_points,
+                    self.support_points,
+                    self.neighbors,
+                    self.features,
+                    self.K_points,
+                    self.weights,
+                    0.1,
+                    influence,
+                    "sum",
+                    max_memory=max_memory,
+                )
+                outputs.append([output.detach()] + self._grads([output]))
+            for full, chunked in zip(*outputs):
+                npt.assert_allclose(chunked.numpy(), full.numpy(), rtol=1e-4, atol=1e-4)
+
+    def test_kpconv_deformable(self):
+        offsets = (torch.randn(100, 15, 3) * 0.02).requires_grad_()
+        modulations = torch.rand(100, 15)
+        outputs = []
+        for max_memory in [None, self.max_memory]:
+            offsets.grad = None
+            output = KPConv_deform_ops(
+                self.query_points,
+                self.support_points,
+                self.neighbors,
+                self.features,
+                self.K_points,
+                offsets,
+                modulations,
+                self.weights,
+                0.1,
+                "linear",
+                "sum",
+                max_memory=max_memory,
+            )
+            grads = self._grads(output)
+            outputs.append([o.detach() for o in output] + grads + [offsets.grad.clone()])
+        for full, chunked in zip(*outputs):
+            npt.assert_allclose(chunked.numpy(), full.numpy(), rtol=1e-4, atol=1e-4)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -10,6 +10,13 @@ from torch_points3d.core.losses.dirichlet_loss import (
     dirichlet_loss,
     _variance_estimator_sparse,
 )
+from torch_points3d.core.losses.metric_losses import (
+    _isin,
+    pdist,
+    pdist_min,
+    ContrastiveHardestNegativeLoss,
+    BatchHardContrastiveLoss,
+)
 
 
 class TestDirichletLoss(unittest.TestCase):
@@ -35,5 +42,78 @@ class TestDirichletLoss(unittest.TestCase):
         self.assertAlmostEqual(loss.item(), sum([0, 4, 4, 1, 2, 1]) / (2 * 6))
 
 
+class TestMetricLosses(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+
+    def test_pdist_min(self):
+        A, B = torch.randn(50, 8), torch.randn(70, 8)
+        dist = torch.cdist(A, B)
+        for block_elements in [1, 100, 10000]:
+            dmin, ind = pdist_min(A, B, "L2", block_elements=block_elements)
+            torch.testing.assert_allclose(ind, dist.argmin(1))
+            torch.testing.assert_allclose(dmin, dist.min(1)[0])
+        torch.testing.assert_allclose(pdist(A, B, "SquareL2"), dist ** 2)
+
+        xyz = torch.rand(50, 3)
+        dmin, ind = pdist_min(A, A, "SquareL2", xyz_A=xyz, xyz_B=xyz, min_dist=0.3, block_elements=64)
+        dist = torch.cdist(A, A) ** 2
+        dist[torch.cdist(xyz, xyz) <= 0.3] = float("inf")
+        torch.testing.assert_allclose(ind, dist.argmin(1))
+        torch.testing.assert_allclose(dmin, dist.min(1)[0])
+
+        dmin, _ = pdist_min(A[:2], A[:2], "SquareL2", xyz_A=xyz[:2], xyz_B=xyz[:2], min_dist=10)
+        self.assertTrue(torch.isinf(dmin).all())
+
+    def test_pdist_min_gradient(self):
+        A, B = torch.randn(20, 4, requires_grad=True), torch.randn(30, 4, requires_grad=True)
+        dmin, _ = pdist_min(A, B, "L2", block_elements=16)
+        dmin.sum().backward()
+        grad_A, grad_B = A.grad.clone(), B.grad.clone()
+        A.grad.zero_(), B.grad.zero_()
+        torch.sqrt(((A.unsqueeze(1) - B.unsqueeze(0)) ** 2).sum(2) + 1e-7).min(1)[0].sum().backward()
+        torch.testing.assert_allclose(grad_A, A.grad)
+        torch.testing.assert_allclose(grad_B, B.grad)
+
+    def test_isin(self):
+        keys = torch.randint(0, 50, (200,))
+        test_keys = torch.randint(0, 50, (30,))
+        expected = (keys.unsqueeze(1) == test_keys.unsqueeze(0)).any(1)
+        self.assertEqual(_isin(keys, test_keys).tolist(), expected.tolist())
+        self.assertFalse(_isin(keys, torch.tensor([], dtype=torch.long)).any())
+
+    def test_contrastive_hardest_negative(self):
+        F0, F1 = torch.randn(40, 8), torch.randn(30, 8)
+        pairs = torch.stack([torch.randperm(40)[:20], torch.randperm(30)[:20]], 1)
+        loss = ContrastiveHardestNegativeLoss(0.1, 1.4, num_pos=100, num_hn_samples=100)(F0, F1, pairs)
+
+        positives = set(map(tuple, pairs.tolist()))
+        posF0, posF1 = F0[pairs[:, 0]], F1[pairs[:, 1]]
+        D01 = torch.sqrt(((posF0.unsqueeze(1) - F1.unsqueeze(0)) ** 2).sum(2) + 1e-7)
+        D10 = torch.sqrt(((posF1.unsqueeze(1) - F0.unsqueeze(0)) ** 2).sum(2) + 1e-7)
+        D01min, D01ind = D01.min(1)
+        D10min, D10ind = D10.min(1)
+        mask0 = torch.tensor([(i, j) not in positives for i, j in zip(pairs[:, 0].tolist(), D01ind.tolist())])
+        mask1 = torch.tensor([(i, j) not in positives for i, j in zip(D10ind.tolist(), pairs[:, 1].tolist())])
+        pos_loss = torch.relu((posF0 - posF1).pow(2).sum(1) - 0.1).mean()
+        neg_loss = (torch.relu(1.4 - D01min[mask0]).pow(2).mean() + torch.relu(1.4 - D10min[mask1]).pow(2).mean()) / 2
+        self.assertAlmostEqual(loss.item(), (pos_loss + neg_loss).item(), places=5)
+
+    def test_batch_hard_contrastive(self):
+        F0, F1, xyz0 = torch.randn(40, 8), torch.randn(30, 8), torch.rand(40, 3)
+        pairs = torch.stack([torch.randperm(40)[:20], torch.randperm(30)[:20]], 1)
+        loss = BatchHardContrastiveLoss(0.1, 1.4, min_dist=0.15)(F0, F1, pairs, xyz0=xyz0)
+
+        posF0, posF1 = F0[pairs[:, 0]], F1[pairs[:, 1]]
+        subxyz0 = xyz0[pairs[:, 0]]
+        false_negative = torch.cdist(subxyz0, subxyz0) > 0.15
+        neg_loss = 0
+        for i in range(len(posF0)):
+            closest = (posF0[i] - posF1[false_negative[i]]).pow(2).sum(1).min()
+            neg_loss += torch.relu(1.4 - closest).pow(2) / len(posF0)
+        pos_loss = torch.relu((posF0 - posF1).pow(2).max(1)[0] - 0.1).pow(2).mean()
+        self.assertAlmostEqual(loss.item(), (pos_loss + neg_loss).item(), places=5)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -99,10 +99,34 @@ class TestModelCheckpoint(unittest.TestCase):
         mock_metrics = {"current_metrics": {"acc": 15}, "stage": "train", "epoch": 11}
         model_checkpoint.save_best_models_under_current_metrics(model, mock_metrics, metric_func)
 
+        model_checkpoint.flush()
         ckp = torch.load(os.path.join(self.run_path, self.model_name + ".pt"))
+        weights = os.path.join(self.run_path, self.model_name + "_weights")
 
-        self.assertEqual(ckp["models"]["best_acc"]["state"].item(), optimal_state)
-        self.assertEqual(ckp["models"]["latest"]["state"].item(), model.state.item())
+        def load_weights(key):
+            return torch.load(os.path.join(weights, ckp["models"][key] + ".pt"))
+
+        self.assertEqual(load_weights("best_acc")["state"].item(), optimal_state)
+        self.assertEqual(load_weights("latest")["state"].item(), model.state.item())
+        self.assertEqual(len(os.listdir(weights)), 2)
+
+    def test_deduplicated_weights(self):
+        self.run_path = os.path.join(DIR, "checkpt")
+        if not os.path.exists(self.run_path):
+            os.makedirs(self.run_path)
+
+        model_checkpoint = ModelCheckpoint(self.run_path, self.model_name, "test", run_config=self.config, resume=False)
+        model = MockModel()
+        metric_func = {"acc": max, "miou": max}
+        mock_metrics = {"current_metrics": {"acc": 12, "miou": 10}, "stage": "test", "epoch": 1}
+        model_checkpoint.save_best_models_under_current_metrics(model, mock_metrics, metric_func)
+        mock_metrics = {"current_metrics": {"acc": 12}, "stage": "train", "epoch": 1}
+        model_checkpoint.save_best_models_under_current_metrics(model, mock_metrics, metric_func)
+        model_checkpoint.flush()
+
+        ckp = torch.load(os.path.join(self.run_path, self.model_name + ".pt"))
+        self.assertEqual(len(set(ckp["models"].values())), 1)
+        self.assertEqual(len(os.listdir(os.path.join(self.run_path, self.model_name + "_weights"))), 1)
 
     def tearDown(self):
         if os.path.exists(self.run_path):
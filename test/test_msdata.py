@@ -4,7 +4,7 @@ import torch.testing as tt
 from torch_geometric.data import Data
 
 
-from torch_points3d.datasets.multiscale_data import MultiScaleBatch, MultiScaleData
+from torch_points3d.datasets.multiscale_data import MultiScaleBatch, MultiScaleData, from_data_list_token
 
 
 class TestMSData(unittest.TestCase):
@@ -43,3 +43,17 @@ class TestMSData(unittest.TestCase):
         tt.assert_allclose(ms_batches[0].batch, torch.tensor([0, 1]))
         tt.assert_allclose(ms_batches[1].batch, torch.tensor([0, 1]))
         tt.assert_allclose(ms_batches[1].x, torch.tensor([4, 8]))
+
+    def test_batch_token(self):
+        d1 = Data(pos=torch.zeros(3, 3), idx_neighboors=torch.tensor([[0, 2], [1, -1], [-1, -1]]))
+        d2 = Data(pos=torch.zeros(2, 3), idx_neighboors=torch.tensor([[1, 0], [0, -1]]))
+        for d in [d1, d2]:
+            setattr(d, "__inc__", lambda key, item: 3 if key == "idx_neighboors" else 0)
+        batch = from_data_list_token([d1, d2], follow_batch=["pos"])
+        tt.assert_allclose(batch.idx_neighboors, torch.tensor([[0, 2], [1, -1], [-1, -1], [4, 3], [3, -1]]))
+        tt.assert_allclose(batch.batch, torch.tensor([0, 0, 0, 1, 1]))
+        tt.assert_allclose(batch.pos_batch, torch.tensor([0, 0, 0, 1, 1]))
+        self.assertEqual(batch.__slices__["idx_neighboors"], [0, 3, 5])
+
+        # Inputs are not modified
+        tt.assert_allclose(d2.idx_neighboors, torch.tensor([[1, 0], [0, -1]]))
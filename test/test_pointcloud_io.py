@@ -0,0 +1,46 @@
+import os
+import sys
+import unittest
+import tempfile
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from torch_points3d.utils.pointcloud_io import read_txt, read_ply, read_ply_fields, write_ply
+
+
+class TestPointCloudIO(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pos = np.random.randn(100, 3).astype(np.float32)
+        self.rgb = np.random.randint(0, 255, (100, 3)).astype(np.uint8)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_read_txt(self):
+        path = os.path.join(self.tmp.name, "room.txt")
+        values = np.round(np.random.randn(50, 6) * 100, 3)
+        np.savetxt(path, values, fmt="%.3f")
+        np.testing.assert_allclose(read_txt(path), values)
+
+    def test_ply_roundtrip(self):
+        for byte_order in ["<", ">"]:
+            path = os.path.join(self.tmp.name, "cloud.ply")
+            write_ply(path, [self.pos, self.rgb], ["x", "y", "z", "red", "green", "blue"], byte_order=byte_order)
+            np.testing.assert_equal(read_ply_fields(path, ["x", "y", "z"]), self.pos)
+            vertex = read_ply(path)["vertex"]
+            np.testing.assert_equal(vertex["red"], self.rgb[:, 0])
+            self.assertEqual(vertex["red"].dtype, np.uint8)
+
+    def test_ply_faces(self):
+        path = os.path.join(self.tmp.name, "mesh.ply")
+        faces = np.random.randint(0, 100, (20, 3)).astype(np.int32)
+        write_ply(path, [self.pos], ["x", "y", "z"], triangular_faces=faces)
+        elements = read_ply(path)
+        np.testing.assert_equal(elements["face"]["vertex_indices"], faces)
+
+
+if __name__ == "__main__":
+    unittest.main()
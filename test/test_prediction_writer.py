@@ -0,0 +1,35 @@
+import os
+import sys
+import tempfile
+import unittest
+import numpy as np
+
+DIR = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(DIR, ".."))
+
+from torch_points3d.utils.prediction_writer import PredictionWriter
+
+
+class TestPredictionWriter(unittest.TestCase):
+    def test_write(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with PredictionWriter(directory, max_pending=1) as writer:
+                self.assertFalse(writer.exists("example1.txt"))
+                for i in range(5):
+                    writer.write("example{}.txt".format(i), np.full((3, 4), i))
+            self.assertEqual(writer.num_written, 5)
+            self.assertTrue(writer.exists("example1.txt"))
+            np.testing.assert_array_equal(np.load(os.path.join(directory, "example3_pred.npy")), np.full((3, 4), 3))
+            self.assertEqual(len(os.listdir(directory)), 5)
+
+    def test_error(self):
+        with tempfile.TemporaryDirectory() as directory:
+            writer = PredictionWriter(os.path.join(directory, "out"))
+            os.rmdir(writer.output_dir)
+            writer.write("example.txt", np.zeros(3))
+            with self.assertRaises(RuntimeError):
+                writer.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import sys
+import json
+import tempfile
+import time
+import unittest
+import torch
+from torch_geometric.transforms import Compose
+
+ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from torch_points3d.utils.profiler import StageProfiler, set_profiler, profile_stage
+
+
+class Sleep:
+    def __init__(self, duration):
+        self.duration = duration
+
+    def __call__(self, x):
+        time.sleep(self.duration)
+        return x
+
+
+class RangeDataset(torch.utils.data.Dataset):
+    def __init__(self, transform):
+        self.transform = transform
+
+    def __len__(self):
+        return 12
+
+    def __getitem__(self, idx):
+        return self.transform(torch.tensor([idx]))
+
+
+class MockTracker:
+    def __init__(self):
+        self.published = []
+
+    def publish_profile(self, profile, step):
+        self.published.append((profile, step))
+
+
+class TestStageProfiler(unittest.TestCase):
+    def test_percentiles(self):
+        profiler = StageProfiler()
+        for i in range(1, 101):
+            profiler.record("stage", i * 1e-3)
+        stats = profiler.summary()["stage"]
+        self.assertEqual(stats["count"], 100)
+        self.assertAlmostEqual(stats["mean"], 50.5, places=5)
+        self.assertAlmostEqual(stats["p50"], 50, delta=50 * 0.06)
+        self.assertAlmostEqual(stats["p90"], 90, delta=90 * 0.06)
+
+        profiler.reset()
+        self.assertEqual(profiler.summary(), {})
+
+    def test_workers(self):
+        profiler = StageProfiler(num_workers=2)
+        transform = profiler.wrap_transform(Compose([Sleep(0.001), Sleep(0.01), Sleep(0.001)]))
+        self.assertEqual(profiler.stages, ["transform/Sleep", "transform/Sleep_2", "transform/Sleep_3"])
+        loader = torch.utils.data.DataLoader(RangeDataset(transform), batch_size=3, num_workers=2)
+        loader.collate_fn = profiler.wrap(loader.collate_fn, "collate")
+        set_profiler(profiler)
+        try:
+            for _ in loader:
+                with profile_stage("forward"):
+                    pass
+        finally:
+            set_profiler(None)
+
+        summary = profiler.summary()
+        self.assertEqual(summary["transform/Sleep"]["count"], 12)
+        self.assertEqual(summary["collate"]["count"], 4)
+        self.assertEqual(summary["forward"]["count"], 4)
+        self.assertGreater(summary["transform/Sleep_2"]["p50"], 9)
+
+        tracker = MockTracker()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "profile.json")
+            profiler.publish(0, "train", tracker, path)
+            with open(path, "r") as f:
+                history = json.load(f)
+        self.assertEqual(history[0]["stage"], "train")
+        self.assertEqual(history[0]["stages"]["collate"]["count"], 4)
+        self.assertEqual(tracker.published[0][1], 0)
+        self.assertEqual(profiler.summary(), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -8,6 +8,10 @@ from torch_points3d.metrics.registration_metrics import fast_global_registration
 from torch_points3d.metrics.registration_metrics import compute_hit_ratio
 from torch_points3d.metrics.registration_metrics import compute_transfo_error
 from torch_points3d.metrics.registration_metrics import rodrigues
+from torch_points3d.metrics.registration_metrics import estimate_transfo_batch
+from torch_points3d.metrics.registration_metrics import fast_global_registration_batch
+from torch_points3d.metrics.registration_metrics import compute_hit_ratio_batch
+from torch_points3d.metrics.registration_metrics import compute_transfo_error_batch
 from torch_points3d.core.data_transform import euler_angles_to_rotation_matrix
 
 
@@ -77,5 +81,56 @@ class TestRegistrationMetrics(unittest.TestCase):
         npt.assert_allclose(rre.item(), 30, rtol=1e-3)
 
 
+def rand_pairs(sizes):
+    list_T = []
+    list_a = []
+    list_b = []
+    for size in sizes:
+        a = torch.randn(size, 3)
+        T = torch.eye(4)
+        T[:3, :3] = euler_angles_to_rotation_matrix(torch.rand(3) * np.pi)
+        T[:3, 3] = torch.rand(3)
+        list_a.append(a)
+        list_b.append(a.mm(T[:3, :3].T) + T[:3, 3])
+        list_T.append(T)
+    batch = torch.cat([torch.full((size,), i, dtype=torch.long) for i, size in enumerate(sizes)])
+    return torch.cat(list_a), torch.cat(list_b), batch, torch.stack(list_T)
+
+
+class TestRegistrationMetricsBatch(unittest.TestCase):
+    def test_estimate_transfo_batch(self):
+        a, b, batch, T_gt = rand_pairs([100, 50, 80])
+        T_pred = estimate_transfo_batch(a, b, batch)
+        npt.assert_allclose(T_pred.numpy(), T_gt.numpy(), rtol=1e-3, atol=1e-4)
+
+    def test_fast_global_registration_batch(self):
+        a, b, batch, T_gt = rand_pairs([100, 50, 80])
+        b[[1, 5, 20, 120, 170, 200]] *= 42
+        T_pred = fast_global_registration_batch(a, b, batch, num_batches=4)
+        npt.assert_allclose(T_pred[:3].numpy(), T_gt.numpy(), rtol=1e-3, atol=1e-4)
+        for i in range(3):
+            mask = batch == i
+            npt.assert_allclose(
+                T_pred[i].numpy(), fast_global_registration(a[mask], b[mask]).numpy(), rtol=1e-3, atol=1e-4
+            )
+        # No correspondences
+        npt.assert_allclose(T_pred[3].numpy(), np.eye(4))
+
+    def test_compute_hit_ratio_batch(self):
+        a, b, batch, T_gt = rand_pairs([100, 50])
+        b[[1, 5, 20, 32, 74, 120, 130]] += 42
+        hit = compute_hit_ratio_batch(a, b, T_gt, batch, 0.1)
+        npt.assert_allclose(hit.numpy(), [0.95, 0.96], rtol=1e-6)
+
+    def test_compute_transfo_error_batch(self):
+        _, _, _, T_gt = rand_pairs([1, 1])
+        T_pred = T_gt.clone()
+        T_pred[1, :3, :3] = T_pred[1, :3, :3] @ rodrigues(torch.tensor([0.0, 0.0, 1.0]), 30 * np.pi / 180)
+        T_pred[1, 0, 3] += 1
+        rte, rre = compute_transfo_error_batch(T_gt, T_pred)
+        npt.assert_allclose(rte.numpy(), [0, 1], atol=1e-5)
+        npt.assert_allclose(rre.numpy(), [0, 30], atol=1e-1)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -6,7 +6,10 @@ from torch_points3d.core.spatial_ops import (
     RandomSampler,
     RadiusNeighbourFinder,
     MultiscaleRadiusNeighbourFinder,
+    DenseRadiusNeighbourFinder,
+    get_neighbour_backend,
 )
+from torch_points3d.core.spatial_ops.hash_grid import hash_grid_radius
 
 
 class TestSampler(unittest.TestCase):
@@ -95,5 +98,68 @@ class TestNeighboorhoodSearch(unittest.TestCase):
             nei_finder(x, y, batch_x, batch_y, 10)
 
 
+class TestHashGridSearch(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.x = torch.rand(1000, 3)
+        self.batch_x = (torch.arange(1000) >= 600).long()
+        self.y = self.x[::4] + 0.01
+        self.batch_y = self.batch_x[::4]
+
+    def brute_force(self, radius, k):
+        sq_dist = torch.cdist(self.y, self.x) ** 2
+        sq_dist[self.batch_y.unsqueeze(-1) != self.batch_x] = float("inf")
+        idx = torch.full((self.y.shape[0], k), -1, dtype=torch.long)
+        for i in range(self.y.shape[0]):
+            neighbours = torch.nonzero(sq_dist[i] <= radius ** 2).flatten()
+            neighbours = neighbours[torch.argsort(sq_dist[i, neighbours])][:k]
+            idx[i, : neighbours.shape[0]] = neighbours
+        return idx
+
+    def test_partial_dense(self):
+        for k in [4, 32]:
+            idx, sq_dist = hash_grid_radius(self.x, self.y, 0.1, k, self.batch_x, self.batch_y)
+            self.assertEqual(idx.shape, (250, k))
+            torch.testing.assert_allclose(idx, self.brute_force(0.1, k))
+            self.assertTrue(torch.all((sq_dist >= 0) == (idx >= 0)))
+
+            serial, _ = hash_grid_radius(self.x, self.y, 0.1, k, self.batch_x, self.batch_y, parallel=False)
+            torch.testing.assert_allclose(serial, idx)
+
+    def test_formats(self):
+        partial_dense = RadiusNeighbourFinder(0.1, 8, conv_type="partial_dense", backend="hash_grid")(
+            self.x, self.y, self.batch_x, self.batch_y
+        )
+        edges = RadiusNeighbourFinder(0.1, 8, backend="hash_grid")(self.x, self.y, self.batch_x, self.batch_y)
+        self.assertEqual(edges.shape, (2, (partial_dense >= 0).sum()))
+        for i in [0, 10, 200]:
+            torch.testing.assert_allclose(edges[1, edges[0] == i], partial_dense[i][partial_dense[i] >= 0])
+
+        x = torch.rand(2, 100, 3)
+        y = x[:, :20]
+        dense = DenseRadiusNeighbourFinder(0.2, 8, backend="hash_grid")(x, y)
+        self.assertEqual(dense.shape, (2, 20, 8))
+        self.assertEqual(dense.min().item(), 0)
+        self.assertLess(dense.max().item(), 100)
+        for b in range(2):
+            expected = hash_grid_radius(x[b], y[b], 0.2, 8)[0]
+            expected = torch.where(expected >= 0, expected, expected[:, :1])
+            torch.testing.assert_allclose(dense[b], expected)
+
+    def test_2d(self):
+        x = torch.Tensor([[-1, -1], [-1, 1], [1, -1], [1, 1]])
+        y = torch.Tensor([[-1, 0], [1, 0]])
+        batch = torch.tensor([0, 0, 0, 0])
+        nei_finder = MultiscaleRadiusNeighbourFinder(1, 4, backend="hash_grid")
+        edges = nei_finder(x, y, batch, batch[:2], 0)
+        torch.testing.assert_allclose(edges, torch.tensor([[0, 0, 1, 1], [0, 1, 2, 3]]))
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            get_neighbour_backend("unknown")
+        with self.assertRaises(NotImplementedError):
+            get_neighbour_backend("hash_grid").knn(self.x, self.y, 4)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -2,12 +2,15 @@ import os
 import sys
 import unittest
 import numpy as np
+import numpy.testing as npt
+import torch
+from torch_geometric.data import Data
 
 
 ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)))
 sys.path.append(ROOT)
 
-from torch_points3d.datasets.samplers import BalancedRandomSampler
+from torch_points3d.datasets.samplers import BalancedRandomSampler, PointBudgetBatchSampler, get_num_points
 
 
 class TestBalancedRandomSampler(unittest.TestCase):
@@ -28,5 +31,56 @@ class TestBalancedRandomSampler(unittest.TestCase):
         self.assertGreater(0.005, np.std(c) / num_samples)
 
 
+class SizedDataset(torch.utils.data.Dataset):
+    def __init__(self, sizes):
+        self.sizes = sizes
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def get(self, idx):
+        return Data(pos=torch.zeros((self.sizes[idx], 3)))
+
+
+class TestPointBudgetBatchSampler(unittest.TestCase):
+    def test_sequential(self):
+        num_points = np.asarray([5, 3, 4, 12, 1, 1, 1, 6])
+        batch_sampler = PointBudgetBatchSampler(torch.utils.data.SequentialSampler(num_points), num_points, 10)
+        self.assertEqual(len(batch_sampler), 4)
+        self.assertEqual(list(batch_sampler), [[0, 1], [2], [3], [4, 5, 6, 7]])
+
+        batch_sampler = PointBudgetBatchSampler(range(8), num_points, 10, max_batch_size=2)
+        self.assertEqual(list(batch_sampler), [[0, 1], [2], [3], [4, 5], [6, 7]])
+
+    def test_shuffle(self):
+        np.random.seed(0)
+        num_points = np.random.randint(100, 2000, 500)
+        sampler = torch.utils.data.RandomSampler(num_points)
+        batch_sampler = PointBudgetBatchSampler(sampler, num_points, 5000)
+        batches = list(batch_sampler)
+        self.assertEqual(len(batch_sampler), len(batches))
+        self.assertEqual(sorted(sum(batches, [])), list(range(500)))
+        for batch in batches:
+            self.assertLessEqual(num_points[batch].sum(), 5000)
+        self.assertNotEqual(sum(batches, []), list(range(500)))
+
+        # Weighting is left to the wrapped sampler
+        labels = np.repeat([0, 1], [450, 50])
+        batch_sampler = PointBudgetBatchSampler(BalancedRandomSampler(labels), num_points, 5000)
+        indices = sum(list(batch_sampler), [])
+        self.assertEqual(len(indices), 500)
+        self.assertGreater((labels[indices] == 1).mean(), 0.4)
+
+    def test_get_num_points(self):
+        dataset = SizedDataset([3, 7, 2])
+        npt.assert_array_equal(get_num_points(dataset), [3, 7, 2])
+
+        dataset.slices = {"pos": torch.tensor([0, 4, 5, 9])}
+        npt.assert_array_equal(get_num_points(dataset), [4, 1, 4])
+
+        dataset.sample_num_points = [1, 2, 3]
+        npt.assert_array_equal(get_num_points(dataset), [1, 2, 3])
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -97,6 +97,17 @@ class TestSegmentationTracker(unittest.TestCase):
         for k in ["test_acc", "test_miou", "test_macc"]:
             self.assertAlmostEqual(metrics[k], 100, 5)
 
+    def test_positive_ignore_label(self):
+        tracker = SegmentationTracker(MockDataset(), ignore_label=1)
+        model = MockModel()
+        model.iter = 3
+        tracker.track(model)
+        model.iter = 1
+        tracker.track(model)
+        metrics = tracker.get_metrics()
+        for k in ["train_acc", "train_macc"]:
+            self.assertAlmostEqual(metrics[k], 100, 5)
+
     def test_finalise(self):
         tracker = SegmentationTracker(MockDataset(), ignore_label=-100)
         tracker.reset("test")
@@ -83,6 +83,19 @@ class TestForwardData(unittest.TestCase):
             npt.assert_allclose(predicted["example1.txt"][:, -1], np.asarray([0, 0, 0]))
             npt.assert_allclose(predicted["example2.txt"][:, -1], np.asarray([1, 1, 1, 1]))
 
+    def test_rawpos(self):
+        dataset = ForwardShapenetDataset(self.config)
+        dataset.create_dataloaders(MockModel(DictConfig({"conv_type": "DENSE"})), 2, False, 1, False)
+        for b in dataset.test_dataloaders[0]:
+            self.assertEqual(len(b.raw_pos), 2)
+            npt.assert_allclose(b.raw_pos[1], dataset.test_dataset[0].get_raw(1).pos.numpy())
+
+    def test_skip(self):
+        dataset = ForwardShapenetDataset(self.config)
+        dataset.test_dataset[0].skip(lambda filename: filename == "example1.txt")
+        self.assertEqual(len(dataset.test_dataset[0]), 1)
+        self.assertEqual(dataset.test_dataset[0].get_filename(0), "example2.txt")
+
     def test_numclasses(self):
         dataset = ForwardShapenetDataset(self.config)
         self.assertEqual(dataset.num_classes, 8)
@@ -0,0 +1,93 @@
+import os
+import sys
+import tempfile
+import unittest
+import numpy as np
+import torch
+from torch_geometric.data import Data
+
+ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from torch_points3d.inference import SlidingWindowInference
+
+
+class MockSegmentationModel:
+    """ Logits are the one hot features plus a term that depends on the position in the window
+    """
+
+    conv_type = "PARTIAL_DENSE"
+
+    def __init__(self, noise=0.0):
+        self.noise = noise
+        self.on_forward = None
+
+    def set_input(self, data, device):
+        self.input = data
+
+    def forward(self):
+        local = torch.cat([self.input.pos[:, :1], -self.input.pos[:, :1]], -1)
+        self.output = self.input.x + self.noise * local
+        if self.on_forward:
+            self.on_forward()
+
+    def get_output(self):
+        return self.output
+
+
+def make_cloud(num_points=2000):
+    torch.manual_seed(0)
+    pos = torch.rand(num_points, 3) * torch.tensor([10.0, 4.0, 2.0])
+    labels = (pos[:, 0] + pos[:, 1] > 7).long()
+    return Data(pos=pos, x=torch.nn.functional.one_hot(labels, 2).float()), labels
+
+
+class KeepEven:
+    def __call__(self, data):
+        for key in ["pos", "x", "origin_id"]:
+            data[key] = data[key][::2]
+        return data
+
+
+class TestSlidingWindowInference(unittest.TestCase):
+    def test_labels(self):
+        data, labels = make_cloud()
+        for window in SlidingWindowInference.WINDOWS:
+            for blending in SlidingWindowInference.BLENDINGS:
+                engine = SlidingWindowInference(
+                    MockSegmentationModel(), 1.0, overlap=0.3, window=window, blending=blending, batch_size=3
+                )
+                predicted = engine.run(data)
+                self.assertEqual(predicted.tolist(), labels.tolist())
+                self.assertLess(engine.stats["peak_buffered_points"], data.pos.shape[0])
+                self.assertEqual(engine.stats["labelled_points"], data.pos.shape[0])
+
+    def test_transform(self):
+        data, labels = make_cloud()
+        engine = SlidingWindowInference(MockSegmentationModel(), 1.0, window="tile", transform=KeepEven())
+        predicted = engine.run(data)
+        self.assertTrue((predicted >= 0).all())
+        self.assertGreater((predicted == labels.numpy()).mean(), 0.95)
+
+    def test_pause_resume(self):
+        data, _ = make_cloud()
+        model = MockSegmentationModel(noise=1.0)
+        with tempfile.TemporaryDirectory() as directory:
+            reference = SlidingWindowInference(model, 1.0, batch_size=4).run(data, os.path.join(directory, "ref.npy"))
+
+            path = os.path.join(directory, "labels.npy")
+            engine = SlidingWindowInference(model, 1.0, batch_size=4, checkpoint_every=0)
+            model.on_forward = engine.pause
+            self.assertIsNone(engine.run(data, path))
+            self.assertTrue(os.path.exists(path + ".state.pt"))
+            self.assertGreater(engine.stats["windows"], 0)
+
+            model.on_forward = None
+            labels = engine.run(data, path)
+            np.testing.assert_array_equal(labels, reference)
+            np.testing.assert_array_equal(np.load(path), reference)
+            self.assertFalse(os.path.exists(path + ".state.pt"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,13 +1,15 @@
 import os
 import sys
 import unittest
+import tempfile
 import numpy as np
 import torch
 from torch_geometric.data import Data
 
 ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
 sys.path.insert(0, ROOT)
-from torch_points3d.core.data_transform.transforms import RandomSphere, SphereSampling
+from torch_points3d.core.data_transform.transforms import RandomSphere, SphereSampling, GridSphereSampling
+from torch_points3d.utils.kdtree_cache import get_kdtree, kdtree_key, kdtree_path, clear_kdtree_cache
 
 
 class TestRandomSphere(unittest.TestCase):
@@ -54,5 +56,63 @@ class TestSphereSampling(unittest.TestCase):
         self.assertEqual(sampled.labels[0], 0)
 
 
+class TestGridSphereSampling(unittest.TestCase):
+    def setUp(self):
+        pos = torch.rand((1000, 3)) * 4
+        self.data = Data(pos=pos, y=torch.randint(0, 5, (1000,)), rgb=torch.rand((1000, 3)))
+
+    def test_same_as_sphere_sampling(self):
+        spheres = GridSphereSampling(1, 1, center=False)(self.data.clone())
+        self.assertGreater(len(spheres), 0)
+        for i in range(len(spheres)):
+            sphere = spheres[i]
+            expected = SphereSampling(1, spheres.centres[i], align_origin=False)(self.data.clone())
+            torch.testing.assert_allclose(sphere.pos, expected.pos)
+            torch.testing.assert_allclose(sphere.rgb, expected.rgb)
+            self.assertEqual(sphere.y.tolist(), expected.y.tolist())
+            self.assertEqual(sphere.center_label.shape, (1,))
+
+    def test_list(self):
+        spheres = GridSphereSampling(1, 1)([self.data.clone(), self.data.clone()])
+        single = GridSphereSampling(1, 1)(self.data.clone())
+        self.assertEqual(len(spheres), 2 * len(single))
+        torch.testing.assert_allclose(spheres[len(single)].pos, single[0].pos)
+        torch.testing.assert_allclose(spheres[-1].pos, single[-1].pos)
+        self.assertEqual(spheres.num_points.sum(), 2 * single.num_points.sum())
+
+
+class TestKDTreeCache(unittest.TestCase):
+    def setUp(self):
+        self.pos = torch.rand((100, 3))
+        clear_kdtree_cache()
+
+    def test_key(self):
+        self.assertEqual(kdtree_key(self.pos, 10), kdtree_key(self.pos.clone(), 10))
+        self.assertNotEqual(kdtree_key(self.pos, 10), kdtree_key(self.pos, 50))
+        self.assertNotEqual(kdtree_key(self.pos, 10), kdtree_key(self.pos + 1, 10))
+
+    def test_memory_cache(self):
+        tree = get_kdtree(self.pos, leaf_size=10)
+        self.assertIs(tree, get_kdtree(self.pos.clone(), leaf_size=10))
+        self.assertIsNot(tree, get_kdtree(self.pos, leaf_size=20))
+
+    def test_disk_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            tree = get_kdtree(self.pos, leaf_size=10, cache_dir=cache_dir)
+            self.assertTrue(os.path.exists(kdtree_path(cache_dir, kdtree_key(self.pos, 10))))
+
+            clear_kdtree_cache()
+            loaded = get_kdtree(self.pos, leaf_size=10, cache_dir=cache_dir)
+            self.assertIsNot(tree, loaded)
+            query = np.asarray(self.pos[:5])
+            np.testing.assert_equal(tree.query(query, k=3)[1], loaded.query(query, k=3)[1])
+
+    def test_sphere_sampling_cache(self):
+        data = Data(pos=self.pos)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            SphereSampling(0.1, [0, 0, 0], cache_dir=cache_dir)(data)
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,6 +1,7 @@
 import unittest
 import sys
 import os
+import tempfile
 import torch_geometric.transforms as T
 import numpy as np
 import numpy.testing as npt
@@ -18,6 +19,7 @@ from torch_points3d.core.data_transform import (
     instantiate_transforms,
     GridSampling3D,
     MultiScaleTransform,
+    CachedMultiScaleTransform,
     Random3AxisRotation,
     AddFeatByKey,
     AddFeatsByKeys,
@@ -30,7 +32,7 @@ from torch_points3d.core.data_transform import (
     XYZFeature,
     ScalePos,
 )
-from torch_points3d.core.spatial_ops import RadiusNeighbourFinder, KNNInterpolate
+from torch_points3d.core.spatial_ops import RadiusNeighbourFinder, KNNNeighbourFinder, KNNInterpolate, RandomSampler
 from torch_points3d.utils.enums import ConvolutionFormat
 from torch_points3d.datasets.multiscale_data import MultiScaleBatch
 
@@ -101,6 +103,69 @@ class Testhelpers(unittest.TestCase):
         self.assertEqual(upsample[1].__inc__("x_idx", 0), ms[0].num_nodes)
         self.assertEqual(upsample[1].__inc__("y_idx", 0), pos.shape[0])
 
+    def test_cachedMultiscaleTransforms(self):
+        samplers = [GridSampling3D(0.25), None, GridSampling3D(0.5)]
+        search = [
+            RadiusNeighbourFinder(0.5, 100, ConvolutionFormat.PARTIAL_DENSE.value),
+            RadiusNeighbourFinder(0.5, 150, ConvolutionFormat.PARTIAL_DENSE.value),
+            RadiusNeighbourFinder(1, 200, ConvolutionFormat.PARTIAL_DENSE.value),
+        ]
+        upsampler = [KNNInterpolate(1), KNNInterpolate(1)]
+        strategies = {"sampler": samplers, "neighbour_finder": search, "upsample_op": upsampler}
+
+        pos = torch.rand((100, 3))
+        d = Data(pos=pos, x=torch.ones_like(pos)).contiguous()
+        expected = MultiScaleTransform(strategies)(d.clone())
+        with tempfile.TemporaryDirectory() as cache_dir:
+            ms_transform = CachedMultiScaleTransform(strategies, cache_dir=cache_dir)
+            ms_transform(d.clone())
+            self.assertEqual(len(os.listdir(ms_transform.cache_dir)), 1)
+
+            # Second pass from memory, third one from disk
+            fresh_transform = CachedMultiScaleTransform(strategies, cache_dir=cache_dir)
+            for transformed in [ms_transform(d.clone()), fresh_transform(d.clone())]:
+                for ms, ms_expected in zip(
+                    transformed.multiscale + transformed.upsample, expected.multiscale + expected.upsample
+                ):
+                    self.assertEqual(set(ms.keys), set(ms_expected.keys))
+                    for key in ms_expected.keys:
+                        npt.assert_equal(ms[key].numpy(), ms_expected[key].numpy())
+                        self.assertEqual(ms.__inc__(key, 0), ms_expected.__inc__(key, 0))
+                    self.assertEqual(ms.num_nodes, ms_expected.num_nodes)
+            self.assertEqual(ms_transform.cache.hits, 1)
+            self.assertEqual(fresh_transform.cache.hits, 1)
+
+    def test_multiscaleTransformsMessagePassing(self):
+        strategies = {
+            "sampler": [RandomSampler(0.5), RandomSampler(0.5)],
+            "neighbour_finder": [KNNNeighbourFinder(4), KNNNeighbourFinder(3)],
+            "upsample_op": [],
+        }
+        ms_transform = MultiScaleTransform(strategies, conv_type=ConvolutionFormat.MESSAGE_PASSING.value)
+        data_list = [ms_transform(Data(pos=torch.rand((n, 3)), x=torch.ones((n, 1)))) for n in [40, 60]]
+        self.assertEqual(data_list[0].num_upsample, 0)
+        ms = data_list[0].multiscale
+        npt.assert_equal(ms[0].pos.numpy(), data_list[0].pos[ms[0].idx].numpy())
+        npt.assert_equal(ms[1].pos.numpy(), ms[0].pos[ms[1].idx].numpy())
+        self.assertEqual(ms[0].edge_index.shape, (2, 20 * 4))
+        self.assertEqual(ms[1].edge_index.shape, (2, 10 * 3))
+
+        batch = MultiScaleBatch.from_data_list(data_list)
+        pos, batch_vector = batch.pos, batch.batch
+        for scale, k in zip(batch.multiscale, [4, 3]):
+            npt.assert_equal(scale.pos.numpy(), pos[scale.idx].numpy())
+            npt.assert_equal(scale.batch.numpy(), batch_vector[scale.idx].numpy())
+
+            # Neighbours are the k closest points of the same sample (the random sampler draws with replacement)
+            support, query = scale.edge_index
+            npt.assert_equal(batch_vector[support].numpy(), scale.batch[query].numpy())
+            for i in range(scale.pos.shape[0]):
+                dist = ((pos[support[query == i]] - scale.pos[i]) ** 2).sum(-1)
+                candidates = pos[batch_vector == scale.batch[i]]
+                expected = ((candidates - scale.pos[i]) ** 2).sum(-1).sort()[0][:k]
+                npt.assert_almost_equal(dist.sort()[0].numpy(), expected.numpy())
+            pos, batch_vector = scale.pos, scale.batch
+
     def test_AddFeatByKey(self):
 
         add_to_x = [False, True]
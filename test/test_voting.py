@@ -0,0 +1,35 @@
+import os
+import sys
+import unittest
+import torch
+
+ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from torch_points3d.metrics.voting import VoteAccumulator, NearestPredictionIndex
+
+
+class TestVoteAccumulator(unittest.TestCase):
+    def test_add(self):
+        for sparse in [False, True]:
+            votes = VoteAccumulator(5, 2, sparse=sparse)
+            votes.add(torch.tensor([3, 1, 3]), torch.tensor([[1.0, 0], [0, 1], [1, 0]]))
+            votes.add(torch.tensor([1]), torch.tensor([[0, 2.0]]))
+            ids, values = votes.predicted()
+            self.assertEqual(ids.tolist(), [1, 3])
+            self.assertEqual(values.tolist(), [[0, 3], [2, 0]])
+            self.assertEqual(votes.has_prediction.tolist(), [False, True, False, True, False])
+
+
+class TestNearestPredictionIndex(unittest.TestCase):
+    def test_interpolate(self):
+        pos = torch.tensor([[0, 0, 0], [1, 0, 0], [2, 0, 0], [10, 0, 0]]).float()
+        index = NearestPredictionIndex(pos)
+        predicted_ids = torch.tensor([0, 3])
+        full = index.interpolate(predicted_ids, torch.tensor([5, 7]))
+        self.assertEqual(full.tolist(), [5, 5, 5, 7])
+        self.assertIs(index.get(predicted_ids.clone()), index.get(predicted_ids))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -42,12 +42,20 @@ class BaseConvolutionDown(BaseConvolution):
     def conv(self, x, pos, edge_index, batch):
         raise NotImplementedError
 
-    def forward(self, data, **kwargs):
+    def forward(self, data, precomputed=None, **kwargs):
+        """ Samples the input and convolves, the sampling and neighbour search of the
+        layer are read from ``precomputed`` (the multiscale data of the batch) when given.
+        """
         batch_obj = Batch()
         x, pos, batch = data.x, data.pos, data.batch
-        idx = self.sampler(pos, batch)
-        row, col = self.neighbour_finder(pos, pos[idx], batch_x=batch, batch_y=batch[idx])
-        edge_index = torch.stack([col, row], dim=0)
+        if precomputed:
+            block_idx = getattr(data, "block_idx", 0)
+            idx, edge_index = precomputed[block_idx].idx, precomputed[block_idx].edge_index
+            batch_obj.block_idx = block_idx + 1
+        else:
+            idx = self.sampler(pos, batch)
+            row, col = self.neighbour_finder(pos, pos[idx], batch_x=batch, batch_y=batch[idx])
+            edge_index = torch.stack([col, row], dim=0)
         batch_obj.idx = idx
         batch_obj.edge_index = edge_index
 
@@ -237,7 +245,7 @@ class BaseResnetBlock(torch.nn.Module):
         shortcut = x  # (N, indim)
         x = self.features_downsample_nn(x)  # (N, outdim//4)
         # if this is an identity resnet block, idx will be None
-        data = self.convs(data)  # (N', convdim)
+        data = self.convs(data, **kwargs)  # (N', convdim)
         x = data.x
         idx = data.idx
         x = self.features_upsample_nn(x)  # (N', outdim)
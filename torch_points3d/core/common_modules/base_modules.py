@@ -28,7 +28,7 @@ class Identity(BaseModule):
     def __init__(self):
         super(Identity, self).__init__()
 
-    def forward(self, data):
+    def forward(self, data, **kwargs):
         return data
 
 
@@ -5,12 +5,9 @@ import scipy
 import re
 import torch
 import logging
-import torch.nn.functional as F
-from torch_scatter import scatter_mean, scatter_add
-from torch_geometric.nn.pool.consecutive import consecutive_cluster
-from torch_geometric.nn import voxel_grid
 from torch_geometric.data import Data
-from torch_cluster import grid_cluster
+
+from torch_points3d.core.spatial_ops.voxelize import voxelize, voxel_mean, voxel_majority
 
 log = logging.getLogger(__name__)
 
@@ -25,7 +22,7 @@ def shuffle_data(data):
     return data
 
 
-def group_data(data, cluster=None, unique_pos_indices=None, mode="last", skip_keys=[]):
+def group_data(data, cluster=None, unique_pos_indices=None, mode="last", skip_keys=[], counts=None):
     """ Group data based on indices in cluster.
     The option ``mode`` controls how data gets agregated within each cluster.
 
@@ -42,6 +39,8 @@ def group_data(data, cluster=None, unique_pos_indices=None, mode="last", skip_ke
         ``last`` selects the last point falling in a voxel as the representent, ``mean`` takes the average.
     skip_keys: list
         Keys of attributes to skip in the grouping
+    counts : torch.Tensor, optional
+        Number of points in each cluster, computed from ``cluster`` in mean mode if not given
     """
 
     assert mode in ["mean", "last"]
@@ -51,6 +50,8 @@ def group_data(data, cluster=None, unique_pos_indices=None, mode="last", skip_ke
         raise ValueError("In last mode the unique_pos_indices argument needs to be specified")
 
     num_nodes = data.num_nodes
+    if mode == "mean" and counts is None:
+        counts = torch.bincount(cluster)
     for key, item in data:
         if bool(re.search("edge", key)):
             raise ValueError("Edges not supported. Wrong data type.")
@@ -62,12 +63,9 @@ def group_data(data, cluster=None, unique_pos_indices=None, mode="last", skip_ke
                 data[key] = item[unique_pos_indices]
             elif mode == "mean":
                 if key == "y":
-                    item_min = item.min()
-                    item = F.one_hot(item - item_min)
-                    item = scatter_add(item, cluster, dim=0)
-                    data[key] = item.argmax(dim=-1) + item_min
+                    data[key] = voxel_majority(item, cluster, counts.shape[0])
                 else:
-                    data[key] = scatter_mean(item, cluster, dim=0)
+                    data[key] = voxel_mean(item, cluster, counts)
     return data
 
 
@@ -83,6 +81,8 @@ class GridSampling3D:
         The mode can be either `last` or `mean`.
         If mode is `mean`, all the points and their features within a cell will be averaged
         If mode is `last`, one random points per cell will be selected with its associated features
+
+    The points are grouped in a single pass by :func:`voxelize`, labels are set by a majority vote in mean mode.
     """
 
     def __init__(self, size, quantize_coords=False, mode="mean", verbose=False):
@@ -94,27 +94,16 @@ class GridSampling3D:
                 "If you need to keep track of the position of your points, use SaveOriginalPosId transform before using GridSampling3D"
             )
 
-            if self._mode == "last":
-                log.warning(
-                    "The tensors within data will be shuffled each time this transform is applied. Be careful that if an attribute doesn't have the size of num_points, it won't be shuffled"
-                )
-
     def _process(self, data):
-        if self._mode == "last":
-            data = shuffle_data(data)
-
         coords = ((data.pos) / self._grid_size).int()
-        if "batch" not in data:
-            cluster = grid_cluster(coords, torch.tensor([1, 1, 1]))
-        else:
-            cluster = voxel_grid(coords, data.batch, 1)
-        cluster, unique_pos_indices = consecutive_cluster(cluster)
+        batch = data.batch if "batch" in data else None
+        cluster, unique_pos_indices, counts = voxelize(coords, batch, mode=self._mode)
 
         skip_keys = []
         if self._quantize_coords:
             skip_keys.append("pos")
 
-        data = group_data(data, cluster, unique_pos_indices, mode=self._mode, skip_keys=skip_keys)
+        data = group_data(data, cluster, unique_pos_indices, mode=self._mode, skip_keys=skip_keys, counts=counts)
 
         if self._quantize_coords:
             data.pos = coords[unique_pos_indices]
@@ -11,16 +11,15 @@ from tqdm.auto import tqdm as tq
 from torch.nn import functional as F
 from sklearn.neighbors import NearestNeighbors, KDTree
 from functools import partial
-from torch_geometric.nn import fps, radius, knn, voxel_grid
-from torch_geometric.nn.pool.consecutive import consecutive_cluster
+from torch_geometric.nn import fps, radius, knn
 from torch_geometric.nn.pool.pool import pool_pos, pool_batch
 from torch_scatter import scatter_add, scatter_mean
-from torch_cluster import grid_cluster
 
 from torch_points3d.datasets.multiscale_data import MultiScaleData
 from torch_points3d.utils.config import is_list
 from torch_points3d.utils import is_iterable
-from .grid_transform import group_data, GridSampling3D, shuffle_data
+from torch_points3d.core.spatial_ops.voxelize import voxelize
+from .grid_transform import group_data, GridSampling3D
 
 
 class RemoveDuplicateCoords(object):
@@ -38,21 +37,15 @@ class RemoveDuplicateCoords(object):
         self._mode = mode
 
     def _process(self, data):
-        if self._mode == "last":
-            data = shuffle_data(data)
-
         coords = data.pos
-        if "batch" not in data:
-            cluster = grid_cluster(coords, torch.tensor([1, 1, 1]))
-        else:
-            cluster = voxel_grid(coords, data.batch, 1)
-        cluster, unique_pos_indices = consecutive_cluster(cluster)
+        batch = data.batch if "batch" in data else None
+        cluster, unique_pos_indices, counts = voxelize(coords, batch, mode=self._mode)
 
         skip_keys=[]
         if self._mode == "last":
             skip_keys.append("pos")
             data.pos = coords[unique_pos_indices]
-        data = group_data(data, cluster, unique_pos_indices, mode=self._mode, skip_keys=skip_keys)
+        data = group_data(data, cluster, unique_pos_indices, mode=self._mode, skip_keys=skip_keys, counts=counts)
         return data
 
     def __call__(self, data):
@@ -1,4 +1,6 @@
 from typing import List
+from collections.abc import Sequence
+import os
 import itertools
 import numpy as np
 import math
@@ -6,7 +8,7 @@ import re
 import torch
 import random
 from tqdm.auto import tqdm as tq
-from sklearn.neighbors import NearestNeighbors, KDTree
+from sklearn.neighbors import NearestNeighbors
 from functools import partial
 from torch.nn import functional as F
 from torch_geometric.nn.pool.pool import pool_pos, pool_batch
@@ -18,7 +20,11 @@ from torch_points3d.datasets.multiscale_data import MultiScaleData
 from torch_points3d.datasets.registration.pair import Pair
 from torch_points3d.utils.transform_utils import SamplingStrategy
 from torch_points3d.utils.config import is_list
+from torch_points3d.utils.enums import ConvolutionFormat
 from torch_points3d.utils import is_iterable
+from torch_points3d.utils.kdtree_cache import get_kdtree
+from torch_points3d.core.spatial_ops.neighbour_finder import BaseMSNeighbourFinder
+from torch_points3d.utils.multiscale_cache import MultiScaleCache, strategies_hash, sample_key, DEFAULT_MAX_ITEMS
 from .grid_transform import group_data, GridSampling3D, shuffle_data
 
 
@@ -81,9 +87,112 @@ class PointCloudFusion(object):
         return "{}()".format(self.__class__.__name__)
 
 
+class SphereCollection(Sequence):
+    """ Read only list of spheres extracted from one or several point clouds. The spheres are stored
+    as CSR offsets into a single buffer of point indices, the actual ``Data`` object
+    of a sphere is only built when it is accessed.
+
+    Parameters
+    ----------
+    datas: List[Data]
+        Point clouds the spheres have been extracted from
+    data_idx: torch.Tensor
+        [S] index in ``datas`` of the point cloud of each sphere
+    indices: torch.Tensor
+        Concatenation of the point indices of all spheres
+    offsets: torch.Tensor
+        [S + 1] start and end of each sphere in ``indices``
+    centres: torch.Tensor
+        [S, 3] centre of each sphere
+    center_labels: torch.Tensor, optional
+        [S] label of the closest point to the centre of each sphere
+    align_origin: bool, optional
+        If True, the spheres are moved to the origin
+    """
+
+    SKIP_KEYS = ["kd_tree"]
+
+    def __init__(self, datas, data_idx, indices, offsets, centres, center_labels=None, align_origin=True):
+        self._datas = datas
+        self._data_idx = data_idx
+        self._indices = indices
+        self._offsets = offsets
+        self._centres = centres
+        self._center_labels = center_labels
+        self._align_origin = align_origin
+
+    @property
+    def num_points(self):
+        return self._offsets[1:] - self._offsets[:-1]
+
+    @property
+    def centres(self):
+        return self._centres
+
+    def __len__(self):
+        return self._centres.shape[0]
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if idx < 0 or idx >= len(self):
+            raise IndexError("Sphere index %i out of range" % idx)
+
+        data = self._datas[self._data_idx[idx]]
+        ind = self._indices[self._offsets[idx] : self._offsets[idx + 1]]
+        num_points = data.pos.shape[0]
+        new_data = Data()
+        for key in set(data.keys):
+            if key in self.SKIP_KEYS:
+                continue
+            item = data[key]
+            if torch.is_tensor(item) and num_points == item.shape[0]:
+                item = item[ind]
+                if self._align_origin and key == "pos":  # Center the sphere.
+                    item -= self._centres[idx].unsqueeze(0)
+            elif torch.is_tensor(item):
+                item = item.clone()
+            setattr(new_data, key, item)
+        if self._center_labels is not None:
+            new_data.center_label = self._center_labels[idx : idx + 1]
+        return new_data
+
+    @staticmethod
+    def cat(collections):
+        """ Concatenates several collections into a single one
+        """
+        collections = list(collections)
+        datas = []
+        data_idx = []
+        indices = []
+        offsets = [torch.zeros(1, dtype=torch.long)]
+        for collection in collections:
+            data_idx.append(collection._data_idx + len(datas))
+            datas += collection._datas
+            indices.append(collection._indices)
+            offsets.append(collection._offsets[1:] + offsets[-1][-1])
+
+        has_labels = len(collections) > 0 and all([c._center_labels is not None for c in collections])
+        return SphereCollection(
+            datas,
+            torch.cat(data_idx) if len(data_idx) else torch.zeros(0, dtype=torch.long),
+            torch.cat(indices) if len(indices) else torch.zeros(0, dtype=torch.long),
+            torch.cat(offsets),
+            torch.cat([c._centres for c in collections]) if len(collections) else torch.zeros((0, 3)),
+            torch.cat([c._center_labels for c in collections]) if has_labels else None,
+            align_origin=all([c._align_origin for c in collections]),
+        )
+
+    def __repr__(self):
+        return "{}(num_spheres={}, num_point_clouds={})".format(self.__class__.__name__, len(self), len(self._datas))
+
+
 class GridSphereSampling(object):
     """Fits the point cloud to a grid and for each point in this grid,
-    create a sphere with a radius r
+    create a sphere with a radius r. All spheres are queried at once and returned
+    as a :class:`SphereCollection` that builds each sphere on access.
 
     Parameters
     ----------
@@ -95,20 +204,23 @@ class GridSphereSampling(object):
         If True, KDTREE_KEY should be deleted as an attribute if it exists
     center: bool, optional
         If True, a centre transform is apply on each sphere.
+    cache_dir: str, optional
+        Directory where the KDTrees are cached, see :func:`torch_points3d.utils.kdtree_cache.get_kdtree`
     """
 
     KDTREE_KEY = "kd_tree"
 
-    def __init__(self, radius, grid_size=None, delattr_kd_tree=True, center=True):
+    def __init__(self, radius, grid_size=None, delattr_kd_tree=True, center=True, cache_dir=None):
         self._radius = eval(radius) if isinstance(radius, str) else float(radius)
         grid_size = eval(grid_size) if isinstance(grid_size, str) else float(grid_size)
         self._grid_sampling = GridSampling3D(size=grid_size if grid_size else self._radius)
         self._delattr_kd_tree = delattr_kd_tree
         self._center = center
+        self._cache_dir = cache_dir
 
     def _process(self, data):
         if not hasattr(data, self.KDTREE_KEY):
-            tree = KDTree(np.asarray(data.pos), leaf_size=50)
+            tree = get_kdtree(data.pos, leaf_size=50, cache_dir=self._cache_dir)
         else:
             tree = getattr(data, self.KDTREE_KEY)
 
@@ -119,28 +231,33 @@ class GridSphereSampling(object):
 
         # apply grid sampling
         grid_data = self._grid_sampling(data.clone())
-
-        datas = []
-        for grid_center in np.asarray(grid_data.pos):
-            pts = np.asarray(grid_center)[np.newaxis]
-
-            # Find closest point within the original data
-            ind = torch.LongTensor(tree.query(pts, k=1)[1][0])
-            grid_label = data.y[ind]
-
-            # Find neighbours within the original data
-            ind = torch.LongTensor(tree.query_radius(pts, r=self._radius)[0])
-            sampler = SphereSampling(self._radius, grid_center, align_origin=self._center)
-            new_data = sampler(data)
-            new_data.center_label = grid_label
-
-            datas.append(new_data)
-        return datas
+        centres = np.asarray(grid_data.pos)
+
+        # Find closest point within the original data for all centres at once
+        center_labels = None
+        if getattr(data, "y", None) is not None:
+            closest = torch.from_numpy(tree.query(centres, k=1)[1][:, 0]).long()
+            center_labels = data.y[closest]
+
+        # Find neighbours within the original data for all centres at once
+        neighbours = tree.query_radius(centres, r=self._radius)
+        offsets = np.zeros(len(neighbours) + 1, dtype=np.int64)
+        np.cumsum([len(n) for n in neighbours], out=offsets[1:])
+        indices = np.concatenate(neighbours) if len(neighbours) else np.zeros(0)
+
+        return SphereCollection(
+            [data],
+            torch.zeros(len(neighbours), dtype=torch.long),
+            torch.from_numpy(indices.astype(np.int64)),
+            torch.from_numpy(offsets),
+            torch.from_numpy(centres).float(),
+            center_labels,
+            align_origin=self._center,
+        )
 
     def __call__(self, data):
         if isinstance(data, list):
-            data = [self._process(d) for d in tq(data)]
-            data = list(itertools.chain(*data))  # 2d list needs to be flatten
+            data = SphereCollection.cat([self._process(d) for d in tq(data)])
         else:
             data = self._process(data)
         return data
@@ -156,13 +273,16 @@ class ComputeKDTree(object):
     -----------
     leaf_size:int
         Size of the leaf node.
+    cache_dir: str, optional
+        Directory where the KDTrees are cached, see :func:`torch_points3d.utils.kdtree_cache.get_kdtree`
     """
 
-    def __init__(self, leaf_size):
+    def __init__(self, leaf_size, cache_dir=None):
         self._leaf_size = leaf_size
+        self._cache_dir = cache_dir
 
     def _process(self, data):
-        data.kd_tree = KDTree(np.asarray(data.pos), leaf_size=self._leaf_size)
+        data.kd_tree = get_kdtree(data.pos, leaf_size=self._leaf_size, cache_dir=self._cache_dir)
         return data
 
     def __call__(self, data):
@@ -173,7 +293,7 @@ class ComputeKDTree(object):
         return data
 
     def __repr__(self):
-        return "{}(leaf_size={})".format(self.__class__.__name__, self._leaf_size)
+        return "{}(leaf_size={}, cache_dir={})".format(self.__class__.__name__, self._leaf_size, self._cache_dir)
 
 
 class RandomSphere(object):
@@ -226,21 +346,24 @@ class SphereSampling:
         Centre of the sphere (1D array that contains (x,y,z))
     align_origin : bool, optional
         move resulting point cloud to origin
+    cache_dir : str, optional
+        Directory where the KDTrees are cached, see :func:`torch_points3d.utils.kdtree_cache.get_kdtree`
     """
 
     KDTREE_KEY = "kd_tree"
 
-    def __init__(self, radius, sphere_centre, align_origin=True):
+    def __init__(self, radius, sphere_centre, align_origin=True, cache_dir=None):
         self._radius = radius
         self._centre = np.asarray(sphere_centre)
         if len(self._centre.shape) == 1:
             self._centre = np.expand_dims(self._centre, 0)
         self._align_origin = align_origin
+        self._cache_dir = cache_dir
 
     def __call__(self, data):
         num_points = data.pos.shape[0]
         if not hasattr(data, self.KDTREE_KEY):
-            tree = KDTree(np.asarray(data.pos), leaf_size=50)
+            tree = get_kdtree(data.pos, leaf_size=50, cache_dir=self._cache_dir)
             setattr(data, self.KDTREE_KEY, tree)
         else:
             tree = getattr(data, self.KDTREE_KEY)
@@ -406,17 +529,22 @@ class MeshToNormal(object):
 
 class MultiScaleTransform(object):
     """ Pre-computes a sequence of downsampling / neighboorhood search on the CPU.
-    This currently only works on PARTIAL_DENSE formats
+    This works on PARTIAL_DENSE and MESSAGE_PASSING formats, for MESSAGE_PASSING each scale holds the
+    indices of the sampled points ``idx`` and the ``edge_index`` of the layer.
 
     Parameters
     -----------
     strategies: Dict[str, object]
         Dictionary that contains the samplers and neighbour_finder
+    conv_type: str, optional
+        Convolution format of the model the indices are computed for
     """
 
-    def __init__(self, strategies):
+    def __init__(self, strategies, conv_type=ConvolutionFormat.PARTIAL_DENSE.value):
         self.strategies = strategies
         self.num_layers = len(self.strategies["sampler"])
+        self.conv_type = conv_type
+        self._message_passing = conv_type.lower() == ConvolutionFormat.MESSAGE_PASSING.value.lower()
 
     @staticmethod
     def __inc__wrapper(func, special_params):
@@ -428,16 +556,26 @@ class MultiScaleTransform(object):
 
         return partial(new__inc__, special_params=special_params, func=func)
 
-    def __call__(self, data: Data) -> MultiScaleData:
-        # Compute sequentially multi_scale indexes on cpu
-        data.contiguous()
-        ms_data = MultiScaleData.from_data(data)
-        precomputed = [Data(pos=data.pos)]
+    def _attach_inc(self, data, special_params):
+        setattr(data, "__inc__", self.__inc__wrapper(data.__inc__, special_params))
+        return data
+
+    def _precompute(self, data):
+        """ Runs the samplers and neighbour finders on the positions of ``data``
+
+        Returns
+        -------
+        (List[Tuple[Data, dict]], List[Tuple[Data, dict]])
+            multiscale and upsample data with the increments of their index attributes
+        """
+        if self._message_passing:
+            return self._precompute_message_passing(data)
+        precomputed = [(Data(pos=data.pos), {})]
         upsample = []
         upsample_index = 0
         for index in range(self.num_layers):
             sampler, neighbour_finder = self.strategies["sampler"][index], self.strategies["neighbour_finder"][index]
-            support = precomputed[index]
+            support = precomputed[index][0]
             new_data = Data(pos=support.pos)
             if sampler:
                 query = sampler(new_data.clone())
@@ -450,11 +588,10 @@ class MultiScaleTransform(object):
                     upsampler = self.strategies["upsample_op"][upsample_index]
                     upsample_index += 1
                     pre_up = upsampler.precompute(query, support)
-                    upsample.append(pre_up)
                     special_params = {}
                     special_params["x_idx"] = query.num_nodes
                     special_params["y_idx"] = support.num_nodes
-                    setattr(pre_up, "__inc__", self.__inc__wrapper(pre_up.__inc__, special_params))
+                    upsample.append((pre_up, special_params))
             else:
                 query = new_data
 
@@ -471,17 +608,108 @@ class MultiScaleTransform(object):
             special_params = {}
             special_params["idx_neighboors"] = s_pos.shape[0]
             setattr(query, "idx_neighboors", idx_neighboors)
-            setattr(query, "__inc__", self.__inc__wrapper(query.__inc__, special_params))
-            precomputed.append(query)
-        ms_data.multiscale = precomputed[1:]
+            precomputed.append((query, special_params))
         upsample.reverse()  # Switch to inner layer first
-        ms_data.upsample = upsample
+        return precomputed[1:], upsample
+
+    def _precompute_message_passing(self, data):
+        """ Same as :meth:`_precompute` for the samplers and neighbour finders of message passing
+        convolutions, which work on positions and return indices. Each scale contains the positions of
+        the sampled points, their indices ``idx`` in the previous scale and the ``edge_index`` that
+        links them to their neighbours in the previous scale. There is no upsampling data, the up
+        convolutions still search their neighbours on the fly.
+        """
+        precomputed = []
+        pos = data.pos
+        for index in range(self.num_layers):
+            sampler, neighbour_finder = self.strategies["sampler"][index], self.strategies["neighbour_finder"][index]
+            if neighbour_finder is None or isinstance(neighbour_finder, BaseMSNeighbourFinder):
+                raise NotImplementedError(
+                    "Layer {} cannot be precomputed, only single scale neighbour finders are supported".format(index)
+                )
+            batch = torch.zeros(pos.shape[0], dtype=torch.long)
+            idx = sampler(pos, batch=batch) if sampler else torch.arange(pos.shape[0])
+            row, col = neighbour_finder(pos, pos[idx], batch_x=batch, batch_y=batch[idx])
+            query = Data(pos=pos[idx], idx=idx, edge_index=torch.stack([col, row], dim=0))
+            special_params = {}
+            special_params["idx"] = pos.shape[0]
+            special_params["edge_index"] = torch.tensor([[pos.shape[0]], [idx.shape[0]]])
+            precomputed.append((query, special_params))
+            pos = query.pos
+        return precomputed, []
+
+    def __call__(self, data: Data) -> MultiScaleData:
+        # Compute sequentially multi_scale indexes on cpu
+        data.contiguous()
+        ms_data = MultiScaleData.from_data(data)
+        multiscale, upsample = self._precompute(data)
+        ms_data.multiscale = [self._attach_inc(d, special_params) for d, special_params in multiscale]
+        ms_data.upsample = [self._attach_inc(d, special_params) for d, special_params in upsample]
         return ms_data
 
     def __repr__(self):
         return "{}".format(self.__class__.__name__)
 
 
+class CachedMultiScaleTransform(MultiScaleTransform):
+    """ :class:`MultiScaleTransform` that caches the precomputed multiscale and upsample indices.
+    Entries are keyed on the content of ``data.pos`` and saved in a sub directory specific to the
+    strategies, use it for samples that do not change between epochs (validation / test spheres,
+    registration fragments). Random samplers are only evaluated once per sample.
+
+    Parameters
+    -----------
+    strategies: Dict[str, object]
+        Dictionary that contains the samplers and neighbour_finder
+    cache_dir: str, optional
+        Directory where the indices are saved, only the in memory tier is used if None
+    max_items: int, optional
+        Number of samples kept in memory by each process
+    conv_type: str, optional
+        Convolution format of the model the indices are computed for
+    """
+
+    def __init__(
+        self, strategies, cache_dir=None, max_items=DEFAULT_MAX_ITEMS, conv_type=ConvolutionFormat.PARTIAL_DENSE.value
+    ):
+        super().__init__(strategies, conv_type=conv_type)
+        self.cache_dir = os.path.join(cache_dir, strategies_hash(strategies)) if cache_dir else None
+        self.cache = MultiScaleCache(self.cache_dir, max_items=max_items)
+
+    @staticmethod
+    def _to_entry(data, special_params):
+        return {
+            "attributes": {key: item for key, item in data},
+            "num_nodes": data.__dict__.get("__num_nodes__"),
+            "special_params": special_params,
+        }
+
+    def _from_entry(self, entry):
+        data = Data(**entry["attributes"])
+        if entry["num_nodes"] is not None:
+            data.num_nodes = entry["num_nodes"]
+        return self._attach_inc(data, entry["special_params"])
+
+    def __call__(self, data: Data) -> MultiScaleData:
+        data.contiguous()
+        ms_data = MultiScaleData.from_data(data)
+        key = sample_key(data.pos)
+        entry = self.cache.get(key)
+        if entry is None:
+            multiscale, upsample = self._precompute(data)
+            entry = {
+                "multiscale": [self._to_entry(d, special_params) for d, special_params in multiscale],
+                "upsample": [self._to_entry(d, special_params) for d, special_params in upsample],
+            }
+            self.cache.put(key, entry)
+        ms_data.multiscale = [self._from_entry(e) for e in entry["multiscale"]]
+        ms_data.upsample = [self._from_entry(e) for e in entry["upsample"]]
+        return ms_data
+
+    def __repr__(self):
+        return "{}(cache_dir={})".format(self.__class__.__name__, self.cache_dir)
+
+
 class ShuffleData(object):
     """ This transform allow to shuffle feature, pos and label tensors within data
     """
@@ -1,30 +1,104 @@
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-import numpy as np
 
 
-def _hash(arr, M):
-    if isinstance(arr, np.ndarray):
-        N, D = arr.shape
-    else:
-        N, D = len(arr[0]), len(arr)
+# Number of entries of the distance matrix computed at once
+DEFAULT_BLOCK_ELEMENTS = 2 ** 22
 
-    hash_vec = np.zeros(N, dtype=np.int64)
-    for d in range(D):
-        if isinstance(arr, np.ndarray):
-            hash_vec += arr[:, d] * M ** d
-        else:
-            hash_vec += arr[d] * M ** d
+
+def _hash(arr, M):
+    """ Unique key of each row of ``arr`` ([N, D] tensor or list of D tensors of size N) with entries in [0, M)
+    """
+    if torch.is_tensor(arr):
+        arr = arr.unbind(1)
+    hash_vec = torch.zeros_like(arr[0], dtype=torch.long)
+    for d in range(len(arr)):
+        hash_vec += arr[d].long() * M ** d
     return hash_vec
 
 
+def _isin(keys, test_keys):
+    """ Mask of the ``keys`` contained in ``test_keys``. The unique keys of both sets are merged in a single sort
+    on their device, the test keys being placed before equal keys: a key is found when its predecessor is a test
+    key with the same value.
+    """
+    test_keys = torch.unique(test_keys)
+    unique_keys, inverse = torch.unique(keys, return_inverse=True)
+    merged = torch.cat([test_keys * 2, unique_keys * 2 + 1])
+    sorted_keys, order = torch.sort(merged)
+    found = torch.zeros_like(sorted_keys, dtype=torch.bool)
+    found[1:] = (sorted_keys[1:] - 1) == sorted_keys[:-1]
+    is_key = order >= len(test_keys)
+    mask = torch.empty(unique_keys.shape[0], dtype=torch.bool, device=keys.device)
+    mask[order[is_key] - len(test_keys)] = found[is_key]
+    return mask[inverse]
+
+
+def _square_dist(A, B, B_sq_norm=None):
+    if B_sq_norm is None:
+        B_sq_norm = (B ** 2).sum(1)
+    D2 = torch.addmm(B_sq_norm, A, B.t(), alpha=-2)
+    D2 += (A ** 2).sum(1, keepdim=True)
+    return D2.clamp(min=0)
+
+
 def pdist(A, B, dist_type="L2"):
     if dist_type == "L2":
-        D2 = torch.sum((A.unsqueeze(1) - B.unsqueeze(0)).pow(2), 2)
+        D2 = _square_dist(A, B)
         return torch.sqrt(D2 + 1e-7)
     elif dist_type == "SquareL2":
-        return torch.sum((A.unsqueeze(1) - B.unsqueeze(0)).pow(2), 2)
+        return _square_dist(A, B)
+    else:
+        raise NotImplementedError("Not implemented")
+
+
+def pdist_min(A, B, dist_type="L2", xyz_A=None, xyz_B=None, min_dist=None, block_elements=DEFAULT_BLOCK_ELEMENTS):
+    """ Distance from each row of ``A`` to the closest row of ``B``. The distance matrix is computed in tiles of
+    at most ``block_elements`` entries with the expansion ||a||^2 + ||b||^2 - 2ab and is never materialised. The
+    search runs without gradient, the returned distances are recomputed from the selected rows so that they are
+    exact and differentiable.
+
+    Parameters
+    ----------
+    A : torch.Tensor
+        [N, D] features
+    B : torch.Tensor
+        [M, D] features
+    dist_type : str, optional
+        L2 or SquareL2
+    xyz_A, xyz_B, min_dist : optional
+        Positions of the rows of A and B, only the rows of B further than min_dist from the row of A are searched
+    block_elements : int, optional
+        Maximum number of entries of a tile
+
+    Returns
+    -------
+    dist : torch.Tensor
+        [N] distances, inf if no row of B could be searched
+    ind : torch.Tensor
+        [N] indices in B of the closest rows, 0 if no row of B could be searched
+    """
+    ind = torch.zeros(A.shape[0], dtype=torch.long, device=A.device)
+    valid = torch.ones(A.shape[0], dtype=torch.bool, device=A.device)
+    with torch.no_grad():
+        B_sq_norm = (B ** 2).sum(1)
+        block_size = max(1, block_elements // max(1, B.shape[0]))
+        for start in range(0, A.shape[0], block_size):
+            end = min(start + block_size, A.shape[0])
+            D2 = _square_dist(A[start:end], B, B_sq_norm)
+            if min_dist is not None:
+                D2[_square_dist(xyz_A[start:end], xyz_B) <= min_dist ** 2] = float("inf")
+            D2min, D2ind = D2.min(1)
+            ind[start:end] = D2ind
+            valid[start:end] = torch.isfinite(D2min)
+
+    D2 = (A - B[ind]).pow(2).sum(1)
+    D2 = torch.where(valid, D2, torch.full_like(D2, float("inf")))
+    if dist_type == "L2":
+        return torch.sqrt(D2 + 1e-7), ind
+    elif dist_type == "SquareL2":
+        return D2, ind
     else:
         raise NotImplementedError("Not implemented")
 
@@ -73,11 +147,11 @@ class ContrastiveHardestNegativeLoss(nn.Module):
         N0, N1 = len(F0), len(F1)
         N_pos_pairs = len(positive_pairs)
         hash_seed = max(N0, N1)
-        sel0 = np.random.choice(N0, min(N0, self.num_hn_samples), replace=False)
-        sel1 = np.random.choice(N1, min(N1, self.num_hn_samples), replace=False)
+        sel0 = torch.randperm(N0, device=F0.device)[: self.num_hn_samples]
+        sel1 = torch.randperm(N1, device=F1.device)[: self.num_hn_samples]
 
         if N_pos_pairs > self.num_pos:
-            pos_sel = np.random.choice(N_pos_pairs, self.num_pos, replace=False)
+            pos_sel = torch.randperm(N_pos_pairs, device=positive_pairs.device)[: self.num_pos]
             sample_pos_pairs = positive_pairs[pos_sel]
         else:
             sample_pos_pairs = positive_pairs
@@ -89,24 +163,18 @@ class ContrastiveHardestNegativeLoss(nn.Module):
         pos_ind1 = sample_pos_pairs[:, 1].long()
         posF0, posF1 = F0[pos_ind0], F1[pos_ind1]
 
-        D01 = pdist(posF0, subF1, dist_type="L2")
-        D10 = pdist(posF1, subF0, dist_type="L2")
-
-        D01min, D01ind = D01.min(1)
-        D10min, D10ind = D10.min(1)
-
-        if not isinstance(positive_pairs, np.ndarray):
-            positive_pairs = np.array(positive_pairs, dtype=np.int64)
+        D01min, D01ind = pdist_min(posF0, subF1, dist_type="L2")
+        D10min, D10ind = pdist_min(posF1, subF0, dist_type="L2")
 
         pos_keys = _hash(positive_pairs, hash_seed)
 
-        D01ind = sel1[D01ind.cpu().numpy()]
-        D10ind = sel0[D10ind.cpu().numpy()]
-        neg_keys0 = _hash([pos_ind0.numpy(), D01ind], hash_seed)
-        neg_keys1 = _hash([D10ind, pos_ind1.numpy()], hash_seed)
+        D01ind = sel1[D01ind]
+        D10ind = sel0[D10ind]
+        neg_keys0 = _hash([pos_ind0, D01ind], hash_seed)
+        neg_keys1 = _hash([D10ind, pos_ind1], hash_seed)
 
-        mask0 = torch.from_numpy(np.logical_not(np.isin(neg_keys0, pos_keys, assume_unique=False)))
-        mask1 = torch.from_numpy(np.logical_not(np.isin(neg_keys1, pos_keys, assume_unique=False)))
+        mask0 = ~_isin(neg_keys0, pos_keys)
+        mask1 = ~_isin(neg_keys1, pos_keys)
         pos_loss = F.relu((posF0 - posF1).pow(2).sum(1) - self.pos_thresh)
         neg_loss0 = F.relu(self.neg_thresh - D01min[mask0]).pow(2)
         neg_loss1 = F.relu(self.neg_thresh - D10min[mask1]).pow(2)
@@ -114,7 +182,7 @@ class ContrastiveHardestNegativeLoss(nn.Module):
 
     def forward(self, F0, F1, matches, xyz0=None, xyz1=None):
 
-        pos_loss, neg_loss = self.contrastive_hardest_negative_loss(F0, F1, matches.detach().cpu())
+        pos_loss, neg_loss = self.contrastive_hardest_negative_loss(F0, F1, matches.detach().to(F0.device))
 
         return pos_loss + neg_loss
 
@@ -145,18 +213,10 @@ class BatchHardContrastiveLoss(nn.Module):
         posF1 = F1[positive_pairs[:, 1]]
 
         subxyz0 = xyz0[positive_pairs[:, 0]]
-        false_negative = pdist(subxyz0, subxyz0, dist_type="L2") > self.min_dist
-        # dists = pdist(posF0, posF1, dist_type="L2").view(-1)
+        # Closest negative among the pairs further than min_dist
+        closest_neg, _ = pdist_min(posF0, posF1, "SquareL2", xyz_A=subxyz0, xyz_B=subxyz0, min_dist=self.min_dist)
         furthest_pos, _ = (posF0 - posF1).pow(2).max(1)
-        neg_loss = F.relu(self.neg_thresh - (posF0[0] - posF1[false_negative[0]]).pow(2).sum(1).min()).pow(2) / len(
-            posF0
-        )
-
-        for i in range(1, len(posF0)):
-            neg_loss += F.relu(self.neg_thresh - (posF0[i] - posF1[false_negative[i]]).pow(2).sum(1).min()).pow(
-                2
-            ) / len(posF0)
+        neg_loss = F.relu(self.neg_thresh - closest_neg).pow(2).sum() / len(posF0)
 
         pos_loss = F.relu(furthest_pos - self.pos_thresh).pow(2)
-        # neg_loss = F.relu(self.neg_thresh - closest_neg)
         return pos_loss.mean() + neg_loss.mean()
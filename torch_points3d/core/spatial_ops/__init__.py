@@ -1,3 +1,4 @@
+from .neighbour_backends import *
 from .neighbour_finder import *
 from .sampling import *
 from .interpolate import *
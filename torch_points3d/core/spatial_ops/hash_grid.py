@@ -0,0 +1,156 @@
+import numpy as np
+import torch
+from numba import njit, prange
+
+# Keys are int64, the number of cells of the grid (times the number of batch elements) must stay below this
+_MAX_CELLS = 2 ** 62
+
+# A dense table of cell offsets is used when there are less than this many cells per point
+_DENSE_CELLS_PER_POINT = 8
+
+
+def _radius_search(sorted_x, sorted_ids, sorted_keys, cell_start, y, cell_y, by, dims, radius, k):
+    """ For each query point, the k closest points of x that are within radius, closest first.
+    Points are bucketed in cells of size radius, only the 27 cells around the cell of the query are visited.
+    Cells that are consecutive along z are contiguous in the sorted points which gives 9 ranges per query.
+    Ranges are read from the dense table cell_start when it is not empty, otherwise they are
+    searched in sorted_keys. Ties are broken by index so that the output is deterministic.
+    """
+    num_queries = y.shape[0]
+    idx = np.full((num_queries, k), -1, dtype=np.int64)
+    sq_dist = np.full((num_queries, k), -1, dtype=np.float32)
+    sq_radius = radius * radius
+    dense = cell_start.shape[0] > 0
+    for i in prange(num_queries):
+        count = 0
+        z_min = max(cell_y[i, 2] - 1, 0)
+        z_max = min(cell_y[i, 2] + 1, dims[2] - 1)
+        for ox in range(-1, 2):
+            cx = cell_y[i, 0] + ox
+            if cx < 0 or cx >= dims[0]:
+                continue
+            for oy in range(-1, 2):
+                cy = cell_y[i, 1] + oy
+                if cy < 0 or cy >= dims[1]:
+                    continue
+                key = ((by[i] * dims[0] + cx) * dims[1] + cy) * dims[2]
+                if dense:
+                    first = cell_start[key + z_min]
+                    last = cell_start[key + z_max + 1]
+                else:
+                    first = np.searchsorted(sorted_keys, key + z_min)
+                    last = np.searchsorted(sorted_keys, key + z_max + 1)
+                for p in range(first, last):
+                    d = np.float32(0.0)
+                    for j in range(3):
+                        diff = sorted_x[p, j] - y[i, j]
+                        d += diff * diff
+                    if d > sq_radius:
+                        continue
+                    point = sorted_ids[p]
+                    if count == k:
+                        if d > sq_dist[i, k - 1] or (d == sq_dist[i, k - 1] and point > idx[i, k - 1]):
+                            continue
+                        count -= 1
+                    # Insertion in the sorted list of neighbours
+                    pos = count
+                    while pos > 0 and (
+                        sq_dist[i, pos - 1] > d or (sq_dist[i, pos - 1] == d and idx[i, pos - 1] > point)
+                    ):
+                        sq_dist[i, pos] = sq_dist[i, pos - 1]
+                        idx[i, pos] = idx[i, pos - 1]
+                        pos -= 1
+                    sq_dist[i, pos] = d
+                    idx[i, pos] = point
+                    count += 1
+    return idx, sq_dist
+
+
+_radius_search_serial = njit(_radius_search)
+_radius_search_parallel = njit(parallel=True)(_radius_search)
+
+
+def _as_numpy(tensor, dtype):
+    return np.ascontiguousarray(tensor.detach().cpu().numpy().astype(dtype, copy=False))
+
+
+def _as_3d(points):
+    if points.shape[1] > 3:
+        raise ValueError("Hash grid search supports up to 3 dimensions, got {}".format(points.shape[1]))
+    if points.shape[1] < 3:
+        points = np.concatenate([points, np.zeros((points.shape[0], 3 - points.shape[1]), dtype=points.dtype)], 1)
+    return points
+
+
+def hash_grid_radius(x, y, radius, max_num_neighbors, batch_x=None, batch_y=None, parallel=None):
+    """ Radius search on the CPU with a uniform hash grid of cell size ``radius``.
+
+    Parameters
+    ----------
+    x : torch.Tensor
+        [N, dim] support points, dim is at most 3
+    y : torch.Tensor
+        [M, dim] query points
+    radius : float
+        Search radius, neighbours at exactly radius are included
+    max_num_neighbors : int
+        Maximum number of neighbours per query point, the closest ones are kept
+    batch_x, batch_y : torch.Tensor, optional
+        Batch element of each point, a query point only has neighbours within its batch element
+    parallel : bool, optional
+        Queries are spread over the numba threads. Defaults to True except in data loader workers
+
+    Returns
+    -------
+    idx : torch.Tensor
+        [M, max_num_neighbors] indices in x of the neighbours, closest first and padded with -1
+    sq_dist : torch.Tensor
+        [M, max_num_neighbors] square distances, padded with -1
+    """
+    device = y.device
+    x_np = _as_3d(_as_numpy(x, np.float32))
+    y_np = _as_3d(_as_numpy(y, np.float32))
+    bx = _as_numpy(batch_x, np.int64) if batch_x is not None else np.zeros(x_np.shape[0], dtype=np.int64)
+    by = _as_numpy(batch_y, np.int64) if batch_y is not None else np.zeros(y_np.shape[0], dtype=np.int64)
+    if parallel is None:
+        parallel = torch.utils.data.get_worker_info() is None
+
+    k = int(max_num_neighbors)
+    if x_np.shape[0] == 0 or y_np.shape[0] == 0:
+        idx = np.full((y_np.shape[0], k), -1, dtype=np.int64)
+        return torch.from_numpy(idx).to(device), torch.full(idx.shape, -1.0, device=device)
+
+    # Cell coordinates relative to the lowest corner of both clouds
+    origin = np.minimum(x_np.min(0), y_np.min(0))
+    cell_x = np.floor((x_np - origin) / radius).astype(np.int64)
+    cell_y = np.floor((y_np - origin) / radius).astype(np.int64)
+    dims = np.maximum(cell_x.max(0), cell_y.max(0)) + 1
+    num_batches = int(max(bx.max(), by.max())) + 1
+    if float(num_batches) * float(np.prod(dims.astype(np.float64))) >= _MAX_CELLS:
+        raise ValueError("Radius {} is too small for the extent of the point cloud".format(radius))
+
+    # Points sorted by cell key, each cell is a contiguous range
+    keys = ((bx * dims[0] + cell_x[:, 0]) * dims[1] + cell_x[:, 1]) * dims[2] + cell_x[:, 2]
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    num_cells = num_batches * int(np.prod(dims))
+    if num_cells <= _DENSE_CELLS_PER_POINT * keys.shape[0]:
+        cell_start = np.zeros(num_cells + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys, minlength=num_cells), out=cell_start[1:])
+    else:
+        cell_start = np.empty(0, dtype=np.int64)
+
+    search = _radius_search_parallel if parallel else _radius_search_serial
+    idx, sq_dist = search(
+        np.ascontiguousarray(x_np[order]),
+        order.astype(np.int64),
+        sorted_keys,
+        cell_start,
+        y_np,
+        cell_y,
+        by,
+        dims,
+        np.float32(radius),
+        k,
+    )
+    return torch.from_numpy(idx).to(device), torch.from_numpy(sq_dist).to(device)
@@ -0,0 +1,96 @@
+from abc import ABC, abstractmethod
+import torch
+from torch_geometric.nn import knn, radius
+import torch_points_kernels as tp
+
+from torch_points3d.utils.enums import ConvolutionFormat
+from .hash_grid import hash_grid_radius
+
+_NEIGHBOUR_BACKENDS = {}
+
+
+def register_neighbour_backend(name):
+    """ Class decorator registering a neighbour search backend under ``name``,
+    finders select it with their ``backend`` argument
+    """
+
+    def decorator(cls):
+        _NEIGHBOUR_BACKENDS[name] = cls
+        return cls
+
+    return decorator
+
+
+def get_neighbour_backend(name):
+    if name not in _NEIGHBOUR_BACKENDS:
+        raise ValueError(
+            "Unknown neighbour search backend %s, available backends are %s" % (name, sorted(_NEIGHBOUR_BACKENDS))
+        )
+    return _NEIGHBOUR_BACKENDS[name]()
+
+
+class BaseNeighbourBackend(ABC):
+    """ Neighbour search implementation. Outputs depend on the convolution format:
+
+    - ``message_passing``: [2, E] edge index, first row in y and second row in x
+    - ``partial_dense``: [M, max_num_neighbors] indices in x padded with -1
+    - ``dense``: [B, M, max_num_neighbors] indices in the batch element of x, padded with the first neighbour
+    """
+
+    @abstractmethod
+    def radius(self, x, y, r, max_num_neighbors, batch_x=None, batch_y=None, conv_type="message_passing"):
+        pass
+
+    def knn(self, x, y, k, batch_x=None, batch_y=None):
+        raise NotImplementedError("%s does not support k nearest neighbours search" % self.__class__.__name__)
+
+
+@register_neighbour_backend("default")
+class DefaultNeighbourBackend(BaseNeighbourBackend):
+    """ torch_geometric for message passing and knn, torch_points_kernels ball query for the dense formats
+    """
+
+    def radius(self, x, y, r, max_num_neighbors, batch_x=None, batch_y=None, conv_type="message_passing"):
+        if conv_type == ConvolutionFormat.MESSAGE_PASSING.value:
+            return radius(x, y, r, batch_x, batch_y, max_num_neighbors=max_num_neighbors)
+        elif conv_type in [ConvolutionFormat.DENSE.value, ConvolutionFormat.PARTIAL_DENSE.value]:
+            return tp.ball_query(r, max_num_neighbors, x, y, mode=conv_type, batch_x=batch_x, batch_y=batch_y)[0]
+        else:
+            raise NotImplementedError
+
+    def knn(self, x, y, k, batch_x=None, batch_y=None):
+        return knn(x, y, k, batch_x, batch_y)
+
+
+@register_neighbour_backend("hash_grid")
+class HashGridNeighbourBackend(BaseNeighbourBackend):
+    """ Multi threaded CPU radius search with a uniform hash grid of cell size radius, see ``hash_grid_radius``.
+    When a ball contains more than max_num_neighbors points the closest ones are kept.
+    """
+
+    def radius(self, x, y, r, max_num_neighbors, batch_x=None, batch_y=None, conv_type="message_passing"):
+        if conv_type == ConvolutionFormat.MESSAGE_PASSING.value:
+            idx, _ = hash_grid_radius(x, y, r, max_num_neighbors, batch_x, batch_y)
+            valid = idx >= 0
+            row = torch.arange(idx.shape[0], device=idx.device).unsqueeze(-1).expand_as(idx)[valid]
+            return torch.stack([row, idx[valid]], dim=0)
+        elif conv_type == ConvolutionFormat.PARTIAL_DENSE.value:
+            return hash_grid_radius(x, y, r, max_num_neighbors, batch_x, batch_y)[0]
+        elif conv_type == ConvolutionFormat.DENSE.value:
+            num_batches, num_points = x.shape[:2]
+            offsets = torch.arange(num_batches, device=x.device)
+            idx, _ = hash_grid_radius(
+                x.reshape(-1, x.shape[-1]),
+                y.reshape(-1, y.shape[-1]),
+                r,
+                max_num_neighbors,
+                offsets.repeat_interleave(num_points),
+                offsets.repeat_interleave(y.shape[1]),
+            )
+            idx = idx.view(num_batches, y.shape[1], -1)
+            idx = idx - (offsets * num_points).view(-1, 1, 1)
+            # Missing neighbours are replaced by the first one (or 0) as the ball query of torch_points_kernels
+            first = idx[:, :, :1].clamp(min=0)
+            return torch.where(idx >= 0, idx, first)
+        else:
+            raise NotImplementedError
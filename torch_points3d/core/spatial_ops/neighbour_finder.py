@@ -1,11 +1,10 @@
 from abc import ABC, abstractmethod
 from typing import List, Union, cast
 import torch
-from torch_geometric.nn import knn, radius
-import torch_points_kernels as tp
 
 from torch_points3d.utils.config import is_list
 from torch_points3d.utils.enums import ConvolutionFormat
+from .neighbour_backends import get_neighbour_backend
 
 from torch_points3d.utils.debugging_vars import DEBUGGING_VARS, DistributionNeighbour
 
@@ -23,35 +22,38 @@ class BaseNeighbourFinder(ABC):
 
 
 class RadiusNeighbourFinder(BaseNeighbourFinder):
-    def __init__(self, radius: float, max_num_neighbors: int = 64, conv_type=ConvolutionFormat.MESSAGE_PASSING.value):
+    def __init__(
+        self,
+        radius: float,
+        max_num_neighbors: int = 64,
+        conv_type=ConvolutionFormat.MESSAGE_PASSING.value,
+        backend: str = "default",
+    ):
         self._radius = radius
         self._max_num_neighbors = max_num_neighbors
         self._conv_type = conv_type.lower()
+        self._backend = backend
 
     def find_neighbours(self, x, y, batch_x=None, batch_y=None):
-        if self._conv_type == ConvolutionFormat.MESSAGE_PASSING.value:
-            return radius(x, y, self._radius, batch_x, batch_y, max_num_neighbors=self._max_num_neighbors)
-        elif self._conv_type == ConvolutionFormat.DENSE.value or ConvolutionFormat.PARTIAL_DENSE.value:
-            return tp.ball_query(
-                self._radius, self._max_num_neighbors, x, y, mode=self._conv_type, batch_x=batch_x, batch_y=batch_y
-            )[0]
-        else:
-            raise NotImplementedError
+        return get_neighbour_backend(self._backend).radius(
+            x, y, self._radius, self._max_num_neighbors, batch_x, batch_y, conv_type=self._conv_type
+        )
 
 
 class KNNNeighbourFinder(BaseNeighbourFinder):
-    def __init__(self, k):
+    def __init__(self, k, backend: str = "default"):
         self.k = k
+        self._backend = backend
 
     def find_neighbours(self, x, y, batch_x, batch_y):
-        return knn(x, y, self.k, batch_x, batch_y)
+        return get_neighbour_backend(self._backend).knn(x, y, self.k, batch_x, batch_y)
 
 
 class DilatedKNNNeighbourFinder(BaseNeighbourFinder):
-    def __init__(self, k, dilation):
+    def __init__(self, k, dilation, backend: str = "default"):
         self.k = k
         self.dilation = dilation
-        self.initialFinder = KNNNeighbourFinder(k * dilation)
+        self.initialFinder = KNNNeighbourFinder(k * dilation, backend=backend)
 
     def find_neighbours(self, x, y, batch_x, batch_y):
         # find the self.k * self.dilation closest neighbours in x for each y
@@ -94,14 +96,19 @@ class MultiscaleRadiusNeighbourFinder(BaseMSNeighbourFinder):
 
         Keyword Arguments:
             max_num_neighbors {Union[int, List[int]]}  (default: {64})
+            backend {str} -- neighbour search backend, see neighbour_backends (default: {"default"})
 
         Raises:
             ValueError: [description]
     """
 
     def __init__(
-        self, radius: Union[float, List[float]], max_num_neighbors: Union[int, List[int]] = 64,
+        self,
+        radius: Union[float, List[float]],
+        max_num_neighbors: Union[int, List[int]] = 64,
+        backend: str = "default",
     ):
+        self._backend = backend
         if DEBUGGING_VARS["FIND_NEIGHBOUR_DIST"]:
             if not isinstance(radius, list):
                 radius = [radius]
@@ -138,8 +145,8 @@ class MultiscaleRadiusNeighbourFinder(BaseMSNeighbourFinder):
         if scale_idx >= self.num_scales:
             raise ValueError("Scale %i is out of bounds %i" % (scale_idx, self.num_scales))
 
-        radius_idx = radius(
-            x, y, self._radius[scale_idx], batch_x, batch_y, max_num_neighbors=self._max_num_neighbors[scale_idx]
+        radius_idx = get_neighbour_backend(self._backend).radius(
+            x, y, self._radius[scale_idx], self._max_num_neighbors[scale_idx], batch_x, batch_y
         )
         return radius_idx
 
@@ -161,7 +168,9 @@ class DenseRadiusNeighbourFinder(MultiscaleRadiusNeighbourFinder):
         if scale_idx >= self.num_scales:
             raise ValueError("Scale %i is out of bounds %i" % (scale_idx, self.num_scales))
         num_neighbours = self._max_num_neighbors[scale_idx]
-        neighbours = tp.ball_query(self._radius[scale_idx], num_neighbours, x, y)[0]
+        neighbours = get_neighbour_backend(self._backend).radius(
+            x, y, self._radius[scale_idx], num_neighbours, conv_type=ConvolutionFormat.DENSE.value
+        )
 
         if DEBUGGING_VARS["FIND_NEIGHBOUR_DIST"]:
             for i in range(neighbours.shape[0]):
@@ -1,13 +1,11 @@
 from abc import ABC, abstractmethod
 import math
 import torch
-from torch_geometric.nn import voxel_grid
-from torch_geometric.nn.pool.consecutive import consecutive_cluster
-from torch_geometric.nn.pool.pool import pool_pos, pool_batch
 import torch_points_kernels as tp
 
 from torch_points3d.utils.config import is_list
 from torch_points3d.utils.enums import ConvolutionFormat
+from .voxelize import voxelize, voxel_mean
 
 
 class BaseSampler(ABC):
@@ -72,13 +70,14 @@ class GridSampler(BaseSampler):
         if len(pos.shape) != 2:
             raise ValueError("This class is for sparse data and expects the pos tensor to be of dimension 2")
 
-        pool = voxel_grid(pos, batch, self._subsampling_param)
-        pool, perm = consecutive_cluster(pool)
-        batch = pool_batch(perm, batch)
+        # Same voxels as voxel_grid, grouped in a single pass
+        coords = ((pos - pos.min(0)[0]) / self._subsampling_param).floor()
+        pool, perm, counts = voxelize(coords, batch)
+        batch = batch[perm]
         if x is not None:
-            return pool_pos(pool, x), pool_pos(pool, pos), batch
+            return voxel_mean(x, pool, counts), voxel_mean(pos, pool, counts), batch
         else:
-            return None, pool_pos(pool, pos), batch
+            return None, voxel_mean(pos, pool, counts), batch
 
 
 class DenseFPSSampler(BaseSampler):
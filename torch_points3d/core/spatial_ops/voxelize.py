@@ -0,0 +1,94 @@
+import torch
+from torch_scatter import scatter_max, scatter_mean
+
+_MAX_KEY = 2 ** 63 - 1
+
+
+def voxel_keys(coords, batch=None):
+    """ Linearised key of the voxel of each point. The coordinates are shifted to start at 0, x varies
+    fastest, then y, z and the batch index, which is the order of ``grid_cluster`` and ``voxel_grid``.
+
+    Parameters
+    ----------
+    coords : torch.Tensor
+        [N, D] integer coordinates of the voxel of each point
+    batch : torch.Tensor, optional
+        [N] batch index of each point
+
+    Returns
+    -------
+    torch.Tensor
+        [N] keys, two points have the same key if and only if they are in the same voxel
+    """
+    coords = coords.long()
+    if batch is not None:
+        coords = torch.cat([coords, batch.long().view(-1, 1)], -1)
+    coords = coords - coords.min(0)[0]
+    dims = (coords.max(0)[0] + 1).tolist()
+    num_keys = 1
+    for dim in dims:
+        num_keys *= dim
+    if num_keys > _MAX_KEY:
+        raise ValueError("The grid has too many voxels ({}) to be linearised".format(num_keys))
+
+    keys = coords[:, -1]
+    for d in range(coords.shape[1] - 2, -1, -1):
+        keys = keys * dims[d] + coords[:, d]
+    return keys
+
+
+def voxelize(coords, batch=None, mode="mean"):
+    """ Groups the points by voxel with a single sort of their voxel keys.
+
+    Parameters
+    ----------
+    coords : torch.Tensor
+        [N, D] integer coordinates of the voxel of each point
+    batch : torch.Tensor, optional
+        [N] batch index of each point, points of different batch elements are never grouped
+    mode : str
+        ``mean`` keeps the last point of each voxel as its representative, ``last`` a random one
+
+    Returns
+    -------
+    cluster : torch.Tensor
+        [N] voxel of each point (inverse map), voxels are ordered by key
+    unique_pos_indices : torch.Tensor
+        [V] representative point of each voxel
+    counts : torch.Tensor
+        [V] number of points in each voxel
+    """
+    assert mode in ["mean", "last"]
+    num_points = coords.shape[0]
+    if num_points == 0:
+        empty = torch.zeros(0, dtype=torch.long, device=coords.device)
+        return empty, empty, empty
+
+    keys = voxel_keys(coords, batch)
+    _, cluster, counts = torch.unique(keys, sorted=True, return_inverse=True, return_counts=True)
+    if mode == "last":
+        priority = torch.rand(num_points, device=coords.device)
+    else:
+        priority = torch.arange(num_points, device=coords.device)
+    _, unique_pos_indices = scatter_max(priority, cluster, dim=0, dim_size=counts.shape[0])
+    return cluster, unique_pos_indices, counts
+
+
+def voxel_mean(item, cluster, counts):
+    """ Mean of a per point attribute in each voxel
+    """
+    if not item.is_floating_point():
+        return scatter_mean(item, cluster, dim=0, dim_size=counts.shape[0])
+    total = item.new_zeros((counts.shape[0],) + item.shape[1:]).index_add_(0, cluster, item)
+    return total / counts.view((-1,) + (1,) * (item.dim() - 1)).to(item.dtype)
+
+
+def voxel_majority(labels, cluster, num_voxels):
+    """ Most frequent label in each voxel, counted with a bincount of the (voxel, label) pairs
+    """
+    if labels.shape[0] == 0:
+        return labels.new_zeros(num_voxels)
+    label_min = labels.min()
+    num_labels = int(labels.max() - label_min) + 1
+    votes = torch.bincount(cluster * num_labels + (labels - label_min).long(), minlength=num_voxels * num_labels)
+    return (votes.view(num_voxels, num_labels).argmax(-1) + label_min).to(labels.dtype)
@@ -1,4 +1,5 @@
 import os
+import random
 from abc import ABC, abstractmethod
 import logging
 from functools import partial
@@ -9,13 +10,15 @@ from torch_geometric.transforms import Compose, FixedPoints
 import copy
 
 from torch_points3d.models import model_interface
-from torch_points3d.core.data_transform import instantiate_transforms, MultiScaleTransform
+from torch_points3d.core.data_transform import instantiate_transforms, MultiScaleTransform, CachedMultiScaleTransform
 from torch_points3d.core.data_transform import instantiate_filters
 from torch_points3d.datasets.batch import SimpleBatch
 from torch_points3d.datasets.multiscale_data import MultiScaleBatch
+from torch_points3d.datasets.samplers import PointBudgetBatchSampler, DistributedSamplerWrapper, get_num_points
 from torch_points3d.utils.enums import ConvolutionFormat
 from torch_points3d.utils.config import ConvolutionFormatFactory
 from torch_points3d.utils.colors import COLORS, colored_print
+from torch_points3d.utils.distributed import is_distributed, get_world_size, all_reduce_sum
 
 # A logger for this file
 log = logging.getLogger(__name__)
@@ -40,6 +43,12 @@ def explode_transform(transforms):
     return out
 
 
+def _worker_init_fn(worker_id):
+    # The random sphere datasets draw with numpy and random, reseeded so that workers and processes differ
+    np.random.seed()
+    random.seed()
+
+
 class BaseDataset:
     def __init__(self, dataset_opt):
         self.dataset_opt = dataset_opt
@@ -52,6 +61,7 @@ class BaseDataset:
             class_name = self.__class__.__name__.lower().replace("dataset", "")
             self._data_path = os.path.join(dataset_opt.dataroot, class_name)
         self._batch_size = None
+        self._batch_num_points = None
         self.strategies = {}
         self._contains_dataset_name = False
 
@@ -131,11 +141,14 @@ class BaseDataset:
     @staticmethod
     def _get_collate_function(conv_type, is_multiscale):
         if is_multiscale:
-            if conv_type.lower() == ConvolutionFormat.PARTIAL_DENSE.value.lower():
+            if conv_type.lower() in [
+                ConvolutionFormat.PARTIAL_DENSE.value.lower(),
+                ConvolutionFormat.MESSAGE_PASSING.value.lower(),
+            ]:
                 return lambda datalist: MultiScaleBatch.from_data_list(datalist)
             else:
                 raise NotImplementedError(
-                    "MultiscaleTransform is activated and supported only for partial_dense format"
+                    "MultiscaleTransform is activated and supported only for partial_dense and message_passing formats"
                 )
 
         is_dense = ConvolutionFormatFactory.check_is_dense_format(conv_type)
@@ -172,12 +185,13 @@ class BaseDataset:
         """ Creates the data loaders. Must be called in order to complete the setup of the Dataset
         """
         conv_type = model.conv_type
+        self._conv_type = conv_type
         self._batch_size = batch_size
+        # Batches are packed up to a number of points instead of a number of samples
+        self._batch_num_points = self.dataset_opt.get("batch_num_points", None)
 
         batch_collate_function = self.__class__._get_collate_function(conv_type, precompute_multi_scale)
-        dataloader = partial(
-            torch.utils.data.DataLoader, collate_fn=batch_collate_function, worker_init_fn=lambda _: np.random.seed()
-        )
+        dataloader = partial(self._dataloader, collate_fn=batch_collate_function, worker_init_fn=_worker_init_fn)
 
         if self.train_sampler:
             log.info(self.train_sampler)
@@ -193,7 +207,12 @@ class BaseDataset:
         if self.test_dataset:
             self._test_loaders = [
                 dataloader(
-                    dataset, batch_size=batch_size, shuffle=False, num_workers=num_workers, sampler=self.test_sampler,
+                    dataset,
+                    batch_size=batch_size,
+                    shuffle=False,
+                    num_workers=num_workers,
+                    sampler=self.test_sampler,
+                    pad=False,
                 )
                 for dataset in self.test_dataset
             ]
@@ -205,11 +224,75 @@ class BaseDataset:
                 shuffle=False,
                 num_workers=num_workers,
                 sampler=self.val_sampler,
+                pad=False,
             )
 
         if precompute_multi_scale:
             self.set_strategies(model)
 
+    def _dataloader(self, dataset, batch_size, shuffle, sampler=None, pad=True, **kwargs):
+        distributed = is_distributed()
+        if not self._batch_num_points and not distributed:
+            return torch.utils.data.DataLoader(
+                dataset, batch_size=batch_size, shuffle=shuffle, sampler=sampler, **kwargs
+            )
+
+        if sampler is None:
+            sampler = (
+                torch.utils.data.RandomSampler(dataset) if shuffle else torch.utils.data.SequentialSampler(dataset)
+            )
+        if not self._batch_num_points:
+            # Each process loads its share of the samples drawn by the sampler
+            sampler = DistributedSamplerWrapper(sampler, pad=pad)
+            log.info(sampler)
+            return torch.utils.data.DataLoader(dataset, batch_size=batch_size, sampler=sampler, **kwargs)
+
+        batch_sampler = PointBudgetBatchSampler(
+            sampler,
+            get_num_points(dataset),
+            self._batch_num_points,
+            max_batch_size=self.dataset_opt.get("max_batch_size", None),
+        )
+        if distributed:
+            # Batches are packed before being shared so that every process gets batches of the same budget
+            batch_sampler = DistributedSamplerWrapper(batch_sampler, pad=pad)
+        log.info(batch_sampler)
+        return torch.utils.data.DataLoader(dataset, batch_sampler=batch_sampler, **kwargs)
+
+    def set_epoch(self, epoch):
+        """ Sets the epoch of the distributed samplers, must be called at the beginning of each epoch for the
+        processes to draw different samples from one epoch to the next
+        """
+        loaders = [getattr(self, name) for name in ["_train_loader", "_val_loader"] if hasattr(self, name)]
+        loaders += getattr(self, "_test_loaders", [])
+        for loader in loaders:
+            for sampler in [loader.sampler, loader.batch_sampler]:
+                if isinstance(sampler, DistributedSamplerWrapper):
+                    sampler.set_epoch(epoch)
+
+    def get_batch_num_samples(self, batch):
+        """ Number of samples in a batch of the train loader, the batch size unless the batches are
+        packed up to a number of points. In a distributed training this is the number of samples of the
+        training step, summed over the batches of all the processes, so that schedulers updated on the number
+        of samples follow the same schedule whatever the number of processes.
+        """
+        if not self._batch_num_points:
+            return self.batch_size * get_world_size()
+        num_samples = int(self.get_num_samples(batch, self._conv_type))
+        if is_distributed():
+            num_samples = int(all_reduce_sum(torch.tensor([num_samples])).item())
+        return num_samples
+
+    def set_profiler(self, profiler):
+        """ Times each transform and the collate function of the data loaders with a ``StageProfiler``,
+        must be called after ``create_dataloaders``
+        """
+        loaders = [getattr(self, name) for name in ["_train_loader", "_val_loader"] if hasattr(self, name)]
+        loaders += getattr(self, "_test_loaders", [])
+        for loader in loaders:
+            loader.dataset.transform = profiler.wrap_transform(loader.dataset.transform)
+            loader.collate_fn = profiler.wrap(loader.collate_fn, "collate")
+
     @property
     def has_val_loader(self):
         return hasattr(self, "_val_loader")
@@ -402,18 +485,32 @@ class BaseDataset:
                     attr.dataset, "transform", Compose([current_transform, transform]),
                 )
 
-    def _set_multiscale_transform(self, transform):
-        for _, attr in self.__dict__.items():
+    def _set_multiscale_transform(self, transform, eval_transform=None):
+        eval_transform = eval_transform or transform
+        for name, attr in self.__dict__.items():
             if isinstance(attr, torch.utils.data.DataLoader):
-                self._set_composed_multiscale_transform(attr, transform)
+                self._set_composed_multiscale_transform(attr, transform if name == "_train_loader" else eval_transform)
 
         for loader in self._test_loaders:
-            self._set_composed_multiscale_transform(loader, transform)
+            self._set_composed_multiscale_transform(loader, eval_transform)
 
     def set_strategies(self, model):
         strategies = model.get_spatial_ops()
-        transform = MultiScaleTransform(strategies)
-        self._set_multiscale_transform(transform)
+        transform = MultiScaleTransform(strategies, conv_type=model.conv_type)
+        eval_transform = None
+        if self.dataset_opt.get("multiscale_cache", False):
+            # Validation and test samples are identical from one epoch to the next
+            cache_dir = self.dataset_opt.get("multiscale_cache_dir", None) or os.path.join(
+                self._data_path, "multiscale_cache"
+            )
+            eval_transform = CachedMultiScaleTransform(
+                strategies,
+                cache_dir=cache_dir,
+                max_items=self.dataset_opt.get("multiscale_cache_size", 256),
+                conv_type=model.conv_type,
+            )
+            log.info("Multiscale indices of the validation and test samples are cached in %s", eval_transform.cache_dir)
+        self._set_multiscale_transform(transform, eval_transform)
 
     @abstractmethod
     def get_tracker(self, wandb_log: bool, tensorboard_log: bool):
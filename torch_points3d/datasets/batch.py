@@ -1,3 +1,4 @@
+import numpy as np
 import torch
 from torch_geometric.data import Data
 
@@ -46,6 +47,9 @@ class SimpleBatch(Data):
                 or isinstance(item, float)
             ):
                 batch[key] = torch.stack(batch[key])
+            elif isinstance(item, np.ndarray):
+                # Arrays that do not go through the model (e.g. raw positions) are kept as a list
+                continue
             else:
                 raise ValueError("Unsupported attribute type")
 
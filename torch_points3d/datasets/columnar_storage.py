@@ -0,0 +1,220 @@
+import os
+import logging
+import numpy as np
+import torch
+from torch_geometric.data import Data, InMemoryDataset
+
+log = logging.getLogger(__name__)
+
+COLUMNAR_FORMAT = "columnar"
+COLUMNAR_VERSION = 1
+
+
+def columns_dir(path):
+    """ Directory holding the flat attribute files of the dataset indexed by ``path``
+    """
+    return os.path.splitext(path)[0] + "_columns"
+
+
+def is_columnar(index):
+    return isinstance(index, dict) and index.get("format") == COLUMNAR_FORMAT
+
+
+def save_columnar(data, slices, path):
+    """ Saves a collated dataset (as returned by ``InMemoryDataset.collate``) in a columnar layout.
+    Each tensor attribute is written as one raw binary file in ``columns_dir(path)`` and ``path`` contains
+    the slices and the dtype / shape of each column. Attributes that are not tensors are pickled in the index.
+
+    Parameters
+    ----------
+    data : Data
+        Collated data
+    slices : dict
+        Slices of each attribute
+    path : str
+        Path to the index file
+    """
+    directory = columns_dir(path)
+    os.makedirs(directory, exist_ok=True)
+    columns = {}
+    extra = {}
+    for key in data.keys:
+        item = data[key]
+        if not torch.is_tensor(item):
+            extra[key] = item
+            continue
+        array = np.ascontiguousarray(item.detach().cpu().numpy())
+        filename = "{}.bin".format(key)
+        tmp_path = os.path.join(directory, filename + ".tmp")
+        array.tofile(tmp_path)
+        os.replace(tmp_path, os.path.join(directory, filename))
+        columns[key] = {"file": filename, "dtype": array.dtype.str, "shape": list(array.shape)}
+
+    index = {
+        "format": COLUMNAR_FORMAT,
+        "version": COLUMNAR_VERSION,
+        "columns": columns,
+        "extra": extra,
+        "slices": slices,
+    }
+    tmp_path = path + ".tmp"
+    torch.save(index, tmp_path)
+    os.replace(tmp_path, path)  # The index is written last so that a crash never leaves a valid looking dataset
+
+
+def _open_column(path, column, mmap):
+    dtype = np.dtype(column["dtype"])
+    shape = tuple(column["shape"])
+    if int(np.prod(shape)) == 0:
+        return torch.from_numpy(np.empty(shape, dtype=dtype))
+    if mmap:
+        # Copy on write: pages are shared between processes through the page cache,
+        # in place transforms only modify a private copy of the pages they touch
+        array = np.memmap(path, dtype=dtype, mode="c", shape=shape)
+    else:
+        array = np.fromfile(path, dtype=dtype).reshape(shape)
+    return torch.from_numpy(array)
+
+
+def load_columnar(path, mmap=True, index=None):
+    """ Opens a dataset saved with :func:`save_columnar`.
+
+    Parameters
+    ----------
+    path : str
+        Path to the index file
+    mmap : bool, optional
+        If True, columns are memory mapped, otherwise they are read in memory
+    index : dict, optional
+        Index already loaded from ``path``
+
+    Returns
+    -------
+    (Data, dict)
+        data and slices, as expected by ``InMemoryDataset``
+    """
+    if index is None:
+        index = torch.load(path)
+    if not is_columnar(index):
+        raise ValueError("%s is not a columnar dataset" % path)
+    directory = columns_dir(path)
+    data = Data()
+    for key, column in index["columns"].items():
+        setattr(data, key, _open_column(os.path.join(directory, column["file"]), column, mmap))
+    for key, item in index["extra"].items():
+        setattr(data, key, item)
+    return data, index["slices"]
+
+
+def convert_to_columnar(path):
+    """ Converts a dataset saved with ``torch.save(self.collate(data_list), path)`` to the columnar layout.
+    The original file is replaced by the columnar index, converting an already columnar dataset is a no-op.
+    """
+    content = torch.load(path)
+    if is_columnar(content):
+        return
+    if not (isinstance(content, (tuple, list)) and len(content) == 2 and isinstance(content[1], dict)):
+        raise ValueError("%s does not contain a collated dataset" % path)
+    data, slices = content
+    log.info("Converting %s to columnar storage", path)
+    save_columnar(data, slices, path)
+
+
+def save_processed(collated, path, columnar=False):
+    """ Saves the output of ``InMemoryDataset.collate`` either as a single torch file or as columns
+    """
+    if columnar:
+        save_columnar(collated[0], collated[1], path)
+    else:
+        torch.save(collated, path)
+
+
+def load_processed(path, columnar=False, mmap=True):
+    """ Loads a processed dataset saved with :func:`save_processed`, the layout is detected automatically.
+
+    Parameters
+    ----------
+    path : str
+        Path to the processed file
+    columnar : bool, optional
+        If True, a dataset saved as a single torch file is converted to the columnar layout first
+    mmap : bool, optional
+        Memory map columnar datasets instead of reading them in memory
+
+    Returns
+    -------
+    (Data, dict)
+        data and slices, as expected by ``InMemoryDataset``
+    """
+    content = torch.load(path)
+    if is_columnar(content):
+        return load_columnar(path, mmap=mmap, index=content)
+    if columnar:
+        save_columnar(content[0], content[1], path)
+        del content
+        return load_columnar(path, mmap=mmap)
+    return content
+
+
+def split_collated(data, slices):
+    """ Splits a collated dataset back into its samples, the tensors of the samples are views on the columns
+
+    Returns
+    -------
+    list
+        Samples in the order they were collated
+    """
+    num_samples = len(next(iter(slices.values()))) - 1
+    samples = []
+    for idx in range(num_samples):
+        sample = data.__class__()
+        for key in data.keys:
+            item, item_slices = data[key], slices[key]
+            start, end = int(item_slices[idx]), int(item_slices[idx + 1])
+            if torch.is_tensor(item):
+                s = [slice(None)] * item.dim()
+                s[data.__cat_dim__(key, item)] = slice(start, end)
+                sample[key] = item[tuple(s)]
+            else:
+                sample[key] = item[start:end]
+        samples.append(sample)
+    return samples
+
+
+def save_data_list(data_list, path, columnar=False):
+    """ Saves a list of samples that are kept as separate objects once loaded (the areas of S3DIS for example),
+    either as a single torch file or collated as columns
+    """
+    if columnar:
+        if not isinstance(data_list, list):
+            data_list = [data_list]
+        save_columnar(*InMemoryDataset.collate(None, data_list), path)
+    else:
+        torch.save(data_list, path)
+
+
+def load_data_list(path, columnar=False, mmap=True):
+    """ Loads a list of samples saved with :func:`save_data_list`, the layout is detected automatically.
+
+    Parameters
+    ----------
+    path : str
+        Path to the processed file
+    columnar : bool, optional
+        If True, samples saved as a single torch file are converted to the columnar layout first
+    mmap : bool, optional
+        Memory map columnar datasets instead of reading them in memory
+
+    Returns
+    -------
+    list
+        Samples
+    """
+    content = torch.load(path)
+    if not is_columnar(content):
+        data_list = content if isinstance(content, list) else [content]
+        if not columnar:
+            return data_list
+        save_data_list(data_list, path, columnar=True)
+        del content, data_list
+    return split_collated(*load_processed(path, mmap=mmap))
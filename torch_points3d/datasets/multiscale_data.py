@@ -55,12 +55,13 @@ class MultiScaleData(Data):
 
 class MultiScaleBatch(MultiScaleData):
     @staticmethod
-    def from_data_list(data_list, follow_batch=[]):
+    def from_data_list(data_list, follow_batch=[], pin_memory=False):
         r"""Constructs a batch object from a python list holding
         :class:`torch_geometric.data.Data` objects.
         The assignment vector :obj:`batch` is created on the fly.
         Additionally, creates assignment batch vectors for each key in
-        :obj:`follow_batch`."""
+        :obj:`follow_batch`. The multiscale and upsample tensors are
+        allocated in page locked memory if :obj:`pin_memory` is set."""
         for data in data_list:
             assert isinstance(data, MultiScaleData)
         num_scales = data_list[0].num_scales
@@ -76,7 +77,7 @@ class MultiScaleBatch(MultiScaleData):
             ms_scale = []
             for data_entry in data_list:
                 ms_scale.append(data_entry.multiscale[scale])
-            multiscale.append(from_data_list_token(ms_scale))
+            multiscale.append(from_data_list_token(ms_scale, pin_memory=pin_memory))
 
         # Build upsample batches
         upsample = []
@@ -84,7 +85,7 @@ class MultiScaleBatch(MultiScaleData):
             upsample_scale = []
             for data_entry in data_list:
                 upsample_scale.append(data_entry.upsample[scale])
-            upsample.append(from_data_list_token(upsample_scale))
+            upsample.append(from_data_list_token(upsample_scale, pin_memory=pin_memory))
 
         # Create batch from non multiscale data
         for data_entry in data_list:
@@ -101,63 +102,98 @@ class MultiScaleBatch(MultiScaleData):
         return batch
 
 
-def from_data_list_token(data_list, follow_batch=[]):
+def from_data_list_token(data_list, follow_batch=[], pin_memory=False):
     """ This is pretty a copy paste of the from data list of pytorch geometric
-    batch object with the difference that indexes that are negative are not incremented
+    batch object with the difference that indexes that are negative are not incremented.
+    Each attribute is concatenated once into a preallocated tensor and incremented in place,
+    the input data objects are left untouched.
+
+    Parameters
+    ----------
+    data_list : List[Data]
+        Data objects to collate
+    follow_batch : List[str], optional
+        Creates assignment batch vectors for each of these keys
+    pin_memory : bool, optional
+        Allocates the output tensors in page locked memory. Only use it when collating
+        in the main process (``num_workers == 0``), CUDA cannot be initialised in forked workers
     """
 
     keys = [set(data.keys) for data in data_list]
     keys = list(set.union(*keys))
     assert "batch" not in keys
 
+    pin_memory = pin_memory and torch.cuda.is_available()
+
     batch = Batch()
     batch.__data_class__ = data_list[0].__class__
-    batch.__slices__ = {key: [0] for key in keys}
+    batch.__slices__ = {}
 
     for key in keys:
-        batch[key] = []
-
-    for key in follow_batch:
-        batch["{}_batch".format(key)] = []
-
-    cumsum = {key: 0 for key in keys}
-    batch.batch = []
-    for i, data in enumerate(data_list):
-        for key in data.keys:
-            item = data[key]
-            if torch.is_tensor(item) and item.dtype != torch.bool and cumsum[key] > 0:
-                mask = item >= 0
-                item[mask] = item[mask] + cumsum[key]
-            if torch.is_tensor(item):
-                size = item.size(data.__cat_dim__(key, data[key]))
-            else:
-                size = 1
-            batch.__slices__[key].append(size + batch.__slices__[key][-1])
-            cumsum[key] += data.__inc__(key, item)
-            batch[key].append(item)
-
-            if key in follow_batch:
-                item = torch.full((size,), i, dtype=torch.long)
-                batch["{}_batch".format(key)].append(item)
-
-        num_nodes = data.num_nodes
-        if num_nodes is not None:
-            item = torch.full((num_nodes,), i, dtype=torch.long)
-            batch.batch.append(item)
-
-    if num_nodes is None:
-        batch.batch = None
-
-    for key in batch.keys:
-        item = batch[key][0]
+        samples = [i for i, data in enumerate(data_list) if key in data.keys]
+        items = [data_list[i][key] for i in samples]
+        item = items[0]
         if torch.is_tensor(item):
-            batch[key] = torch.cat(batch[key], dim=data_list[0].__cat_dim__(key, item))
+            cat_dim = data_list[samples[0]].__cat_dim__(key, item)
+            cat_dim = cat_dim + item.dim() if cat_dim < 0 else cat_dim
+            sizes = [it.size(cat_dim) for it in items]
+            incs = [data_list[i].__inc__(key, it) for i, it in zip(samples, items)]
+            batch[key] = _cat(items, cat_dim, pin_memory)
+            _increment_non_negative(batch[key], cat_dim, sizes, incs)
         elif isinstance(item, int) or isinstance(item, float):
-            batch[key] = torch.tensor(batch[key])
+            sizes = [1] * len(items)
+            batch[key] = torch.tensor(items)
         else:
             raise ValueError("Unsupported attribute type {} : {}".format(type(item), item))
+        batch.__slices__[key] = [0] + torch.tensor(sizes).cumsum(0).tolist()
+
+        if key in follow_batch:
+            batch["{}_batch".format(key)] = torch.repeat_interleave(torch.tensor(samples), torch.tensor(sizes))
+
+    num_nodes = [data.num_nodes for data in data_list]
+    if num_nodes[-1] is None:
+        batch.batch = None
+    else:
+        counts = torch.tensor([n if n is not None else 0 for n in num_nodes])
+        batch.batch = torch.repeat_interleave(torch.arange(len(data_list)), counts)
 
     if torch_geometric.is_debug_enabled():
         batch.debug()
 
     return batch.contiguous()
+
+
+def _cat(items, dim, pin_memory):
+    """ Concatenates ``items`` along ``dim`` into a single preallocated tensor
+    """
+    shape = list(items[0].shape)
+    shape[dim] = sum(item.size(dim) for item in items)
+    out = torch.empty(shape, dtype=items[0].dtype, pin_memory=pin_memory)
+    return torch.cat(items, dim=dim, out=out)
+
+
+def _increment_non_negative(item, dim, sizes, incs):
+    """ Adds to each sample of the concatenated ``item`` the cumulated increment of the previous samples,
+    negative values (e.g. shadow neighbours) are left untouched. Increments are either scalars or tensors
+    that broadcast against a sample (e.g. one increment per row of an ``edge_index``)
+    """
+    if item.dtype == torch.bool:
+        return
+    if any(torch.is_tensor(inc) for inc in incs):
+        offset = None
+        start = 0
+        for size, inc in zip(sizes, incs):
+            if offset is not None:
+                sample = item.narrow(dim, start, size)
+                sample.add_((sample >= 0).to(item.dtype) * offset)
+            offset = inc if offset is None else offset + inc
+            start += size
+        return
+    offsets = torch.tensor([0] + incs[:-1]).cumsum(0).tolist()
+    start = 0
+    for size, offset in zip(sizes, offsets):
+        if offset != 0:
+            # In place masked add, no expanded copy of the offsets is materialised
+            sample = item.narrow(dim, start, size)
+            sample.add_(sample >= 0, alpha=offset)
+        start += size
@@ -1,11 +1,14 @@
 import json
 import logging
+import multiprocessing
 import numpy as np
 import os
 import os.path as osp
 from plyfile import PlyData
 import shutil
+import time
 import torch
+from tqdm.auto import tqdm as tq
 
 from torch_geometric.data import Dataset, download_url, extract_zip
 from torch_geometric.data import Data
@@ -21,6 +24,73 @@ from torch_points3d.datasets.registration.utils import PatchExtractor
 
 log = logging.getLogger(__name__)
 
+# Number of fragment pairs matched by a worker at once
+MATCHING_CHUNK_SIZE = 16
+
+
+def _save_positions(path, positions_path):
+    """
+    saves the positions of a fragment as a .npy file that can be memory mapped
+    and returns its bounding box
+    """
+    if osp.exists(positions_path):
+        pos = np.load(positions_path, mmap_mode='r')
+    else:
+        pos = torch.load(path).pos.numpy()
+        tmp_path = positions_path + '.tmp.npy'
+        np.save(tmp_path, pos)
+        os.replace(tmp_path, positions_path)
+    return np.stack([pos.min(0), pos.max(0)])
+
+
+def _boxes_intersect(box1, box2, margin):
+    return bool(np.all(box1[0] <= box2[1] + margin) and np.all(box2[0] <= box1[1] + margin))
+
+
+def _inside_box(pos, box, margin):
+    """
+    indices of the points that are in a bounding box extended by margin
+    """
+    return np.flatnonzero(np.all((pos >= box[0] - margin) & (pos <= box[1] + margin), 1))
+
+
+def _match_pairs(args):
+    """
+    computes the matches of a chunk of fragment pairs. Positions are memory
+    mapped .npy files and only the points that are in the extended bounding
+    box of the other fragment are read, the others cannot have a match.
+    Returns None for the pairs whose overlap is not in the requested range.
+    """
+    pairs, max_dist_overlap, min_overlap_ratio, max_overlap_ratio = args
+    # Slightly larger than the matching radius so that rounding never prunes a match
+    margin = 1.01 * max_dist_overlap
+    results = []
+    for path1, path2, positions1, positions2, box1, box2 in pairs:
+        pos1 = np.load(positions1, mmap_mode='r')
+        # Upper bound of the overlap: points of the source that are in the extended bounding box of the target
+        ind1 = _inside_box(pos1, box2, margin)
+        if len(ind1) / len(pos1) <= min_overlap_ratio:
+            results.append(None)
+            continue
+        pos2 = np.load(positions2, mmap_mode='r')
+        ind2 = _inside_box(pos2, box1, margin)
+        match = compute_overlap_and_matches(
+            Data(pos=torch.from_numpy(np.ascontiguousarray(pos1[ind1]))),
+            Data(pos=torch.from_numpy(np.ascontiguousarray(pos2[ind2]))),
+            max_dist_overlap)
+        # Back to the indices and the number of points of the full fragments
+        if len(match['pair']):
+            match['pair'] = np.stack([ind1[match['pair'][:, 0]], ind2[match['pair'][:, 1]]], 1)
+        match['overlap'] = [len(match['pair']) / len(pos1)]
+        match['path_source'] = path1
+        match['path_target'] = path2
+        if(np.max(match['overlap']) > min_overlap_ratio and
+           np.max(match['overlap']) < max_overlap_ratio):
+            results.append(match)
+        else:
+            results.append(None)
+    return results
+
 
 class Base3DMatch(Dataset):
 
@@ -53,7 +123,8 @@ class Base3DMatch(Dataset):
                  num_random_pt=5000,
                  is_offline=False,
                  radius_patch=None,
-                 pre_transform_patch=None):
+                 pre_transform_patch=None,
+                 process_workers=1):
         r"""
         the Princeton 3DMatch dataset from the
         `"3DMatch: Learning Local Geometric Descriptors from RGB-D Reconstructions"
@@ -93,6 +164,9 @@ class Base3DMatch(Dataset):
                 :obj:`torch_geometric.data.Data` object and returns a boolean
                 value, indicating whether the data object should be included in the
                 final dataset. (default: :obj:`None`)
+
+            process_workers (int, optional): number of processes used to
+                compute the matches between fragments. (default: :obj:`1`)
         """
 
         self.verbose = verbose
@@ -115,6 +189,7 @@ class Base3DMatch(Dataset):
         self.num_random_pt = num_random_pt
         self.radius_patch = radius_patch
         self.pre_transform_patch = pre_transform_patch
+        self.process_workers = process_workers
         if mode not in self.dict_urls.keys():
             raise RuntimeError('this mode {} does '
                                'not exist'
@@ -235,44 +310,106 @@ class Base3DMatch(Dataset):
                         data = self.pre_transform(data)
                     torch.save(data, osp.join(out_dir, path))
 
-    def _compute_matches_between_fragments(self, mod):
-
-        out_dir = osp.join(self.processed_dir,
-                           mod, 'matches')
-        if files_exist([out_dir]):  # pragma: no cover
-            return
-        makedirs(out_dir)
-        ind = 0
-        for scene_path in os.listdir(osp.join(self.raw_dir, mod)):
+    def _list_fragment_pairs(self, mod, positions_dir):
+        """
+        lists the pairs of fragments of each sequence whose bounding boxes
+        intersect, other pairs cannot overlap. Each fragment is loaded once
+        to save its positions in positions_dir.
+        """
+        margin = 1.01 * self.max_dist_overlap
+        pairs = []
+        num_pairs = 0
+        for scene_path in sorted(os.listdir(osp.join(self.raw_dir, mod))):
 
             list_seq = sorted([f for f in os.listdir(osp.join(self.raw_dir, mod,
                                                               scene_path)) if 'seq' in f])
             for seq in list_seq:
-                log.info("{}, {}".format(scene_path, seq))
                 fragment_dir = osp.join(self.processed_dir,
                                         mod, 'fragment',
                                         scene_path, seq)
                 list_fragment_path = sorted([osp.join(fragment_dir, f)
                                              for f in os.listdir(fragment_dir)
                                              if 'fragment' in f])
-                log.info("compute_overlap_and_matches")
+                list_positions_path = [osp.join(positions_dir, '{}_{}_{}.npy'.format(
+                    scene_path, seq, osp.splitext(osp.basename(path))[0]))
+                    for path in list_fragment_path]
+                boxes = [_save_positions(path, positions_path)
+                         for path, positions_path in zip(list_fragment_path, list_positions_path)]
+                for i in range(len(list_fragment_path)):
+                    for j in range(i + 1, len(list_fragment_path)):
+                        num_pairs += 1
+                        if _boxes_intersect(boxes[i], boxes[j], margin):
+                            pairs.append((list_fragment_path[i], list_fragment_path[j],
+                                          list_positions_path[i], list_positions_path[j],
+                                          boxes[i], boxes[j]))
+        log.info("{} / {} pairs of fragments with intersecting bounding boxes".format(len(pairs), num_pairs))
+        return pairs
 
-                for path1 in list_fragment_path:
-                    for path2 in list_fragment_path:
-                        if path1 < path2:
+    def _compute_matches_between_fragments(self, mod):
+        """
+        computes the matches between the fragments of each sequence with
+        process_workers processes. Matches are saved in the order of the pairs
+        and the progress is recorded in progress.json so that an interrupted
+        computation resumes from the last saved pair.
+        """
+        out_dir = osp.join(self.processed_dir,
+                           mod, 'matches')
+        progress_path = osp.join(out_dir, 'progress.json')
+        if files_exist([out_dir]) and not osp.exists(progress_path):  # pragma: no cover
+            return
+        makedirs(out_dir)
+        progress = dict(num_pairs=0, num_matches=0)
+        if osp.exists(progress_path):
+            with open(progress_path, 'r') as f:
+                progress = json.load(f)
+            log.info("Resuming the computation of the matches from pair {}".format(progress['num_pairs']))
+        else:
+            self._save_progress(progress, progress_path)
+
+        positions_dir = osp.join(self.processed_dir, mod, 'fragment_positions')
+        makedirs(positions_dir)
+        pairs = self._list_fragment_pairs(mod, positions_dir)[progress['num_pairs']:]
+        chunks = [(pairs[i:i + MATCHING_CHUNK_SIZE], self.max_dist_overlap,
+                   self.min_overlap_ratio, self.max_overlap_ratio)
+                  for i in range(0, len(pairs), MATCHING_CHUNK_SIZE)]
+
+        log.info("compute_overlap_and_matches")
+        start = time.time()
+        num_done = 0
+        if self.process_workers > 1:
+            pool = multiprocessing.Pool(processes=self.process_workers)
+            results = pool.imap(_match_pairs, chunks)
+        else:
+            pool = None
+            results = map(_match_pairs, chunks)
+        try:
+            with tq(total=len(pairs)) as progress_bar:
+                for chunk_results in results:
+                    for match in chunk_results:
+                        if match is not None:
                             out_path = osp.join(out_dir,
-                                                'matches{:06d}.npy'.format(ind))
-                            data1 = torch.load(path1)
-                            data2 = torch.load(path2)
-                            match = compute_overlap_and_matches(
-                                data1, data2, self.max_dist_overlap)
-                            match['path_source'] = path1
-                            match['path_target'] = path2
-
-                            if(np.max(match['overlap']) > self.min_overlap_ratio and
-                               np.max(match['overlap']) < self.max_overlap_ratio):
-                                np.save(out_path, match)
-                                ind += 1
+                                                'matches{:06d}.npy'.format(progress['num_matches']))
+                            np.save(out_path, match)
+                            progress['num_matches'] += 1
+                    progress['num_pairs'] += len(chunk_results)
+                    self._save_progress(progress, progress_path)
+                    num_done += len(chunk_results)
+                    progress_bar.update(len(chunk_results))
+                    progress_bar.set_postfix(pairs_per_s=num_done / max(time.time() - start, 1e-6))
+        finally:
+            if pool is not None:
+                pool.terminate()
+        log.info("{} matches out of {} pairs in {:.1f}s".format(
+            progress['num_matches'], progress['num_pairs'], time.time() - start))
+        os.remove(progress_path)
+        shutil.rmtree(positions_dir)
+
+    @staticmethod
+    def _save_progress(progress, progress_path):
+        tmp_path = progress_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(progress, f)
+        os.replace(tmp_path, progress_path)
 
     def _save_patches(self, mod):
         """
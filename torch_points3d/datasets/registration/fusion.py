@@ -312,6 +312,216 @@ class TSDFVolume:
         return pcd
 
 
+
+@njit(parallel=True)
+def _integrate_blocks(tsdf_blocks, weight_blocks, block_coords, slots, vol_dim, vol_origin, voxel_size,
+                      cam_intr, world2cam, depth_im, trunc_margin, obs_weight):
+    """Integrates a depth image into the allocated blocks of a sparse volume, one block per thread.
+    Each voxel goes through the same computations as the dense CPU path of TSDFVolume.
+    """
+    im_h, im_w = depth_im.shape
+    block_size = tsdf_blocks.shape[1]
+    intr = cam_intr.astype(np.float32)
+    fx, fy = intr[0, 0], intr[1, 1]
+    cx, cy = intr[0, 2], intr[1, 2]
+    for b in prange(block_coords.shape[0]):
+        slot = slots[b]
+        for i in range(block_size):
+            vx = block_coords[b, 0] * block_size + i
+            if vx >= vol_dim[0]:
+                continue
+            wx = np.float32(vol_origin[0] + voxel_size * vx)
+            for j in range(block_size):
+                vy = block_coords[b, 1] * block_size + j
+                if vy >= vol_dim[1]:
+                    continue
+                wy = np.float32(vol_origin[1] + voxel_size * vy)
+                for k in range(block_size):
+                    vz = block_coords[b, 2] * block_size + k
+                    if vz >= vol_dim[2]:
+                        continue
+                    wz = np.float32(vol_origin[2] + voxel_size * vz)
+                    # World coordinates to camera coordinates
+                    cam_x = world2cam[0, 0] * wx + world2cam[0, 1] * wy + world2cam[0, 2] * wz + world2cam[0, 3]
+                    cam_y = world2cam[1, 0] * wx + world2cam[1, 1] * wy + world2cam[1, 2] * wz + world2cam[1, 3]
+                    cam_z = world2cam[2, 0] * wx + world2cam[2, 1] * wy + world2cam[2, 2] * wz + world2cam[2, 3]
+                    if cam_z <= 0:
+                        continue
+                    pix_x = int(np.round((cam_x * fx / cam_z) + cx))
+                    pix_y = int(np.round((cam_y * fy / cam_z) + cy))
+                    if pix_x < 0 or pix_x >= im_w or pix_y < 0 or pix_y >= im_h:
+                        continue
+                    depth_val = depth_im[pix_y, pix_x]
+                    depth_diff = depth_val - cam_z
+                    if depth_val <= 0 or depth_diff < -trunc_margin:
+                        continue
+                    dist = min(1., depth_diff / trunc_margin)
+                    w_old = weight_blocks[slot, i, j, k]
+                    w_new = np.float32(w_old + obs_weight)
+                    weight_blocks[slot, i, j, k] = w_new
+                    tsdf_blocks[slot, i, j, k] = (w_old * tsdf_blocks[slot, i, j, k] + obs_weight * dist) / w_new
+
+
+class SparseTSDFVolume:
+    """Volumetric TSDF Fusion of RGB-D Images on the CPU with a sparse volume.
+    The volume is split in blocks of block_size^3 voxels that are only allocated when
+    they intersect the view frustum of a frame, a table indexed by block gives the storage
+    slot of each allocated block. Frames are integrated in parallel over the blocks with numba.
+    Voxels that are never integrated have a TSDF of 1 and a weight of 0 as in TSDFVolume,
+    which gives the same volume with a fraction of the memory.
+    """
+    def __init__(self, vol_bnds, voxel_size, block_size=8):
+        """Constructor.
+        Args:
+        vol_bnds (ndarray): An ndarray of shape (3, 2). Specifies the
+        xyz bounds (min/max) in meters.
+        voxel_size (float): The volume discretization in meters.
+        block_size (int): Number of voxels along each side of a block.
+        """
+        vol_bnds = np.asarray(vol_bnds)
+        assert vol_bnds.shape == (3, 2), "[!] `vol_bnds` should be of shape (3, 2)."
+
+        # Define voxel volume parameters
+        self._vol_bnds = vol_bnds
+        self._voxel_size = float(voxel_size)
+        self._trunc_margin = 5 * self._voxel_size  # truncation on SDF
+        self._block_size = block_size
+
+        # Adjust volume bounds and ensure C-order contiguous
+        self._vol_dim = np.ceil(
+            (self._vol_bnds[:, 1] - self._vol_bnds[:, 0]) /
+            self._voxel_size).copy(order='C').astype(int)
+        self._vol_bnds[:, 1] = self._vol_bnds[:, 0]+self._vol_dim*self._voxel_size
+        self._vol_origin = self._vol_bnds[:, 0].copy(order='C').astype(np.float32)
+
+        self._num_blocks = (self._vol_dim + block_size - 1) // block_size
+        self._block_slots = np.full(np.prod(self._num_blocks), -1, dtype=np.int64)
+        self._block_coords = np.empty((0, 3), dtype=np.int64)
+        self._tsdf_blocks = np.ones((0, block_size, block_size, block_size), dtype=np.float32)
+        self._weight_blocks = np.zeros((0, block_size, block_size, block_size), dtype=np.float32)
+
+    @property
+    def num_allocated_blocks(self):
+        return self._block_coords.shape[0]
+
+    def _frustum_blocks(self, depth_im, cam_intr, cam_pose):
+        """Coordinates of the blocks that intersect the view frustum of the frame.
+        A block is discarded when its 8 corners are on the outer side of one of the planes of the
+        frustum, extended by one pixel and by the truncation margin along the optical axis.
+        """
+        max_depth = np.max(depth_im)
+        if max_depth <= 0:
+            return np.empty((0, 3), dtype=np.int64)
+        # Blocks of the bounding box of the frustum
+        view_frust_pts = get_view_frustum(depth_im, cam_intr, cam_pose)
+        low = np.floor((view_frust_pts.min(1) - self._trunc_margin - self._vol_origin) / self._voxel_size)
+        high = np.ceil((view_frust_pts.max(1) + self._trunc_margin - self._vol_origin) / self._voxel_size)
+        low = np.clip(low, 0, self._vol_dim - 1).astype(int) // self._block_size
+        high = np.clip(high, 0, self._vol_dim - 1).astype(int) // self._block_size
+        if np.any(high < low):
+            return np.empty((0, 3), dtype=np.int64)
+        block_coords = np.stack(np.meshgrid(
+            *[np.arange(low[i], high[i] + 1) for i in range(3)], indexing='ij'), -1).reshape(-1, 3)
+
+        # Extreme voxels of each block in camera coordinates, [num_blocks, 8, 3]
+        offsets = np.stack(np.meshgrid([0, 1], [0, 1], [0, 1], indexing='ij'), -1).reshape(-1, 3)
+        corners = block_coords[:, None, :] * self._block_size + offsets * (self._block_size - 1)
+        corners = np.minimum(corners, self._vol_dim - 1) * self._voxel_size + self._vol_origin
+        world2cam = np.linalg.inv(cam_pose)
+        corners = corners @ world2cam[:3, :3].T + world2cam[:3, 3]
+        x, y, z = corners[..., 0], corners[..., 1], corners[..., 2]
+        im_h, im_w = depth_im.shape
+        fx, fy = cam_intr[0, 0], cam_intr[1, 1]
+        cx, cy = cam_intr[0, 2], cam_intr[1, 2]
+        outside = (
+            np.all(z <= 0, 1)
+            | np.all(z > max_depth + self._trunc_margin, 1)
+            | np.all(x * fx + (cx + 1) * z < 0, 1)
+            | np.all(x * fx + (cx - im_w) * z > 0, 1)
+            | np.all(y * fy + (cy + 1) * z < 0, 1)
+            | np.all(y * fy + (cy - im_h) * z > 0, 1)
+        )
+        return block_coords[~outside]
+
+    def _allocate(self, block_coords):
+        """Storage slots of the blocks, blocks that are not allocated yet are added
+        """
+        ids = np.ravel_multi_index(block_coords.T, self._num_blocks)
+        new = self._block_slots[ids] < 0
+        num_new = int(new.sum())
+        if num_new:
+            start = self._block_coords.shape[0]
+            self._block_slots[ids[new]] = np.arange(start, start + num_new)
+            self._block_coords = np.concatenate([self._block_coords, block_coords[new]])
+            shape = (num_new,) + self._tsdf_blocks.shape[1:]
+            self._tsdf_blocks = np.concatenate([self._tsdf_blocks, np.ones(shape, dtype=np.float32)])
+            self._weight_blocks = np.concatenate([self._weight_blocks, np.zeros(shape, dtype=np.float32)])
+        return self._block_slots[ids]
+
+    def integrate(self, depth_im, cam_intr, cam_pose, obs_weight=1.):
+        """Integrate an RGB-D frame into the TSDF volume.
+        Args:
+        depth_im (ndarray): A depth image of shape (H, W).
+        cam_intr (ndarray): The camera intrinsics matrix of shape (3, 3).
+        cam_pose (ndarray): The camera pose (i.e. extrinsics) of shape (4, 4).
+        obs_weight (float): The weight to assign for the current observation.
+        """
+        block_coords = self._frustum_blocks(depth_im, cam_intr, cam_pose)
+        if block_coords.shape[0] == 0:
+            return
+        slots = self._allocate(block_coords)
+        _integrate_blocks(self._tsdf_blocks, self._weight_blocks, block_coords, slots,
+                          self._vol_dim, self._vol_origin, self._voxel_size,
+                          np.asarray(cam_intr, dtype=np.float64), np.linalg.inv(cam_pose),
+                          np.asarray(depth_im, dtype=np.float64), self._trunc_margin, float(obs_weight))
+
+    def _voxel_coords(self):
+        """Voxel coordinates of every voxel of the allocated blocks, [num_blocks, B, B, B, 3]
+        """
+        local = np.stack(np.meshgrid(*[np.arange(self._block_size)] * 3, indexing='ij'), -1)
+        return self._block_coords[:, None, None, None, :] * self._block_size + local
+
+    def get_volume(self):
+        """Dense TSDF and weight volumes
+        """
+        tsdf_vol = np.ones(self._vol_dim, dtype=np.float32)
+        weight_vol = np.zeros(self._vol_dim, dtype=np.float32)
+        coords = self._voxel_coords()
+        inside = np.all(coords < self._vol_dim, -1)
+        coords = coords[inside]
+        tsdf_vol[coords[:, 0], coords[:, 1], coords[:, 2]] = self._tsdf_blocks[inside]
+        weight_vol[coords[:, 0], coords[:, 1], coords[:, 2]] = self._weight_blocks[inside]
+        return tsdf_vol, weight_vol
+
+    def get_mesh(self):
+        """Compute a mesh from the voxel volume using marching cubes.
+        """
+        tsdf_vol, _ = self.get_volume()
+
+        # Marching cubes
+        verts, faces, norms, vals = measure.marching_cubes_lewiner(tsdf_vol,
+                                                                   level=0)
+
+        verts = verts*self._voxel_size+self._vol_origin
+        # voxel grid coordinates to world coordinates
+        return verts, faces, norms
+
+    def get_point_cloud(self, tsdf_thresh, weight_thresh):
+        """
+        compute the surface pointcloud from the allocated blocks, points are
+        in the same order as TSDFVolume.get_point_cloud
+        """
+        coords = self._voxel_coords()
+        mask = np.logical_and(np.abs(self._tsdf_blocks) < tsdf_thresh,
+                              self._weight_blocks > weight_thresh)
+        mask = np.logical_and(mask, np.all(coords < self._vol_dim, -1))
+        pcd_ind = coords[mask]
+        pcd_ind = pcd_ind[np.argsort(np.ravel_multi_index(pcd_ind.T, self._vol_dim))]
+
+        pcd = pcd_ind.astype(float) * self._voxel_size+self._vol_origin
+        return pcd
+
+
 def rigid_transform(xyz, transform):
     """Applies a rigid transform to an (N, 3) pointcloud.
         """
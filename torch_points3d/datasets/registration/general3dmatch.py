@@ -38,6 +38,7 @@ class Patch3DMatch(Base3DMatch):
         num_random_pt=5000,
         is_offline=False,
         pre_transform_patch=None,
+        process_workers=1,
     ):
         r"""
         Patch extracted from :the Princeton 3DMatch dataset\n
@@ -93,6 +94,8 @@ class Patch3DMatch(Base3DMatch):
                 value, indicating whether the data object should be included in the
                 final dataset. (default: :obj:`None`)
             num_random_pt: number of point we select
+
+            process_workers: number of processes used to compute the matches between fragments
         """
         self.is_patch = True
         super(Patch3DMatch, self).__init__(
@@ -115,6 +118,7 @@ class Patch3DMatch(Base3DMatch):
             is_offline,
             radius_patch,
             pre_transform_patch,
+            process_workers=process_workers,
         )
 
         self.radius_patch = radius_patch
@@ -222,6 +226,8 @@ class Fragment3DMatch(Base3DMatch):
                 value, indicating whether the data object should be included in the
                 final dataset. (default: :obj:`None`)
             num_random_pt: number of point we select when we test
+
+            process_workers: number of processes used to compute the matches between fragments
         """
     def __init__(
         self,
@@ -243,6 +249,7 @@ class Fragment3DMatch(Base3DMatch):
         debug=False,
         is_online_matching=False,
         num_pos_pairs=1024,
+        process_workers=1,
     ):
 
 
@@ -264,6 +271,7 @@ class Fragment3DMatch(Base3DMatch):
             pre_filter,
             verbose,
             debug,
+            process_workers=process_workers,
         )
         self.path_match = osp.join(self.processed_dir, self.mode, "matches")
         self.list_fragment = [f for f in os.listdir(self.path_match) if "matches" in f]
@@ -336,6 +344,7 @@ class General3DMatchDataset(BaseSiameseDataset):
                 num_random_pt=dataset_opt.num_random_pt,
                 is_offline=dataset_opt.is_offline,
                 pre_filter=pre_filter,
+                process_workers=dataset_opt.get("process_workers", 1),
             )
 
             self.test_dataset = Patch3DMatch(
@@ -353,6 +362,7 @@ class General3DMatchDataset(BaseSiameseDataset):
                 num_random_pt=dataset_opt.num_random_pt,
                 is_offline=dataset_opt.is_offline,
                 pre_filter=test_pre_filter,
+                process_workers=dataset_opt.get("process_workers", 1),
             )
         else:
 
@@ -369,7 +379,8 @@ class General3DMatchDataset(BaseSiameseDataset):
                 transform=train_transform,
                 pre_filter=pre_filter,
                 is_online_matching=dataset_opt.is_online_matching,
-                num_pos_pairs=dataset_opt.num_pos_pairs)
+                num_pos_pairs=dataset_opt.num_pos_pairs,
+                process_workers=dataset_opt.get("process_workers", 1))
 
             self.test_dataset = Fragment3DMatch(
                 root=self._data_path,
@@ -384,6 +395,7 @@ class General3DMatchDataset(BaseSiameseDataset):
                 transform=test_transform,
                 is_online_matching=False,
                 num_pos_pairs=dataset_opt.num_pos_pairs,
+                process_workers=dataset_opt.get("process_workers", 1),
             )
 
     def get_tracker(self, wandb_log: bool, tensorboard_log: bool):
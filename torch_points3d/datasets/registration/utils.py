@@ -174,24 +174,22 @@ def compute_subsampled_matches(data1, data2, voxel_size=0.1, max_distance_overla
     """
     grid_sampling = Compose([SaveOriginalPosId(), GridSampling3D(voxel_size, mode='last')])
     subsampled_data = grid_sampling(data1.clone())
-    origin_id = subsampled_data.origin_id.numpy()
-    pair = compute_overlap_and_matches(subsampled_data, data2, max_distance_overlap)['pair']
-    pair[:, 0] = origin_id[pair[:, 0]]
-    return torch.from_numpy(pair.copy())
+    pair = torch.from_numpy(compute_overlap_and_matches(subsampled_data, data2, max_distance_overlap)['pair'].copy())
+    pair[:, 0] = to_original_index(pair[:, 0], subsampled_data.origin_id)
+    return pair
 
-def get_3D_bound(list_path_img, path_intrinsic, list_path_trans, depth_thresh, limit_size=600, voxel_size=0.01):
+def _read_depth(path_img, depth_thresh):
+    depth = imageio.imread(path_img).astype(float) / 1000.0
+    depth[depth > depth_thresh] = 0
+    depth[depth <= 0] = 0
+    return depth
+
+
+def _bound_from_frustums(list_min, list_max, limit_size, voxel_size):
+    """
+    bounds of the tsdf volume from the [3, num_frames] bounds of the view frustums
+    """
     vol_bnds = np.zeros((3, 2))
-    list_min = np.zeros((3, len(list_path_img)))
-    list_max = np.zeros((3, len(list_path_img)))
-    for i, path_img in tqdm(enumerate(list_path_img), total=len(list_path_img)):
-        # read imageio
-        depth = imageio.imread(path_img) / 1000.0
-        depth[depth > depth_thresh] = 0
-        intrinsic = np.loadtxt(path_intrinsic)
-        pose = np.loadtxt(list_path_trans[i])
-        view_frust_pts = fusion.get_view_frustum(depth, intrinsic, pose)
-        list_min[:, i] = np.amin(view_frust_pts, axis=1)
-        list_max[:, i] = np.amax(view_frust_pts, axis=1)
     # take the quantile instead of the min to be more robust to outilers frames
 
     vol_bnds[:, 0] = np.quantile(list_min, 0.1, axis=1)
@@ -208,6 +206,20 @@ def get_3D_bound(list_path_img, path_intrinsic, list_path_trans, depth_thresh, l
     return vol_bnds
 
 
+def get_3D_bound(list_path_img, path_intrinsic, list_path_trans, depth_thresh, limit_size=600, voxel_size=0.01):
+    list_min = np.zeros((3, len(list_path_img)))
+    list_max = np.zeros((3, len(list_path_img)))
+    intrinsic = np.loadtxt(path_intrinsic)
+    for i, path_img in tqdm(enumerate(list_path_img), total=len(list_path_img)):
+        # read imageio
+        depth = _read_depth(path_img, depth_thresh)
+        pose = np.loadtxt(list_path_trans[i])
+        view_frust_pts = fusion.get_view_frustum(depth, intrinsic, pose)
+        list_min[:, i] = np.amin(view_frust_pts, axis=1)
+        list_max[:, i] = np.amax(view_frust_pts, axis=1)
+    return _bound_from_frustums(list_min, list_max, limit_size, voxel_size)
+
+
 def rgbd2fragment_fine(
     list_path_img,
     path_intrinsic,
@@ -222,50 +234,40 @@ def rgbd2fragment_fine(
 ):
     """
     fuse rgbd frame with a tsdf volume and get the mesh using marching cube.
+    The intrinsics and the poses of the sequence are read once and each depth image is
+    read once for both the bounds of the volume and the integration. Without a GPU,
+    frames are fused in a sparse volume that only allocates the blocks seen by the cameras.
+    The last frames that do not fill a fragment are ignored.
     """
+    intrinsic = np.loadtxt(path_intrinsic)
+    poses = [np.loadtxt(path_trans) for path_trans in list_path_trans]
+    num_fragments = len(list_path_img) // num_frame_per_fragment
+    for ind in tqdm(range(num_fragments)):
+        begin = ind * num_frame_per_fragment
+        end = begin + num_frame_per_fragment
+        depths = [_read_depth(path_img, depth_thresh) for path_img in list_path_img[begin:end]]
+        frustums = [fusion.get_view_frustum(depth, intrinsic, pose) for depth, pose in zip(depths, poses[begin:end])]
+        vol_bnds = _bound_from_frustums(
+            np.stack([np.amin(f, axis=1) for f in frustums], 1),
+            np.stack([np.amax(f, axis=1) for f in frustums], 1),
+            limit_size, voxel_size
+        )
+        if fusion.FUSION_GPU_MODE:
+            tsdf_vol = fusion.TSDFVolume(vol_bnds, voxel_size=voxel_size)
+        else:
+            tsdf_vol = fusion.SparseTSDFVolume(vol_bnds, voxel_size=voxel_size)
+        for depth, pose in zip(depths, poses[begin:end]):
+            tsdf_vol.integrate(depth, intrinsic, pose, obs_weight=1.0)
 
-    ind = 0
-    begin = 0
-    end = num_frame_per_fragment
-
-    vol_bnds = get_3D_bound(list_path_img[begin:end], path_intrinsic, list_path_trans[begin:end], depth_thresh, voxel_size=voxel_size, limit_size=limit_size)
-
-    print(vol_bnds)
-    tsdf_vol = fusion.TSDFVolume(vol_bnds, voxel_size=voxel_size)
-    for i, path_img in tqdm(enumerate(list_path_img), total=len(list_path_img)):
-
-        depth = imageio.imread(path_img).astype(float) / 1000.0
-        depth[depth > depth_thresh] = 0
-        depth[depth <= 0] = 0
-        intrinsic = np.loadtxt(path_intrinsic)
-        pose = np.loadtxt(list_path_trans[i])
-        tsdf_vol.integrate(depth, intrinsic, pose, obs_weight=1.0)
-        if (i + 1) % num_frame_per_fragment == 0:
-
-            if save_pc:
-                pcd = tsdf_vol.get_point_cloud(0.35, 0.0)
-                torch_data = Data(pos=torch.from_numpy(pcd.copy()))
-            else:
-                verts, faces, norms = tsdf_vol.get_mesh()
-                torch_data = Data(pos=torch.from_numpy(verts.copy()), norm=torch.from_numpy(norms.copy()))
-            if pre_transform is not None:
-                torch_data = pre_transform(torch_data)
-            torch.save(torch_data, osp.join(out_path, "fragment_{:06d}.pt".format(ind)))
-            ind += 1
-
-            if i + 1 < len(list_path_img):
-                begin = i + 1
-                if begin + num_frame_per_fragment < len(list_path_img):
-                    end = begin + num_frame_per_fragment
-                    vol_bnds = get_3D_bound(
-                        list_path_img[begin:end], path_intrinsic, list_path_trans[begin:end], depth_thresh, voxel_size=voxel_size, limit_size=limit_size
-                    )
-                else:
-                    vol_bnds = get_3D_bound(
-                        list_path_img[begin:], path_intrinsic, list_path_trans[begin:],
-                        depth_thresh, voxel_size=voxel_size, limit_size=limit_size
-                    )
-                tsdf_vol = fusion.TSDFVolume(vol_bnds, voxel_size=voxel_size)
+        if save_pc:
+            pcd = tsdf_vol.get_point_cloud(0.35, 0.0)
+            torch_data = Data(pos=torch.from_numpy(pcd.copy()))
+        else:
+            verts, faces, norms = tsdf_vol.get_mesh()
+            torch_data = Data(pos=torch.from_numpy(verts.copy()), norm=torch.from_numpy(norms.copy()))
+        if pre_transform is not None:
+            torch_data = pre_transform(torch_data)
+        torch.save(torch_data, osp.join(out_path, "fragment_{:06d}.pt".format(ind)))
 
 
 class PatchExtractor:
@@ -284,33 +286,70 @@ class PatchExtractor:
 
         row, col = ind[dist[:, 0] > 0].t()
         patch = Data()
+        max_col = int(col.max()) if len(col) else -1
         for key in data.keys:
-            if torch.is_tensor(data[key]):
-                if torch.all(col < data[key].shape[0]):
-                    patch[key] = data[key][col]
+            if torch.is_tensor(data[key]) and max_col < data[key].shape[0]:
+                patch[key] = data[key][col]
 
         return patch
 
 
+def inverse_origin_id(origin_id, num_points=None):
+    """
+    inverse of the origin ids left by SaveOriginalPosId: for each point of the original cloud,
+    its index in the transformed cloud or -1 if it was removed. origin ids are expected to be unique
+    Parameters:
+    origin_id : N tensor of indices in the original cloud
+    num_points : number of points of the original cloud, max(origin_id) + 1 by default
+    """
+    origin_id = origin_id.long()
+    if num_points is None:
+        num_points = int(origin_id.max()) + 1 if len(origin_id) else 0
+    inverse = torch.full((num_points,), -1, dtype=torch.long, device=origin_id.device)
+    inverse[origin_id] = torch.arange(len(origin_id), device=origin_id.device)
+    return inverse
+
+
+def to_transformed_index(ind, origin_id):
+    """
+    index in the transformed cloud of the points ind of the original cloud, -1 for the removed points
+    """
+    ind = torch.as_tensor(ind).long()
+    inverse = inverse_origin_id(origin_id)
+    res = torch.full_like(ind, -1)
+    valid = (ind >= 0) & (ind < len(inverse))
+    res[valid] = inverse[ind[valid]]
+    return res
+
+
+def to_original_index(ind, *origin_ids):
+    """
+    index in the original cloud of the points ind of a cloud obtained through a chain of transforms,
+    origin_ids are the origin ids saved at each stage of the chain, the first stage first
+    (e.g. a fragment grid sampled at pre transform time, then again by the transform)
+    """
+    ind = torch.as_tensor(ind).long()
+    for origin_id in reversed(origin_ids):
+        ind = origin_id.long()[ind]
+    return ind
+
+
+def compose_origin_id(*origin_ids):
+    """
+    origin ids of the last stage of a chain of SaveOriginalPosId + sampling transforms with respect
+    to the cloud before the first stage, the first stage first
+    """
+    return to_original_index(torch.arange(len(origin_ids[-1])), *origin_ids)
+
+
 def tracked_matches(data_s, data_t, pair):
     """
     allow to keep the index that are still present after a sparse input
     Parameters:
     pair : P x 2 indices of the matched points before any transformation
     """
-
-    pair_np = pair.numpy()
-    mask_s = np.isin(pair_np[:, 0], data_s.origin_id.numpy())
-    mask_t = np.isin(pair_np[:, 1], data_t.origin_id.numpy())
-    # print(data_s.origin_id.shape)
-    # print(data_s.pos.shape)
-    # print(data_s.xyz.shape)
-    mask = np.logical_and(mask_s, mask_t)
-    filtered_pair = pair_np[mask]
-
-    table_s = dict(zip(data_s.origin_id.numpy(),
-                       np.arange(0, len(data_s.pos))))
-    table_t = dict(zip(data_t.origin_id.numpy(),
-                       np.arange(0, len(data_t.pos))))
-    res = torch.tensor([[table_s[p[0]], table_t[p[1]]] for p in filtered_pair]).to(torch.long)
-    return res
+    pair = torch.as_tensor(pair).long()
+    ind_s = to_transformed_index(pair[:, 0], data_s.origin_id)
+    ind_t = to_transformed_index(pair[:, 1], data_t.origin_id)
+    mask = (ind_s >= 0) & (ind_t >= 0)
+    return torch.stack([ind_s[mask], ind_t[mask]], 1)
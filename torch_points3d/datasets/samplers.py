@@ -1,7 +1,14 @@
+import random
+import logging
 import torch
 import numpy as np
 from torch.utils.data import Sampler
 
+from torch_points3d.utils.distributed import get_rank, get_world_size
+
+log = logging.getLogger(__name__)
+
+
 class BalancedRandomSampler(Sampler):
     r"""This sampler is responsible for creating balanced batch based on the class distribution.
     It is implementing a replacement=True strategy for indices selection
@@ -29,3 +36,156 @@ class BalancedRandomSampler(Sampler):
     def __repr__(self):
         return "{}(num_samples={})".format(self.__class__.__name__, self.num_samples)
 
+
+class PointBudgetBatchSampler(Sampler):
+    r"""Packs the indices drawn from ``sampler`` into batches whose total number of points stays within
+    ``max_points``, a sample larger than the budget makes a batch on its own. Shuffling and weighting are
+    left to the wrapped sampler (``RandomSampler``, ``SequentialSampler``, ``BalancedRandomSampler``...).
+
+    Parameters
+    ----------
+    sampler : Sampler
+        Sampler of the sample indices
+    num_points : np.ndarray
+        Number of points of each sample of the dataset, see :func:`get_num_points`
+    max_points : int
+        Point budget of a batch
+    max_batch_size : int, optional
+        Maximum number of samples in a batch
+    """
+
+    def __init__(self, sampler, num_points, max_points, max_batch_size=None):
+        self.sampler = sampler
+        self.num_points = np.asarray(num_points, dtype=np.int64)
+        self.max_points = max_points
+        self.max_batch_size = max_batch_size
+        self._num_batches = None
+
+    def _pack(self, indices):
+        batch = []
+        batch_points = 0
+        for idx in indices:
+            idx = int(idx)
+            n = self.num_points[idx]
+            if batch and (batch_points + n > self.max_points or len(batch) == self.max_batch_size):
+                yield batch
+                batch, batch_points = [], 0
+            batch.append(idx)
+            batch_points += n
+        if batch:
+            yield batch
+
+    def __iter__(self):
+        num_batches = 0
+        for batch in self._pack(self.sampler):
+            num_batches += 1
+            yield batch
+        self._num_batches = num_batches
+
+    def __len__(self):
+        """ Number of batches of the last epoch, estimated by packing the samples in order before the first one
+        """
+        if self._num_batches is None:
+            num_samples = len(self.sampler)
+            if num_samples == len(self.num_points):
+                self._num_batches = sum(1 for _ in self._pack(range(num_samples)))
+            else:
+                points = self.num_points.mean() * num_samples if len(self.num_points) else 0
+                self._num_batches = max(int(np.ceil(points / self.max_points)), 1 if num_samples else 0)
+        return self._num_batches
+
+    def __repr__(self):
+        return "{}(sampler={}, max_points={}, max_batch_size={})".format(
+            self.__class__.__name__, self.sampler.__class__.__name__, self.max_points, self.max_batch_size
+        )
+
+
+class DistributedSamplerWrapper(Sampler):
+    r"""Distributed version of any sampler (or batch sampler): every process draws the same sequence from
+    ``sampler``, with the random generators of torch, numpy and python seeded with ``seed`` plus the epoch,
+    and keeps one item out of ``num_replicas``. Works like ``torch.utils.data.DistributedSampler`` for the
+    samplers that do not sample a dataset uniformly, ``BalancedRandomSampler`` or ``PointBudgetBatchSampler``
+    for example. :meth:`set_epoch` must be called at the beginning of each epoch to draw a different sequence.
+
+    Parameters
+    ----------
+    sampler : Sampler
+        Sampler of the indices, or of the batches of indices
+    num_replicas : int, optional
+        Number of processes, the world size of the default process group by default
+    rank : int, optional
+        Rank of this process, the rank in the default process group by default
+    seed : int, optional
+        Seed shared by all the processes
+    pad : bool, optional
+        Repeats the first items so that every process gets the same number of them, needed for training as
+        each step synchronises the processes. Evaluation can do without so that no sample is counted twice.
+    """
+
+    def __init__(self, sampler, num_replicas=None, rank=None, seed=0, pad=True):
+        num_replicas = get_world_size() if num_replicas is None else num_replicas
+        rank = get_rank() if rank is None else rank
+        self.sampler = sampler
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.seed = seed
+        self.pad = pad
+        self.epoch = 0
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def _draw(self):
+        np_state = np.random.get_state()
+        random_state = random.getstate()
+        try:
+            with torch.random.fork_rng(devices=[]):
+                torch.manual_seed(self.seed + self.epoch)
+                np.random.seed(self.seed + self.epoch)
+                random.seed(self.seed + self.epoch)
+                return list(self.sampler)
+        finally:
+            np.random.set_state(np_state)
+            random.setstate(random_state)
+
+    def __iter__(self):
+        items = self._draw()
+        if self.pad and items:
+            total = int(np.ceil(len(items) / self.num_replicas)) * self.num_replicas
+            items += (items * int(np.ceil(total / len(items))))[: total - len(items)]
+        return iter(items[self.rank :: self.num_replicas])
+
+    def __len__(self):
+        num_items = len(self.sampler)
+        if self.pad:
+            return int(np.ceil(num_items / self.num_replicas))
+        return len(range(self.rank, num_items, self.num_replicas))
+
+    def __repr__(self):
+        return "{}(sampler={}, rank={}, num_replicas={})".format(
+            self.__class__.__name__, self.sampler, self.rank, self.num_replicas
+        )
+
+
+def get_num_points(dataset):
+    r"""Number of points of each sample of ``dataset`` once pre transformed (the transform is not applied).
+    Taken from the ``sample_num_points`` size index of the dataset if it has one, from the slices of an in
+    memory dataset or, failing that, by loading every sample once.
+    """
+    num_points = getattr(dataset, "sample_num_points", None)
+    if num_points is not None:
+        return np.asarray(num_points, dtype=np.int64)
+
+    indices = getattr(dataset, "__indices__", None)
+    slices = getattr(dataset, "slices", None)
+    if slices is not None and "pos" in slices:
+        num_points = (slices["pos"][1:] - slices["pos"][:-1]).numpy()
+        if indices is not None:
+            num_points = num_points[np.asarray(indices)]
+        if len(num_points) == len(dataset):
+            return num_points.astype(np.int64)
+
+    if indices is None:
+        indices = range(len(dataset))
+    log.info("Computing the number of points of the %i samples of %s", len(dataset), dataset.__class__.__name__)
+    return np.asarray([dataset.get(i).pos.shape[0] for i in indices], dtype=np.int64)
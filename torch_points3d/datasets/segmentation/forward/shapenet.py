@@ -1,7 +1,6 @@
 import torch
 import glob
 import os
-from torch_geometric.io import read_txt_array
 from torch_geometric.data.data import Data
 import torch_geometric.transforms as T
 from torch_geometric.nn import knn_interpolate
@@ -10,6 +9,7 @@ import logging
 
 from torch_points3d.core.data_transform import SaveOriginalPosId
 from torch_points3d.utils import is_list
+from torch_points3d.utils.pointcloud_io import read_txt
 from torch_points3d.datasets.base_dataset import BaseDataset
 from torch_points3d.metrics.shapenet_part_tracker import ShapenetPartTracker
 from torch_points3d.datasets.segmentation.shapenet import ShapeNet
@@ -41,7 +41,7 @@ class _ForwardShapenet(torch.utils.data.Dataset):
         return len(self._files)
 
     def _read_file(self, filename):
-        raw = read_txt_array(filename)
+        raw = torch.from_numpy(read_txt(filename)).float()
         pos = raw[:, :3]
         x = raw[:, 3:6]
         if raw.shape[1] == 7:
@@ -65,8 +65,15 @@ class _ForwardShapenet(torch.utils.data.Dataset):
     def get_filename(self, index):
         return os.path.basename(self._files[index])
 
+    def skip(self, predicate):
+        """ Removes the files for which ``predicate(filename)`` is True, filename being the name of the file
+        without its directory. Used to resume an inference that was interrupted.
+        """
+        self._files = [f for f in self._files if not predicate(os.path.basename(f))]
+
     def __getitem__(self, index):
         data = self._read_file(self._files[index])
+        raw_pos = data.pos.numpy().copy()
         category = torch.ones(data.pos.shape[0], dtype=torch.long) * self._category
         setattr(data, "category", category)
         setattr(data, "sampleid", torch.tensor([index]))
@@ -74,6 +81,8 @@ class _ForwardShapenet(torch.utils.data.Dataset):
             data.x = None
         if self._transforms is not None:
             data = self._transforms(data)
+        # Positions before the transforms, used to upsample the predictions. Arrays are collated as a list
+        setattr(data, "raw_pos", raw_pos)
         return data
 
 
@@ -144,9 +153,13 @@ class ForwardShapenetDataset(BaseDataset):
             output = output.reshape(num_sample, -1, output.shape[-1])  # [B,N,L]
 
         setattr(batch, "_pred", output)
+        raw_pos = getattr(batch, "raw_pos", None)
         for b in range(num_sample):
             sampleid = batch.sampleid[b]
-            sample_raw_pos = self.test_dataset[0].get_raw(sampleid).pos.to(output.device)
+            if raw_pos is not None:
+                sample_raw_pos = torch.from_numpy(raw_pos[b]).to(output.device)
+            else:
+                sample_raw_pos = self.test_dataset[0].get_raw(sampleid).pos.to(output.device)
             predicted = BaseDataset.get_sample(batch, "_pred", b, conv_type)
             origindid = BaseDataset.get_sample(batch, SaveOriginalPosId.KEY, b, conv_type)
             full_prediction = knn_interpolate(predicted, sample_raw_pos[origindid], sample_raw_pos, k=3)
@@ -6,22 +6,26 @@ import h5py
 import torch
 import random
 import glob
-from plyfile import PlyData, PlyElement
 from torch_geometric.data import InMemoryDataset, Data, download_url, extract_zip, Dataset
 from torch_geometric.data.dataset import files_exist
 from torch_geometric.data import DataLoader
 from torch_geometric.datasets import S3DIS as S3DIS1x1
 import torch_geometric.transforms as T
 import logging
-from sklearn.neighbors import NearestNeighbors, KDTree
+from sklearn.neighbors import NearestNeighbors
 from tqdm.auto import tqdm as tq
 import csv
 import pandas as pd
 import pickle
+import time
+import multiprocessing
 
 from torch_points3d.datasets.samplers import BalancedRandomSampler
 import torch_points3d.core.data_transform as cT
 from torch_points3d.datasets.base_dataset import BaseDataset
+from torch_points3d.datasets.columnar_storage import save_processed, load_processed, save_data_list, load_data_list
+from torch_points3d.utils.kdtree_cache import get_kdtree
+from torch_points3d.utils.pointcloud_io import read_txt, write_ply
 
 log = logging.getLogger(__name__)
 
@@ -92,7 +96,7 @@ def read_s3dis_format(train_file, room_name, label_out=True, verbose=False, debu
 
         return True
     else:
-        room_ver = pd.read_csv(raw_path, sep=" ", header=None).values
+        room_ver = read_txt(raw_path)
         xyz = np.ascontiguousarray(room_ver[:, 0:3], dtype="float32")
         try:
             rgb = np.ascontiguousarray(room_ver[:, 3:6], dtype="uint8")
@@ -103,22 +107,32 @@ def read_s3dis_format(train_file, room_name, label_out=True, verbose=False, debu
             return xyz, rgb
         n_ver = len(room_ver)
         del room_ver
-        nn = NearestNeighbors(1, algorithm="kd_tree").fit(xyz)
         room_labels = np.zeros((n_ver,), dtype="int64")
         room_object_indices = np.zeros((n_ver,), dtype="int64")
         objects = glob.glob(osp.join(train_file, "Annotations/*.txt"))
-        i_object = 1
-        for single_object in objects:
+        object_points = []
+        object_labels = []
+        object_indices = []
+        for i_object, single_object in enumerate(objects, 1):
             object_name = os.path.splitext(os.path.basename(single_object))[0]
             if verbose:
                 log.debug("adding object " + str(i_object) + " : " + object_name)
             object_class = object_name.split("_")[0]
             object_label = object_name_to_label(object_class)
-            obj_ver = pd.read_csv(single_object, sep=" ", header=None).values
-            _, obj_ind = nn.kneighbors(obj_ver[:, 0:3])
-            room_labels[obj_ind] = object_label
-            room_object_indices[obj_ind] = i_object
-            i_object = i_object + 1
+            obj_ver = read_txt(single_object)
+            object_points.append(obj_ver[:, 0:3])
+            object_labels.append(np.full((len(obj_ver),), object_label, dtype="int64"))
+            object_indices.append(np.full((len(obj_ver),), i_object, dtype="int64"))
+
+        # Single nearest neighbour query for all the annotated points of the room. Assignment follows the order
+        # of the annotation files so that points shared by several objects get the label of the last one
+        if len(object_points):
+            nn = NearestNeighbors(1, algorithm="kd_tree").fit(xyz)
+            _, obj_ind = nn.kneighbors(np.concatenate(object_points))
+            obj_ind = obj_ind[::-1, 0]
+            obj_ind, last = np.unique(obj_ind, return_index=True)
+            room_labels[obj_ind] = np.concatenate(object_labels)[::-1][last]
+            room_object_indices[obj_ind] = np.concatenate(object_indices)[::-1][last]
 
         return (
             torch.from_numpy(xyz),
@@ -128,22 +142,28 @@ def read_s3dis_format(train_file, room_name, label_out=True, verbose=False, debu
         )
 
 
+def _convert_room(args):
+    """ Reads a raw room and saves its tensors to ``room_path``, skipped if the room has already been converted
+    """
+    file_path, room_name, room_path, verbose = args
+    if os.path.exists(room_path):
+        return room_path
+    xyz, rgb, room_labels, room_object_indices = read_s3dis_format(
+        file_path, room_name, label_out=True, verbose=verbose
+    )
+    room = {"pos": xyz, "rgb": rgb, "y": room_labels, "room_object_indices": room_object_indices}
+    tmp_path = room_path + ".tmp"
+    torch.save(room, tmp_path)
+    os.replace(tmp_path, room_path)
+    return room_path
+
+
 def to_ply(pos, label, file):
     assert len(label.shape) == 1
     assert pos.shape[0] == label.shape[0]
-    pos = np.asarray(pos)
-    colors = OBJECT_COLOR[np.asarray(label)]
-    ply_array = np.ones(
-        pos.shape[0], dtype=[("x", "f4"), ("y", "f4"), ("z", "f4"), ("red", "u1"), ("green", "u1"), ("blue", "u1")]
-    )
-    ply_array["x"] = pos[:, 0]
-    ply_array["y"] = pos[:, 1]
-    ply_array["z"] = pos[:, 2]
-    ply_array["red"] = colors[:, 0]
-    ply_array["green"] = colors[:, 1]
-    ply_array["blue"] = colors[:, 2]
-    el = PlyElement.describe(ply_array, "S3DIS")
-    PlyData([el], byte_order=">").write(file)
+    pos = np.asarray(pos, dtype="f4")
+    colors = OBJECT_COLOR[np.asarray(label)].astype("u1")
+    write_ply(file, [pos, colors], ["x", "y", "z", "red", "green", "blue"], byte_order=">", element="S3DIS")
 
 
 def add_weights(dataset, train, class_weight_method):
@@ -237,6 +257,10 @@ class S3DISOriginalFused(InMemoryDataset):
         Transforms to be applied before the data is assembled into samples (apply fusing here for example)
     keep_instance: bool
         set to True if you wish to keep instance data
+    process_workers: int
+        number of processes used to convert the raw rooms
+    columnar_storage: bool
+        set to True to save the train and test splits as memory mapped columns
     pre_transform
     transform
     pre_filter
@@ -259,6 +283,8 @@ class S3DISOriginalFused(InMemoryDataset):
         keep_instance=False,
         verbose=False,
         debug=False,
+        process_workers=1,
+        columnar_storage=False,
     ):
         assert test_area >= 1 and test_area <= 6
         self.transform = transform
@@ -267,6 +293,8 @@ class S3DISOriginalFused(InMemoryDataset):
         self.keep_instance = keep_instance
         self.verbose = verbose
         self.debug = debug
+        self.process_workers = process_workers
+        self.columnar_storage = columnar_storage
         self._train = train
         super(S3DISOriginalFused, self).__init__(root, transform, pre_transform, pre_filter)
         path = self.processed_paths[0] if train else self.processed_paths[1]
@@ -351,29 +379,27 @@ class S3DISOriginalFused(InMemoryDataset):
                 if os.path.isdir(osp.join(self.raw_dir, f, room_name))
             ]
 
+            if self.debug:
+                for (area, room_name, file_path) in tq(train_files + test_files):
+                    read_s3dis_format(file_path, room_name, label_out=True, verbose=self.verbose, debug=self.debug)
+                return
+
             # Gather data per area
             data_list = [[] for _ in range(6)]
-            for (area, room_name, file_path) in tq(train_files + test_files):
-
+            for room, (area, room_name, file_path) in zip(
+                self._process_rooms(train_files + test_files), train_files + test_files
+            ):
                 area_num = int(area[-1]) - 1
-                if self.debug:
-                    read_s3dis_format(file_path, room_name, label_out=True, verbose=self.verbose, debug=self.debug)
-                    continue
-                else:
-                    xyz, rgb, room_labels, room_object_indices = read_s3dis_format(
-                        file_path, room_name, label_out=True, verbose=self.verbose, debug=self.debug
-                    )
-
-                    rgb_norm = rgb.float() / 255.0
-                    data = Data(pos=xyz, y=room_labels, rgb=rgb_norm)
+                rgb_norm = room["rgb"].float() / 255.0
+                data = Data(pos=room["pos"], y=room["y"], rgb=rgb_norm)
 
-                    if self.keep_instance:
-                        data.room_object_indices = room_object_indices
+                if self.keep_instance:
+                    data.room_object_indices = room["room_object_indices"]
 
-                    if self.pre_filter is not None and not self.pre_filter(data):
-                        continue
+                if self.pre_filter is not None and not self.pre_filter(data):
+                    continue
 
-                    data_list[area_num].append(data)
+                data_list[area_num].append(data)
 
             raw_areas = cT.PointCloudFusion()(data_list)
             for i, area in enumerate(raw_areas):
@@ -403,12 +429,52 @@ class S3DISOriginalFused(InMemoryDataset):
 
         self._save_data(train_data_list, test_data_list)
 
+    @property
+    def rooms_dir(self):
+        return os.path.join(self.processed_dir, "rooms")
+
+    def _process_rooms(self, room_files):
+        """ Converts each room to tensors with ``process_workers`` processes and yields them in order.
+        Every room is checkpointed in ``rooms_dir`` as soon as it is converted, an interrupted processing
+        resumes from the rooms already available. Rooms do not depend on the test area and are reused by all folds.
+        """
+        os.makedirs(self.rooms_dir, exist_ok=True)
+        args = [
+            (file_path, room_name, osp.join(self.rooms_dir, "{}_{}.pt".format(area, room_name)), self.verbose)
+            for (area, room_name, file_path) in room_files
+        ]
+        num_done = len([a for a in args if os.path.exists(a[2])])
+        if num_done:
+            log.info("Resuming S3DIS processing, %i / %i rooms already converted", num_done, len(args))
+
+        start = time.time()
+        num_points = 0
+        if self.process_workers > 1:
+            pool = multiprocessing.Pool(processes=self.process_workers)
+            rooms = pool.imap(_convert_room, args)
+        else:
+            pool = None
+            rooms = map(_convert_room, args)
+        try:
+            progress = tq(rooms, total=len(args))
+            for room_path in progress:
+                room = torch.load(room_path)
+                num_points += room["pos"].shape[0]
+                progress.set_postfix(mpts_per_s=num_points / 1e6 / max(time.time() - start, 1e-6))
+                yield room
+        finally:
+            if pool is not None:
+                pool.terminate()
+        log.info(
+            "Converted %i rooms (%.1fM points) in %.1fs", len(args), num_points / 1e6, time.time() - start,
+        )
+
     def _save_data(self, train_data_list, test_data_list):
-        torch.save(self.collate(train_data_list), self.processed_paths[0])
-        torch.save(self.collate(test_data_list), self.processed_paths[1])
+        save_processed(self.collate(train_data_list), self.processed_paths[0], columnar=self.columnar_storage)
+        save_processed(self.collate(test_data_list), self.processed_paths[1], columnar=self.columnar_storage)
 
     def _load_data(self, path):
-        self.data, self.slices = torch.load(path)
+        self.data, self.slices = load_processed(path, columnar=self.columnar_storage)
 
 
 class S3DISSphere(S3DISOriginalFused):
@@ -467,14 +533,16 @@ class S3DISSphere(S3DISOriginalFused):
         sphere_sampler = cT.SphereSampling(self._radius, centre[:3], align_origin=False)
         return sphere_sampler(area_data)
 
+    @property
+    def kdtree_cache_dir(self):
+        return os.path.join(self.processed_dir, "kdtrees")
+
     def _save_data(self, train_data_list, test_data_list):
-        torch.save(train_data_list, self.processed_paths[0])
-        torch.save(test_data_list, self.processed_paths[1])
+        save_data_list(train_data_list, self.processed_paths[0], columnar=self.columnar_storage)
+        save_data_list(test_data_list, self.processed_paths[1], columnar=self.columnar_storage)
 
     def _load_data(self, path):
-        self._datas = torch.load(path)
-        if not isinstance(self._datas, list):
-            self._datas = [self._datas]
+        self._datas = load_data_list(path, columnar=self.columnar_storage)
         if self._sample_per_epoch > 0:
             self._centres_for_sampling = []
             for i, data in enumerate(self._datas):
@@ -487,7 +555,7 @@ class S3DISSphere(S3DISOriginalFused):
                 centres[:, 3] = i
                 centres[:, 4] = low_res.y
                 self._centres_for_sampling.append(centres)
-                tree = KDTree(np.asarray(data.pos), leaf_size=10)
+                tree = get_kdtree(data.pos, leaf_size=10, cache_dir=self.kdtree_cache_dir)
                 setattr(data, cT.SphereSampling.KDTREE_KEY, tree)
 
             self._centres_for_sampling = torch.cat(self._centres_for_sampling, 0)
@@ -496,7 +564,7 @@ class S3DISSphere(S3DISOriginalFused):
             self._label_counts = uni_counts / np.sum(uni_counts)
             self._labels = uni
         else:
-            grid_sampler = cT.GridSphereSampling(2, 2, center=False)
+            grid_sampler = cT.GridSphereSampling(2, 2, center=False, cache_dir=self.kdtree_cache_dir)
             self._test_spheres = grid_sampler(self._datas)
 
 
@@ -529,6 +597,8 @@ class S3DISFusedDataset(BaseDataset):
             train=True,
             pre_collate_transform=self.pre_collate_transform,
             transform=self.train_transform,
+            process_workers=dataset_opt.get("process_workers", 1),
+            columnar_storage=dataset_opt.get("columnar_storage", False),
         )
         self.test_dataset = S3DISSphere(
             self._data_path,
@@ -537,6 +607,8 @@ class S3DISFusedDataset(BaseDataset):
             train=False,
             pre_collate_transform=self.pre_collate_transform,
             transform=self.test_transform,
+            process_workers=dataset_opt.get("process_workers", 1),
+            columnar_storage=dataset_opt.get("columnar_storage", False),
         )
 
         if dataset_opt.class_weight_method:
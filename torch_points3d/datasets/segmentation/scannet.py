@@ -8,7 +8,6 @@ import sys
 import csv
 import logging
 import numpy as np
-from plyfile import PlyData, PlyElement
 from torch_geometric.data import Data, InMemoryDataset, download_url, extract_zip
 import torch_geometric.transforms as T
 import multiprocessing
@@ -19,6 +18,8 @@ import urllib
 from urllib.request import urlopen
 
 from torch_points3d.datasets.base_dataset import BaseDataset
+from torch_points3d.datasets.columnar_storage import save_processed, load_processed
+from torch_points3d.utils.pointcloud_io import read_ply_fields
 from . import IGNORE_LABEL
 
 log = logging.getLogger(__name__)
@@ -239,14 +240,7 @@ def read_mesh_vertices(filename):
     """ read XYZ for each vertex.
     """
     assert os.path.isfile(filename)
-    with open(filename, "rb") as f:
-        plydata = PlyData.read(f)
-        num_verts = plydata["vertex"].count
-        vertices = np.zeros(shape=[num_verts, 3], dtype=np.float32)
-        vertices[:, 0] = plydata["vertex"].data["x"]
-        vertices[:, 1] = plydata["vertex"].data["y"]
-        vertices[:, 2] = plydata["vertex"].data["z"]
-    return vertices
+    return read_ply_fields(filename, ["x", "y", "z"])
 
 
 def read_mesh_vertices_rgb(filename):
@@ -254,17 +248,7 @@ def read_mesh_vertices_rgb(filename):
     Note: RGB values are in 0-255
     """
     assert os.path.isfile(filename)
-    with open(filename, "rb") as f:
-        plydata = PlyData.read(f)
-        num_verts = plydata["vertex"].count
-        vertices = np.zeros(shape=[num_verts, 6], dtype=np.float32)
-        vertices[:, 0] = plydata["vertex"].data["x"]
-        vertices[:, 1] = plydata["vertex"].data["y"]
-        vertices[:, 2] = plydata["vertex"].data["z"]
-        vertices[:, 3] = plydata["vertex"].data["red"]
-        vertices[:, 4] = plydata["vertex"].data["green"]
-        vertices[:, 5] = plydata["vertex"].data["blue"]
-    return vertices
+    return read_ply_fields(filename, ["x", "y", "z", "red", "green", "blue"])
 
 
 def read_aggregation(filename):
@@ -416,6 +400,8 @@ class Scannet(InMemoryDataset):
         Number of process workers
     normalize_rgb : bool, optional
         Normalise rgb values, by default True
+    columnar_storage : bool, optional
+        Save the processed splits as memory mapped columns, see :mod:`torch_points3d.datasets.columnar_storage`
     """
 
     CLASS_LABELS = CLASS_LABELS
@@ -440,6 +426,7 @@ class Scannet(InMemoryDataset):
         process_workers=4,
         types=[".txt", "_vh_clean_2.ply", "_vh_clean_2.0.010000.segs.json", ".aggregation.json"],
         normalize_rgb=True,
+        columnar_storage=False,
     ):
         if not isinstance(donotcare_class_ids, list):
             raise Exception("donotcare_class_ids should be list with indices of class to ignore")
@@ -456,6 +443,7 @@ class Scannet(InMemoryDataset):
         self.process_workers = process_workers
         self.types = types
         self.normalize_rgb = normalize_rgb
+        self.columnar_storage = columnar_storage
 
         super(Scannet, self).__init__(root, transform, pre_transform, pre_filter)
         if split == "train":
@@ -467,7 +455,7 @@ class Scannet(InMemoryDataset):
         else:
             raise ValueError((f"Split {split} found, but expected either " "train, val, trainval or test"))
 
-        self.data, self.slices = torch.load(path)
+        self.data, self.slices = load_processed(path, columnar=self.columnar_storage)
 
     @property
     def raw_file_names(self):
@@ -674,7 +662,7 @@ class Scannet(InMemoryDataset):
                         data = Scannet.process_func(*arg)
                         datas.append(data)
                 log.info("SAVING TO {}".format(self.processed_paths[i]))
-                torch.save(self.collate(datas), self.processed_paths[i])
+                save_processed(self.collate(datas), self.processed_paths[i], columnar=self.columnar_storage)
 
     def __repr__(self):
         return "{}({})".format(self.__class__.__name__, len(self))
@@ -706,6 +694,7 @@ class ScannetDataset(BaseDataset):
         use_instance_bboxes: bool = dataset_opt.use_instance_bboxes
         donotcare_class_ids: [] = dataset_opt.donotcare_class_ids if dataset_opt.donotcare_class_ids else []
         max_num_point: int = dataset_opt.max_num_point if dataset_opt.max_num_point != "None" else None
+        columnar_storage: bool = dataset_opt.get("columnar_storage", False)
 
         self.train_dataset = Scannet(
             self._data_path,
@@ -717,6 +706,7 @@ class ScannetDataset(BaseDataset):
             use_instance_bboxes=use_instance_bboxes,
             donotcare_class_ids=donotcare_class_ids,
             max_num_point=max_num_point,
+            columnar_storage=columnar_storage,
         )
 
         self.val_dataset = Scannet(
@@ -729,6 +719,7 @@ class ScannetDataset(BaseDataset):
             use_instance_bboxes=use_instance_bboxes,
             donotcare_class_ids=donotcare_class_ids,
             max_num_point=max_num_point,
+            columnar_storage=columnar_storage,
         )
 
     def get_tracker(self, wandb_log: bool, tensorboard_log: bool):
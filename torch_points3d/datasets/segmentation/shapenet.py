@@ -12,6 +12,7 @@ import torch_geometric.transforms as T
 from torch_points3d.metrics.shapenet_part_tracker import ShapenetPartTracker
 
 from torch_points3d.datasets.base_dataset import BaseDataset
+from torch_points3d.datasets.columnar_storage import save_processed, load_processed
 
 
 class ShapeNet(InMemoryDataset):
@@ -52,6 +53,9 @@ class ShapeNet(InMemoryDataset):
             :obj:`torch_geometric.data.Data` object and returns a boolean
             value, indicating whether the data object should be included in the
             final dataset. (default: :obj:`None`)
+        columnar_storage (bool, optional): If set to :obj:`True`, the processed
+            splits are saved as memory mapped columns.
+            (default: :obj:`False`)
     """
 
     url = "https://shapenet.cs.stanford.edu/media/" "shapenetcore_partanno_segmentation_benchmark_v0_normal.zip"
@@ -103,6 +107,7 @@ class ShapeNet(InMemoryDataset):
         transform=None,
         pre_transform=None,
         pre_filter=None,
+        columnar_storage=False,
     ):
         if categories is None:
             categories = list(self.category_ids.keys())
@@ -110,6 +115,7 @@ class ShapeNet(InMemoryDataset):
             categories = [categories]
         assert all(category in self.category_ids for category in categories)
         self.categories = categories
+        self.columnar_storage = columnar_storage
         super(ShapeNet, self).__init__(root, transform, pre_transform, pre_filter)
 
         if split == "train":
@@ -123,7 +129,7 @@ class ShapeNet(InMemoryDataset):
         else:
             raise ValueError((f"Split {split} found, but expected either " "train, val, trainval or test"))
 
-        self.data, self.slices = torch.load(path)
+        self.data, self.slices = load_processed(path, columnar=self.columnar_storage)
         self.data.x = self.data.x if include_normals else None
 
         self.y_mask = torch.zeros((len(self.seg_classes.keys()), 50), dtype=torch.bool)
@@ -182,8 +188,8 @@ class ShapeNet(InMemoryDataset):
             data_list = self.process_filenames(filenames)
             if split == "train" or split == "val":
                 trainval += data_list
-            torch.save(self.collate(data_list), self.processed_paths[i])
-        torch.save(self.collate(trainval), self.processed_paths[3])
+            save_processed(self.collate(data_list), self.processed_paths[i], columnar=self.columnar_storage)
+        save_processed(self.collate(trainval), self.processed_paths[3], columnar=self.columnar_storage)
 
     def __repr__(self):
         return "{}({}, categories={})".format(self.__class__.__name__, len(self), self.categories)
@@ -214,6 +220,7 @@ class ShapeNetDataset(BaseDataset):
             self._category = dataset_opt.category
         except KeyError:
             self._category = None
+        columnar_storage = dataset_opt.get("columnar_storage", False)
         pre_transform = self.pre_transform
         train_transform = self.train_transform
         self.train_dataset = ShapeNet(
@@ -223,6 +230,7 @@ class ShapeNetDataset(BaseDataset):
             split="trainval",
             pre_transform=pre_transform,
             transform=train_transform,
+            columnar_storage=columnar_storage,
         )
 
         self.test_dataset = ShapeNet(
@@ -232,6 +240,7 @@ class ShapeNetDataset(BaseDataset):
             split="test",
             transform=self.test_transform,
             pre_transform=pre_transform,
+            columnar_storage=columnar_storage,
         )
         self._categories = self.train_dataset.categories
 
@@ -0,0 +1,356 @@
+import os
+import time
+import math
+import logging
+import threading
+import numpy as np
+import torch
+from torch_geometric.data import Data
+from torch_geometric.transforms import Compose
+from sklearn.neighbors import KDTree
+
+from torch_points3d.core.data_transform import MultiScaleTransform, SaveOriginalPosId
+from torch_points3d.datasets.base_dataset import BaseDataset
+from torch_points3d.metrics.checkpoint_writer import atomic_save
+from torch_points3d.utils.config import ConvolutionFormatFactory
+from torch_points3d.utils.kdtree_cache import get_kdtree, kdtree_key
+
+log = logging.getLogger(__name__)
+
+
+class SlidingWindowInference:
+    """ Semantic segmentation of an arbitrarily large point cloud with overlapping windows.
+
+    Window centres lie on a regular grid and only the occupied cells get a window, every point
+    is inside at least one window. Windows are visited by increasing x and extracted lazily from
+    a KDTree, a batch of windows is only materialised when it goes through the model.
+    The logits of the points of a window are weighted (blending) and summed in an accumulator
+    that only holds the points that can still be reached by a window: points sorted by x are
+    final as soon as the next window centre is further than ``radius``, their label is then
+    written to a memory mapped ``.npy`` file and their row of the accumulator is released.
+
+    The state of the inference is saved next to the labels every ``checkpoint_every`` batches
+    and when :meth:`pause` is called, :meth:`run` starts again from the saved state.
+
+    Parameters
+    ----------
+    model : BaseModel
+        Segmentation model in eval mode, ``get_output`` returns [N, num_classes] logits
+    radius : float
+        Radius of the spheres or half side of the tiles
+    overlap : float, optional
+        Fraction of the window diameter shared by two neighbouring windows, in [0, 1)
+    window : str, optional
+        ``sphere`` or ``tile``, a tile is a vertical column with a square footprint
+    transform : callable, optional
+        Applied to each window, typically the test transform of the dataset. The transform
+        must keep the ``origin_id`` attribute, as ``GridSampling3D`` does
+    batch_size : int, optional
+        Number of windows per forward pass
+    device : torch.device, optional
+        Device of the model
+    blending : str, optional
+        ``gaussian`` weights the logits of a window with a gaussian of the distance to its centre
+        (standard deviation radius / 2), ``uniform`` gives the same weight to every point
+    center : bool, optional
+        Windows are translated so that their centre is the origin (only along x and y for tiles)
+    precompute_multi_scale : bool, optional
+        Runs ``MultiScaleTransform`` with the spatial ops of the model on each window
+    collate_fn : callable, optional
+        Builds a batch from a list of windows, defaults to the collate function of the model format
+    checkpoint_every : int, optional
+        Number of batches between two saves of the inference state
+    log_every : int, optional
+        Number of batches between two progress messages
+    """
+
+    WINDOWS = ["sphere", "tile"]
+    BLENDINGS = ["gaussian", "uniform"]
+
+    def __init__(
+        self,
+        model,
+        radius,
+        overlap=0.25,
+        window="sphere",
+        transform=None,
+        batch_size=8,
+        device="cpu",
+        blending="gaussian",
+        center=True,
+        precompute_multi_scale=False,
+        collate_fn=None,
+        checkpoint_every=50,
+        log_every=10,
+    ):
+        if window not in self.WINDOWS:
+            raise ValueError("Unknown window {}, must be one of {}".format(window, self.WINDOWS))
+        if blending not in self.BLENDINGS:
+            raise ValueError("Unknown blending {}, must be one of {}".format(blending, self.BLENDINGS))
+        if not 0 <= overlap < 1:
+            raise ValueError("overlap must be in [0, 1), got {}".format(overlap))
+        self.model = model
+        self.radius = float(radius)
+        self.overlap = float(overlap)
+        self.window = window
+        self.batch_size = batch_size
+        self.device = torch.device(device)
+        self.blending = blending
+        self.center = center
+        self.checkpoint_every = checkpoint_every
+        self.log_every = log_every
+
+        transforms = [transform] if transform is not None else []
+        if precompute_multi_scale:
+            transforms.append(MultiScaleTransform(model.get_spatial_ops(), conv_type=model.conv_type))
+        self.transform = Compose(transforms) if transforms else None
+        if collate_fn is None:
+            collate_fn = BaseDataset._get_collate_function(model.conv_type, precompute_multi_scale)
+        self.collate_fn = collate_fn
+
+        self.stats = {}
+        self._pause = threading.Event()
+
+    @property
+    def step(self):
+        """ Distance between two neighbouring window centres. Spheres are also limited by the
+        half diagonal of a grid cell so that each cell is fully inside its sphere
+        """
+        step = 2 * self.radius * (1 - self.overlap)
+        if self.window == "sphere":
+            step = min(step, 2 * self.radius / math.sqrt(3))
+        return step
+
+    def pause(self):
+        """ Stops :meth:`run` after the current batch, can be called from another thread
+        """
+        self._pause.set()
+
+    def window_centres(self, pos):
+        """ [W, 3] centres of the windows covering ``pos`` sorted by x, y and z
+        """
+        dims = 3 if self.window == "sphere" else 2
+        cells = np.unique(np.floor(pos[:, :dims] / self.step).astype(np.int64), axis=0)
+        centres = np.zeros((cells.shape[0], 3))
+        centres[:, :dims] = (cells + 0.5) * self.step
+        return centres
+
+    def _query(self, tree, pos, centres):
+        if self.window == "sphere":
+            return tree.query_radius(centres, self.radius)
+        # Columns: circumscribed circle in the xy plane and box filter
+        candidates = tree.query_radius(centres[:, :2], self.radius * math.sqrt(2))
+        windows = []
+        for idx, centre in zip(candidates, centres):
+            inside = np.all(np.abs(pos[idx, :2] - centre[:2]) <= self.radius, axis=1)
+            windows.append(idx[inside])
+        return windows
+
+    def _weights(self, pos, centre):
+        if self.blending == "uniform":
+            return torch.ones(pos.shape[0])
+        dims = 3 if self.window == "sphere" else 2
+        sq_dist = ((pos[:, :dims] - centre[:dims]) ** 2).sum(1)
+        sigma = self.radius / 2.0
+        return torch.from_numpy(np.exp(-sq_dist / (2 * sigma ** 2))).float()
+
+    def _make_window(self, attributes, idx, centre):
+        window = Data()
+        for key, item in attributes.items():
+            window[key] = item[idx]
+        if self.center:
+            offset = centre if self.window == "sphere" else np.asarray([centre[0], centre[1], 0])
+            window.pos = window.pos - torch.from_numpy(offset).to(window.pos)
+        window[SaveOriginalPosId.KEY] = torch.arange(idx.shape[0])
+        if self.transform is not None:
+            window = self.transform(window)
+        return window
+
+    def _predict(self, windows):
+        """ Logits of each window, for the points that reach the output of the model
+        """
+        batch = self.collate_fn(windows)
+        with torch.no_grad():
+            self.model.set_input(batch, self.device)
+            self.model.forward()
+        output = self.model.get_output().detach()
+        conv_type = self.model.conv_type
+        is_dense = ConvolutionFormatFactory.check_is_dense_format(conv_type)
+        if is_dense:
+            output = output.reshape(len(windows), -1, output.shape[-1])
+        predictions = []
+        for b in range(len(windows)):
+            predicted = output[b] if is_dense else output[batch.batch == b]
+            predicted = predicted.float().cpu()
+            origin_ids = BaseDataset.get_sample(batch, SaveOriginalPosId.KEY, b, conv_type).cpu()
+            predictions.append((origin_ids, predicted))
+        return predictions
+
+    @staticmethod
+    def _to_window_points(window_pos, origin_ids, logits):
+        """ Logits of every point of the window, points removed by the transform take the logits
+        of their nearest point in the output
+        """
+        if origin_ids.shape[0] == window_pos.shape[0] and torch.equal(origin_ids, torch.arange(origin_ids.shape[0])):
+            return logits
+        full = torch.empty((window_pos.shape[0], logits.shape[1]), dtype=logits.dtype)
+        full[origin_ids] = logits
+        missing = torch.ones(window_pos.shape[0], dtype=torch.bool)
+        missing[origin_ids] = False
+        if missing.any():
+            _, nearest = KDTree(window_pos[origin_ids.numpy()]).query(window_pos[missing.numpy()], k=1)
+            full[missing] = logits[torch.from_numpy(nearest[:, 0])]
+        return full
+
+    def _settings(self, pos):
+        return {
+            "points": kdtree_key(pos),
+            "radius": self.radius,
+            "overlap": self.overlap,
+            "window": self.window,
+            "blending": self.blending,
+        }
+
+    def run(self, data, output_path=None):
+        """ Labels of every point of ``data``.
+
+        Parameters
+        ----------
+        data : Data
+            Point cloud, ``pos`` and every attribute with one row per point are given to the model
+        output_path : str, optional
+            ``.npy`` file the labels are written to as they become final (-1 for points that are
+            not labelled yet). The inference resumes from ``<output_path>.state.pt`` if it exists.
+            Labels are kept in memory and the inference cannot be paused without it
+
+        Returns
+        -------
+        labels : np.array
+            [N] labels, memory mapped if ``output_path`` is given. None if the inference was paused
+        """
+        self._pause.clear()
+        num_points = data.pos.shape[0]
+        attributes = {}
+        for key, item in data:
+            if torch.is_tensor(item) and item.dim() > 0 and item.shape[0] == num_points:
+                attributes[key] = item.cpu()
+        pos = np.ascontiguousarray(attributes["pos"].double().numpy())
+
+        centres = self.window_centres(pos)
+        tree = get_kdtree(pos if self.window == "sphere" else np.ascontiguousarray(pos[:, :2]))
+        order = np.argsort(pos[:, 0], kind="stable")
+        sorted_x = pos[order, 0]
+        rank_of = np.empty(num_points, dtype=np.int64)
+        rank_of[order] = np.arange(num_points)
+
+        # Accumulator of the points of rank [start, start + sums.shape[0]) in the x order
+        state_path = output_path + ".state.pt" if output_path else None
+        settings = self._settings(pos)
+        next_window, start, sums, weights = 0, 0, None, torch.zeros(0)
+        if state_path and os.path.exists(state_path) and os.path.exists(output_path):
+            state = torch.load(state_path)
+            if state["settings"] != settings:
+                raise ValueError(
+                    "{} was created for another point cloud or other settings, remove it to start again".format(
+                        state_path
+                    )
+                )
+            next_window, start, sums, weights = state["next_window"], state["start"], state["sums"], state["weights"]
+            labels = np.load(output_path, mmap_mode="r+")
+            log.info("Resuming inference at window %i / %i", next_window, centres.shape[0])
+        elif output_path:
+            labels = np.lib.format.open_memmap(output_path, mode="w+", dtype=np.int64, shape=(num_points,))
+            labels[:] = -1
+        else:
+            labels = np.full(num_points, -1, dtype=np.int64)
+
+        def save_state():
+            if state_path is None:
+                return
+            labels.flush()
+            atomic_save(
+                {"settings": settings, "next_window": next_window, "start": start, "sums": sums, "weights": weights},
+                state_path,
+            )
+
+        start_time = time.perf_counter()
+        processed_windows, processed_points, labelled = 0, 0, 0
+        num_batches, peak_buffered = 0, 0
+        while next_window < centres.shape[0]:
+            batch_centres = centres[next_window : next_window + self.batch_size]
+            window_ids = self._query(tree, pos, batch_centres)
+            windows = [self._make_window(attributes, idx, c) for idx, c in zip(window_ids, batch_centres)]
+            predictions = self._predict(windows)
+
+            for idx, centre, (origin_ids, logits) in zip(window_ids, batch_centres, predictions):
+                if sums is None:
+                    sums = torch.zeros((0, logits.shape[1]))
+                logits = self._to_window_points(pos[idx], origin_ids, logits)
+                rows = torch.from_numpy(rank_of[idx] - start)
+                end = int(rows.max()) + 1
+                if end > sums.shape[0]:
+                    sums = torch.cat([sums, sums.new_zeros((end - sums.shape[0], sums.shape[1]))])
+                    weights = torch.cat([weights, weights.new_zeros(end - weights.shape[0])])
+                w = self._weights(pos[idx], centre)
+                sums.index_add_(0, rows, logits * w.unsqueeze(-1))
+                weights.index_add_(0, rows, w)
+                processed_points += idx.shape[0]
+            next_window += batch_centres.shape[0]
+            processed_windows += batch_centres.shape[0]
+            num_batches += 1
+
+            # Points that the next windows cannot reach are final
+            if next_window < centres.shape[0]:
+                final = int(np.searchsorted(sorted_x, centres[next_window, 0] - self.radius, side="left"))
+            else:
+                final = num_points
+            peak_buffered = max(peak_buffered, sums.shape[0])
+            num_final = min(max(final - start, 0), sums.shape[0])
+            if num_final:
+                final_labels = torch.where(
+                    weights[:num_final] > 0, sums[:num_final].argmax(1), torch.full((num_final,), -1, dtype=torch.long)
+                )
+                labels[order[start : start + num_final]] = final_labels.numpy()
+                sums, weights = sums[num_final:].clone(), weights[num_final:].clone()
+                start += num_final
+                labelled += num_final
+
+            elapsed = time.perf_counter() - start_time
+            self.stats = {
+                "windows": next_window,
+                "total_windows": centres.shape[0],
+                "labelled_points": start,
+                "buffered_points": sums.shape[0],
+                "peak_buffered_points": peak_buffered,
+                "points_per_second": labelled / max(elapsed, 1e-9),
+                "window_points_per_second": processed_points / max(elapsed, 1e-9),
+            }
+            if self.log_every and num_batches % self.log_every == 0:
+                log.info(
+                    "Window %i / %i, %i / %i points labelled, %.0f points/s",
+                    next_window,
+                    centres.shape[0],
+                    start,
+                    num_points,
+                    self.stats["points_per_second"],
+                )
+            if self._pause.is_set() and next_window < centres.shape[0]:
+                save_state()
+                log.info("Inference paused at window %i / %i", next_window, centres.shape[0])
+                return None
+            if self.checkpoint_every and num_batches % self.checkpoint_every == 0:
+                save_state()
+
+        if output_path:
+            labels.flush()
+            if os.path.exists(state_path):
+                os.remove(state_path)
+        log.info(
+            "%i points labelled with %i windows (%i processed in this run) in %.1fs, %.0f points/s",
+            num_points,
+            centres.shape[0],
+            processed_windows,
+            time.perf_counter() - start_time,
+            self.stats.get("points_per_second", 0.0),
+        )
+        return labels
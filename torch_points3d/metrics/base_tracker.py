@@ -8,6 +8,7 @@ import logging
 
 from torch_points3d.metrics.confusion_matrix import ConfusionMatrix
 from torch_points3d.models import model_interface
+from torch_points3d.utils.distributed import is_distributed, all_gather_object
 
 log = logging.getLogger(__name__)
 
@@ -16,6 +17,27 @@ def meter_value(meter, dim=0):
     return float(meter.value()[dim]) if meter.n > 0 else 0.0
 
 
+def all_reduce_meters(meters):
+    """ Merges the sums and counts of average meters across all the processes of a distributed training,
+    every process must call it. Meters are matched by key, the ones missing in a process are created there.
+
+    Parameters
+    ----------
+    meters : dict
+        ``tnt.meter.AverageValueMeter`` by key, updated in place
+    """
+    local = {key: (float(meter.sum), meter.n) for key, meter in meters.items() if meter.n > 0}
+    totals = {}
+    for process_meters in all_gather_object(local):
+        for key, (meter_sum, n) in process_meters.items():
+            total_sum, total_n = totals.get(key, (0.0, 0))
+            totals[key] = (total_sum + meter_sum, total_n + n)
+    for key, (meter_sum, n) in totals.items():
+        meter = meters.setdefault(key, tnt.meter.AverageValueMeter())
+        meter.reset()
+        meter.add(meter_sum, n=n)
+
+
 class BaseTracker:
     def __init__(self, stage: str, wandb_log: bool, use_tensorboard: bool):
         self._wandb = wandb_log
@@ -58,8 +80,16 @@ class BaseTracker:
         """ Lifcycle method that is called at the end of an epoch. Use this to compute
         end of epoch metrics.
         """
+        if not self._finalised and is_distributed():
+            self._all_reduce()
         self._finalised = True
 
+    def _all_reduce(self):
+        """ Reduces the statistics tracked by all the processes of a distributed training, called by
+        every process when the tracker gets finalised. Only the means of the losses are reduced.
+        """
+        all_reduce_meters(self._loss_meters)
+
     def _append_losses(self, losses):
         for key, loss in losses.items():
             if loss is None:
@@ -107,6 +137,25 @@ class BaseTracker:
             "current_metrics": self._remove_stage_from_metric_keys(self._stage, metrics),
         }
 
+    def publish_profile(self, profile, step):
+        """ Publishes the timings of the pipeline stages recorded by a ``StageProfiler`` to wandb and tensorboard
+        Arguments:
+            profile: summary of the profiler, statistics in milliseconds for each stage
+            step: current epoch
+        """
+        metrics = {}
+        for name, stats in profile.items():
+            for key in ["mean", "p50", "p90", "p99"]:
+                if key in stats:
+                    metrics["profile/{}/{}_ms".format(name, key)] = stats[key]
+
+        if self._wandb:
+            wandb.log({"{}/{}".format(key, self._stage): value for key, value in metrics.items()}, step=step)
+
+        if self._use_tensorboard:
+            for key, value in metrics.items():
+                self._writer.add_scalar("{}/{}".format(key, self._stage), value, step)
+
     def print_summary(self):
         metrics = self.get_metrics(verbose=True)
         log.info("".join(["=" for i in range(50)]))
@@ -0,0 +1,189 @@
+import os
+import atexit
+import hashlib
+import logging
+import threading
+from typing import Dict
+import torch
+
+log = logging.getLogger(__name__)
+
+
+def weights_dir(checkpoint_file):
+    """ Directory holding the weight sets referenced by ``checkpoint_file``
+    """
+    return os.path.splitext(checkpoint_file)[0] + "_weights"
+
+
+def weights_path(directory, key):
+    return os.path.join(directory, "{}.pt".format(key))
+
+
+def to_cpu(obj):
+    """ Recursive copy of ``obj`` where every tensor is detached and copied to the CPU.
+    Used to snapshot state dicts that keep being updated in place by the training loop.
+    """
+    if torch.is_tensor(obj):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return obj.__class__((k, to_cpu(v)) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return obj.__class__(to_cpu(v) for v in obj)
+    return obj
+
+
+def state_dict_hash(state_dict):
+    """ Content hash of a state dict: names, dtypes, shapes and values of its tensors
+    """
+    hasher = hashlib.sha1()
+    for key in sorted(state_dict.keys()):
+        value = state_dict[key]
+        hasher.update(key.encode())
+        if torch.is_tensor(value):
+            value = value.detach().cpu()
+            hasher.update(str((value.dtype, tuple(value.shape))).encode())
+            if value.dtype == torch.bfloat16:
+                value = value.float()
+            hasher.update(value.numpy().tobytes())
+        else:
+            hasher.update(repr(value).encode())
+    return hasher.hexdigest()
+
+
+_WRITERS: "Dict[str, CheckpointWriter]" = {}
+
+
+def get_writer(checkpoint_file):
+    """ Writer of ``checkpoint_file``, shared by every checkpoint object of the process that writes this file
+    """
+    path = os.path.abspath(checkpoint_file)
+    if path not in _WRITERS:
+        _WRITERS[path] = CheckpointWriter(checkpoint_file)
+    return _WRITERS[path]
+
+
+def flush(checkpoint_file):
+    """ Waits for the pending writes of ``checkpoint_file`` if any
+    """
+    writer = _WRITERS.get(os.path.abspath(checkpoint_file))
+    if writer is not None:
+        writer.flush()
+
+
+def atomic_save(obj, path):
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    torch.save(obj, tmp_path)
+    os.replace(tmp_path, path)
+
+
+class CheckpointWriter:
+    """ Writes checkpoints on a background thread.
+
+    Each weight set of ``models`` is saved once, in ``<checkpoint>_weights/<content hash>.pt``, and the
+    checkpoint file only references them by hash. Identical weights stored under several keys
+    (e.g. ``best_acc`` and ``best_miou``) share one file and loading a weight set does not require
+    unpickling the others. Files are written to a temporary name and renamed once complete.
+    Only the most recent request is written if the thread falls behind.
+
+    Parameters
+    ----------
+    checkpoint_file : str
+        Path to the checkpoint file
+    asynchronous : bool, optional
+        If False, writes happen in the calling thread
+    """
+
+    def __init__(self, checkpoint_file, asynchronous=True):
+        self.checkpoint_file = checkpoint_file
+        self.asynchronous = asynchronous
+        self._hashes = {}  # id(state_dict) -> (state_dict, hash), avoids hashing unchanged weights again
+        self._pending = None
+        self._busy = False
+        self._error = None
+        self._condition = threading.Condition()
+        self._thread = None
+        if asynchronous:
+            self._thread = threading.Thread(target=self._run, name="CheckpointWriter", daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def save(self, objects):
+        """ Schedules the writing of ``objects``. ``objects["models"]`` maps names to state dicts
+        or to the hash of weights that are already on disk. Tensors must not be modified afterwards.
+        """
+        if not self.asynchronous:
+            self._write(objects)
+            return
+        with self._condition:
+            self._raise_error()
+            self._pending = objects
+            self._condition.notify_all()
+
+    def flush(self):
+        """ Blocks until every scheduled checkpoint is on disk
+        """
+        if not self.asynchronous:
+            return
+        with self._condition:
+            while self._pending is not None or self._busy:
+                self._condition.wait()
+            self._raise_error()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("Checkpoint could not be written to {}".format(self.checkpoint_file)) from error
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None:
+                    self._condition.wait()
+                objects, self._pending = self._pending, None
+                self._busy = True
+            try:
+                self._write(objects)
+            except Exception as e:
+                log.exception("Failed to write checkpoint %s", self.checkpoint_file)
+                self._error = e
+            finally:
+                with self._condition:
+                    self._busy = False
+                    self._condition.notify_all()
+
+    def _hash(self, state_dict):
+        cached = self._hashes.get(id(state_dict))
+        if cached is not None and cached[0] is state_dict:
+            return cached[1]
+        key = state_dict_hash(state_dict)
+        self._hashes[id(state_dict)] = (state_dict, key)
+        return key
+
+    def _write(self, objects):
+        directory = weights_dir(self.checkpoint_file)
+        os.makedirs(directory, exist_ok=True)
+        models = {}
+        for name, state_dict in objects["models"].items():
+            if isinstance(state_dict, str):
+                models[name] = state_dict
+                continue
+            key = self._hash(state_dict)
+            path = weights_path(directory, key)
+            if not os.path.exists(path):
+                atomic_save(state_dict, path)
+            models[name] = key
+
+        # Forget the state dicts that are not referenced anymore
+        referenced = set(id(state_dict) for state_dict in objects["models"].values())
+        self._hashes = {k: v for k, v in self._hashes.items() if k in referenced}
+
+        to_save = dict(objects)
+        to_save["models"] = models
+        atomic_save(to_save, self.checkpoint_file)
+
+        # Weight sets that are not used by the checkpoint anymore
+        used = set(weights_path(directory, key) for key in models.values())
+        for filename in os.listdir(directory):
+            path = os.path.join(directory, filename)
+            if filename.endswith(".pt") and path not in used:
+                os.remove(path)
@@ -3,7 +3,7 @@ import torch
 import torchnet as tnt
 
 from torch_points3d.metrics.confusion_matrix import ConfusionMatrix
-from torch_points3d.metrics.base_tracker import BaseTracker, meter_value
+from torch_points3d.metrics.base_tracker import BaseTracker, meter_value, all_reduce_meters
 from torch_points3d.models import model_interface
 
 
@@ -48,6 +48,10 @@ class ClassificationTracker(BaseTracker):
 
         self._acc.add(100 * self.compute_acc(outputs, targets))
 
+    def _all_reduce(self):
+        super()._all_reduce()
+        all_reduce_meters({"acc": self._acc})
+
     def get_metrics(self, verbose=False) -> Dict[str, float]:
         """ Returns a dictionnary of all metrics and losses being tracked
         """
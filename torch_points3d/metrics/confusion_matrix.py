@@ -1,15 +1,20 @@
 import numpy as np
-import sklearn.metrics as sk
+import torch
 import os
 
+from torch_points3d.utils.distributed import all_reduce_sum
+
 
 class ConfusionMatrix:
     """Streaming interface to allow for any source of predictions. 
-    Initialize it, count predictions one by one, then print confusion matrix and intersection-union score"""
+    Initialize it, count predictions one by one, then print confusion matrix and intersection-union score.
+    Counts are accumulated on the device of the predictions and only copied to the host when the
+    matrix or a metric is requested."""
 
     def __init__(self, number_of_labels=2):
         self.number_of_labels = number_of_labels
-        self.confusion_matrix = None
+        self._counts = None
+        self._host_matrix = None
 
     @staticmethod
     def create_from_matrix(confusion_matrix):
@@ -18,13 +23,58 @@ class ConfusionMatrix:
         matrix.confusion_matrix = confusion_matrix
         return matrix
 
+    @property
+    def confusion_matrix(self):
+        """ [number_of_labels, number_of_labels] numpy array, None if nothing has been counted yet
+        """
+        if self._host_matrix is None and self._counts is not None:
+            self._host_matrix = self._counts.cpu().numpy().reshape(self.number_of_labels, self.number_of_labels)
+        return self._host_matrix
+
+    @confusion_matrix.setter
+    def confusion_matrix(self, confusion_matrix):
+        self._counts = torch.as_tensor(np.asarray(confusion_matrix)).flatten()
+        self._host_matrix = None
+
     def count_predicted_batch(self, ground_truth_vec, predicted):
-        assert np.max(predicted) < self.number_of_labels
-        batch_confusion = sk.confusion_matrix(ground_truth_vec, predicted, labels=range(self.number_of_labels))
-        if self.confusion_matrix is None:
-            self.confusion_matrix = batch_confusion
+        """ Adds a batch of predictions to the matrix
+
+        Parameters
+        ----------
+        ground_truth_vec : torch.Tensor or np.array
+            [N] labels, from 0 to number_of_labels-1
+        predicted : torch.Tensor or np.array
+            [N] predicted labels
+
+        Pairs where either label is outside of [0, number_of_labels) (ignored labels for example) are not counted.
+        """
+        ground_truth_vec = torch.as_tensor(ground_truth_vec).long().flatten()
+        predicted = torch.as_tensor(predicted, device=ground_truth_vec.device).long().flatten()
+        num_cells = self.number_of_labels ** 2
+        valid = (
+            (ground_truth_vec >= 0)
+            & (ground_truth_vec < self.number_of_labels)
+            & (predicted >= 0)
+            & (predicted < self.number_of_labels)
+        )
+        # Invalid pairs go to an extra cell that is dropped, masking on the device keeps the batch size static
+        cells = (ground_truth_vec * self.number_of_labels + predicted).masked_fill(~valid, num_cells)
+        batch_confusion = torch.bincount(cells, minlength=num_cells + 1)[:num_cells]
+        if self._counts is None:
+            self._counts = batch_confusion
         else:
-            self.confusion_matrix += batch_confusion
+            self._counts = self._counts.to(batch_confusion.device) + batch_confusion
+        self._host_matrix = None
+
+    def all_reduce(self):
+        """ Sums the counts of all the processes of a distributed training, every process must call it
+        """
+        counts = self._counts
+        if counts is None:
+            counts = torch.zeros(self.number_of_labels ** 2, dtype=torch.long)
+        counts = all_reduce_sum(counts)
+        self._counts = counts if counts.sum() > 0 else None
+        self._host_matrix = None
 
     def get_count(self, ground_truth, predicted):
         """labels are integers from 0 to number_of_labels-1"""
@@ -52,16 +102,10 @@ class ConfusionMatrix:
     def get_overall_accuracy(self):
         """returns 64-bit float"""
         confusion_matrix = self.confusion_matrix
-        matrix_diagonal = 0
-        all_values = 0
-        for row in range(self.number_of_labels):
-            for column in range(self.number_of_labels):
-                all_values += confusion_matrix[row][column]
-                if row == column:
-                    matrix_diagonal += confusion_matrix[row][column]
+        all_values = np.sum(confusion_matrix)
         if all_values == 0:
             all_values = 1
-        return float(matrix_diagonal) / all_values
+        return float(np.trace(confusion_matrix)) / all_values
 
     def get_average_intersection_union(self, missing_as_one=False):
         """ Get the mIoU metric by ignoring missing labels. 
@@ -76,16 +120,13 @@ class ConfusionMatrix:
         return np.sum(values[existing_classes_mask]) / np.sum(existing_classes_mask)
 
     def get_mean_class_accuracy(self):  # added
-        re = 0
-        label_presents = 0
-        for i in range(self.number_of_labels):
-            total_gt = np.sum(self.confusion_matrix[i, :])
-            if total_gt:
-                label_presents += 1
-                re = re + self.confusion_matrix[i][i] / max(1, total_gt)
-        if label_presents == 0:
+        total_gt = np.sum(self.confusion_matrix, axis=1)
+        label_presents = total_gt > 0
+        if not np.any(label_presents):
             return 0
-        return re / label_presents
+        return np.sum(np.diagonal(self.confusion_matrix)[label_presents] / total_gt[label_presents]) / np.sum(
+            label_presents
+        )
 
     def count_gt(self, ground_truth):
         return self.confusion_matrix[ground_truth, :].sum()
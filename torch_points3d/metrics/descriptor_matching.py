@@ -0,0 +1,127 @@
+import numpy as np
+import torch
+
+# Number of entries of the distance matrix computed at once
+DEFAULT_BLOCK_ELEMENTS = 2 ** 24
+
+
+def _as_tensor(x):
+    if isinstance(x, np.ndarray):
+        return torch.from_numpy(np.ascontiguousarray(x, dtype=np.float32))
+    return x.float()
+
+
+def nearest_neighbours(query, support, k=1, block_elements=DEFAULT_BLOCK_ELEMENTS):
+    """ Exact k nearest neighbours in descriptor space by brute force. The query descriptors are processed
+    in blocks so that the distance matrix of a block has at most ``block_elements`` entries, each block is a
+    single matrix product followed by a top k.
+
+    Parameters
+    ----------
+    query : torch.Tensor
+        [M, D] descriptors
+    support : torch.Tensor
+        [N, D] descriptors searched, N >= k
+    k : int, optional
+        Number of neighbours
+    block_elements : int, optional
+        Memory budget of a block
+
+    Returns
+    -------
+    idx : torch.Tensor
+        [M, k] indices in support, closest first
+    sq_dist : torch.Tensor
+        [M, k] square distances
+    """
+    query = _as_tensor(query)
+    support = _as_tensor(support).to(query.device)
+    idx = torch.empty((query.shape[0], k), dtype=torch.long, device=query.device)
+    sq_dist = torch.empty((query.shape[0], k), dtype=query.dtype, device=query.device)
+    if query.shape[0] == 0:
+        return idx, sq_dist
+
+    support_sq_norm = (support ** 2).sum(1)
+    block_size = max(1, block_elements // max(1, support.shape[0]))
+    for start in range(0, query.shape[0], block_size):
+        block = query[start : start + block_size]
+        dist = torch.addmm(support_sq_norm, block, support.t(), alpha=-2)
+        dist += (block ** 2).sum(1, keepdim=True)
+        values, indices = torch.topk(dist, k, dim=1, largest=False)
+        sq_dist[start : start + block_size] = values.clamp(min=0)
+        idx[start : start + block_size] = indices
+    return idx, sq_dist
+
+
+def _match(feat_source, feat_target, mutual, ratio, block_elements):
+    k = 2 if ratio is not None and feat_target.shape[0] > 1 else 1
+    idx, sq_dist = nearest_neighbours(feat_source, feat_target, k, block_elements)
+    mask = torch.ones(feat_source.shape[0], dtype=torch.bool, device=idx.device)
+    if k == 2:
+        # Lowe's ratio test on the distances
+        mask &= sq_dist[:, 0] < (ratio ** 2) * sq_dist[:, 1]
+    if mutual:
+        idx_inv, _ = nearest_neighbours(feat_target, feat_source, 1, block_elements)
+        mask &= idx_inv[idx[:, 0], 0] == torch.arange(feat_source.shape[0], device=idx.device)
+    source = torch.arange(feat_source.shape[0], device=idx.device)[mask]
+    return torch.stack([source, idx[mask, 0]], 1)
+
+
+def match_descriptors(
+    feat_source,
+    feat_target,
+    mutual=False,
+    ratio=None,
+    batch_source=None,
+    batch_target=None,
+    block_elements=DEFAULT_BLOCK_ELEMENTS,
+):
+    """ Matches each source descriptor with its nearest target descriptor.
+
+    Parameters
+    ----------
+    feat_source : torch.Tensor or np.ndarray
+        [N, D] source descriptors
+    feat_target : torch.Tensor or np.ndarray
+        [M, D] target descriptors
+    mutual : bool, optional
+        Only keeps the matches whose source is also the nearest neighbour of the target (reciprocity test)
+    ratio : float, optional
+        Only keeps the matches whose distance is below ratio times the distance to the second nearest target
+    batch_source, batch_target : torch.Tensor, optional
+        Sorted batch vectors, descriptors are only matched within the same batch element
+    block_elements : int, optional
+        Maximum number of entries of the distance matrices computed at once
+
+    Returns
+    -------
+    torch.Tensor
+        [K, 2] indices of the matches in the source and target descriptors
+    """
+    feat_source = _as_tensor(feat_source)
+    feat_target = _as_tensor(feat_target).to(feat_source.device)
+    if batch_source is None:
+        if feat_source.shape[0] == 0 or feat_target.shape[0] == 0:
+            return torch.empty((0, 2), dtype=torch.long, device=feat_source.device)
+        return _match(feat_source, feat_target, mutual, ratio, block_elements)
+
+    num_batches = int(max(batch_source.max(), batch_target.max())) + 1
+    count_source = torch.bincount(batch_source, minlength=num_batches).tolist()
+    count_target = torch.bincount(batch_target, minlength=num_batches).tolist()
+    matches = []
+    start_source = start_target = 0
+    for n_source, n_target in zip(count_source, count_target):
+        if n_source > 0 and n_target > 0:
+            m = _match(
+                feat_source[start_source : start_source + n_source],
+                feat_target[start_target : start_target + n_target],
+                mutual,
+                ratio,
+                block_elements,
+            )
+            matches.append(m + torch.tensor([start_source, start_target], device=m.device))
+        start_source += n_source
+        start_target += n_target
+    if len(matches) == 0:
+        return torch.empty((0, 2), dtype=torch.long, device=feat_source.device)
+    return torch.cat(matches)
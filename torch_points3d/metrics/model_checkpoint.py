@@ -12,6 +12,14 @@ from torch_points3d.utils.colors import COLORS, colored_print
 from torch_points3d.core.schedulers.lr_schedulers import instantiate_scheduler
 from torch_points3d.core.schedulers.bn_schedulers import instantiate_bn_scheduler
 from torch_points3d.models.model_factory import instantiate_model
+from torch_points3d.utils.distributed import is_main_process
+from torch_points3d.metrics.checkpoint_writer import (
+    get_writer,
+    flush as flush_writes,
+    weights_dir,
+    weights_path,
+    to_cpu,
+)
 
 log = logging.getLogger(__name__)
 
@@ -34,19 +42,27 @@ class Checkpoint:
         self.schedulers: Dict[str, Any] = {}
 
     def save_objects(self, models_to_save: Dict[str, Any], stage, current_stat, optimizer, schedulers, **kwargs):
-        """ Saves checkpoint with updated mdoels for the given stage
+        """ Saves checkpoint with updated mdoels for the given stage.
+        The states are copied to the CPU and written to disk on a background thread, see :class:`CheckpointWriter`
         """
         self.models = models_to_save
-        self.optimizer = (optimizer.__class__.__name__, optimizer.state_dict())
+        self.optimizer = (optimizer.__class__.__name__, to_cpu(optimizer.state_dict()))
         self.schedulers = {
-            scheduler_name: [scheduler.scheduler_opt, scheduler.state_dict()]
+            scheduler_name: [scheduler.scheduler_opt, copy.deepcopy(scheduler.state_dict())]
             for scheduler_name, scheduler in schedulers.items()
         }
         to_save = kwargs
         for key, value in self.__dict__.items():
             if not key.startswith("_"):
                 to_save[key] = value
-        torch.save(to_save, self._check_path)
+        to_save["models"] = dict(self.models)
+        to_save["stats"] = copy.deepcopy(self.stats)
+        get_writer(self._check_path).save(to_save)
+
+    def flush(self):
+        """ Waits until the last checkpoint saved is on disk
+        """
+        flush_writes(self._check_path)
 
     @staticmethod
     def load(checkpoint_dir: str, checkpoint_name: str, run_config: DictConfig, strict=False):
@@ -54,6 +70,7 @@ class Checkpoint:
         checkpoint located at [checkpointdir]/[checkpoint_name].pt
         """
         checkpoint_file = os.path.join(checkpoint_dir, checkpoint_name) + ".pt"
+        flush_writes(checkpoint_file)
         if not os.path.exists(checkpoint_file):
             ckp = Checkpoint(checkpoint_file)
             if strict:
@@ -76,9 +93,23 @@ class Checkpoint:
             objects = torch.load(checkpoint_file, map_location="cpu")
             for key, value in objects.items():
                 setattr(ckp, key, value)
+
+            # Weights are stored apart from the checkpoint and only referenced by their hash
+            referenced = set(value for value in ckp.models.values() if isinstance(value, str))
+            if referenced and os.path.abspath(chkp_name) != os.path.abspath(checkpoint_file):
+                os.makedirs(weights_dir(chkp_name), exist_ok=True)
+                for key in referenced:
+                    shutil.copyfile(
+                        weights_path(weights_dir(checkpoint_file), key), weights_path(weights_dir(chkp_name), key)
+                    )
             ckp._filled = True
         return ckp
 
+    def _load_weights(self, weights):
+        if isinstance(weights, str):
+            return torch.load(weights_path(weights_dir(self._check_path), weights), map_location="cpu")
+        return weights
+
     @property
     def is_empty(self):
         return not self._filled
@@ -129,12 +160,12 @@ class Checkpoint:
                 log.info("Available weights : {}".format(keys))
                 try:
                     key_name = "best_{}".format(weight_name)
-                    model = models[key_name]
+                    model = self._load_weights(models[key_name])
                     log.info("Model loaded from {}:{}.".format(self._check_path, key_name))
                     return model
                 except:
                     key_name = Checkpoint._LATEST
-                    model = models[Checkpoint._LATEST]
+                    model = self._load_weights(models[Checkpoint._LATEST])
                     log.info("Model loaded from {}:{}".format(self._check_path, key_name))
                     return model
             except:
@@ -175,6 +206,11 @@ class ModelCheckpoint(object):
         else:
             raise ValueError("Checkpoint is empty")
 
+    def flush(self):
+        """ Waits until the checkpoints are written to disk
+        """
+        self._checkpoint.flush()
+
     @property
     def start_epoch(self):
         if self._resume:
@@ -225,13 +261,16 @@ class ModelCheckpoint(object):
         Arguments:
             model {[CheckpointInterface]} -- [Model]
             metrics_holder {[Dict]} -- [Need to contain stage, epoch, current_metrics]
+        In a distributed training, only the main process saves checkpoints.
         """
+        if not is_main_process():
+            return
         metrics = metrics_holder["current_metrics"]
         stage = metrics_holder["stage"]
         epoch = metrics_holder["epoch"]
 
         stats = self._checkpoint.stats
-        state_dict = copy.deepcopy(model.state_dict())
+        state_dict = to_cpu(model.state_dict())
 
         current_stat = {}
         current_stat["epoch"] = epoch
@@ -1,7 +1,7 @@
 import torch
 import numpy as np
 from sklearn.neighbors import NearestNeighbors
-from torch_geometric.nn import knn
+from .descriptor_matching import match_descriptors
 
 
 def compute_accuracy(embedded_ref_features, embedded_val_features):
@@ -143,7 +143,7 @@ def compute_hit_ratio(xyz, xyz_target, T_gt, tau_1):
     assert xyz.shape == xyz.shape
     dist = torch.norm(xyz.mm(T_gt[:3, :3].T) + T_gt[:3, 3] - xyz_target, dim=1)
 
-    return torch.mean((dist < 0.1).to(torch.float))
+    return torch.mean((dist < tau_1).to(torch.float))
 
 
 def compute_transfo_error(T_gt, T_pred):
@@ -159,12 +159,165 @@ def compute_transfo_error(T_gt, T_pred):
     return rte, rre
 
 
-def get_matches(feat_source, feat_target, sym=False):
+def get_matches(feat_source, feat_target, sym=False, batch_source=None, batch_target=None):
+    """
+    nearest neighbour of each source feature in the target features, [N, 2] (source, target) indices.
+    With batch vectors (sorted), the neighbour is searched in the same batch element.
+    sym only keeps the mutual nearest neighbours, see match_descriptors.
+    """
+    return match_descriptors(feat_source, feat_target, mutual=sym, batch_source=batch_source, batch_target=batch_target)
+
+
+def _batch_size(batch, num_batches=None):
+    if num_batches is None:
+        num_batches = int(batch.max()) + 1 if len(batch) > 0 else 0
+    return num_batches
+
+
+def _batch_sum(x, batch, num_batches):
+    """
+    sum of the rows of x that belong to each batch element, [num_batches, *x.shape[1:]]
+    """
+    out = torch.zeros((num_batches,) + tuple(x.shape[1:]), dtype=x.dtype, device=x.device)
+    return out.index_add_(0, batch, x)
+
+
+def _batch_mean(x, batch, num_batches):
+    count = torch.bincount(batch, minlength=num_batches).clamp(min=1).to(x.dtype)
+    return _batch_sum(x, batch, num_batches) / count.view(-1, *([1] * (x.dim() - 1)))
+
+
+def _transform(xyz, T, batch):
+    """
+    apply the [B, 4, 4] transformations to the points of each batch element
+    """
+    T = T[:, :3].reshape(-1, 12).index_select(0, batch).view(-1, 3, 4)
+    return torch.baddbmm(T[:, :, 3:], T[:, :, :3], xyz.unsqueeze(-1)).squeeze(-1)
+
+
+def estimate_transfo_batch(xyz, xyz_target, batch, num_batches=None):
+    """
+    estimate the rotation and translation of B pairs at once using Kabsch algorithm
+    Parameters:
+    xyz : [N, 3] source points of every pair
+    xyz_target: [N, 3] corresponding target points
+    batch: [N] pair of each correspondence
+    num_batches: number of pairs B, defaults to batch.max() + 1
+    return:
+    [B, 4, 4] transformations
+    """
+    assert xyz.shape == xyz_target.shape
+    num_batches = _batch_size(batch, num_batches)
+    mean = _batch_mean(xyz, batch, num_batches)
+    mean_target = _batch_mean(xyz_target, batch, num_batches)
+    xyz_c = xyz - mean[batch]
+    xyz_target_c = xyz_target - mean_target[batch]
+    Q = _batch_mean(xyz_c.unsqueeze(-1) * xyz_target_c.unsqueeze(1), batch, num_batches)
+    U, S, V = torch.svd(Q)
+    d = torch.det(V @ U.transpose(1, 2))
+    diag = torch.ones(num_batches, 3, device=xyz.device)
+    diag[:, 2] = d
+    R = (V * diag.unsqueeze(1)) @ U.transpose(1, 2)
+    t = mean_target - (R @ mean.unsqueeze(-1)).squeeze(-1)
+    T = torch.eye(4, device=xyz.device).repeat(num_batches, 1, 1)
+    T[:, :3, :3] = R
+    T[:, :3, 3] = t
+    return T
+
+
+def get_trans_batch(x):
+    """
+    get the [B, 4, 4] matrices of the [B, 6] rotation vectors and translations
+    """
+    num_batches = x.shape[0]
+    theta = torch.norm(x[:, :3], dim=1)
+    axis = x[:, :3] / torch.where(theta > 0, theta, torch.ones_like(theta)).view(-1, 1)
+    zero = torch.zeros_like(theta)
+    K = torch.stack(
+        [zero, -axis[:, 2], axis[:, 1], axis[:, 2], zero, -axis[:, 0], -axis[:, 1], axis[:, 0], zero], 1
+    ).view(-1, 3, 3)
+    sin = torch.sin(theta).view(-1, 1, 1)
+    cos = torch.cos(theta).view(-1, 1, 1)
+    T = torch.eye(4, device=x.device).repeat(num_batches, 1, 1)
+    T[:, :3, :3] = torch.eye(3, device=x.device) + sin * K + (1 - cos) * (K @ K)
+    T[:, :3, 3] = x[:, 3:]
+    return T
+
+
+def fast_global_registration_batch(xyz, xyz_target, batch, num_batches=None, mu_init=1, num_iter=20):
+    """
+    Fast Global Registration of B pairs at once, the B normal equations of each iteration are
+    accumulated per correspondence and solved in a single batched call.
+    Pairs without correspondences get the identity.
+    http://vladlen.info/papers/fast-global-registration.pdf
+    Parameters:
+    xyz : [N, 3] source points of every pair
+    xyz_target: [N, 3] corresponding target points
+    batch: [N] pair of each correspondence
+    return:
+    [B, 4, 4] transformations
+    """
+    assert xyz.shape == xyz_target.shape
+    num_batches = _batch_size(batch, num_batches)
+    empty = torch.bincount(batch, minlength=num_batches) == 0
 
-    matches = knn(feat_target, feat_source, k=1).T
-    if sym:
-        match_inv = knn(feat_source, feat_target, k=1).T
-        mask = match_inv[matches[:, 1], 1] == torch.arange(matches.shape[0])
-        return matches[mask]
-    else:
-        return matches
+    T_res = torch.eye(4, device=xyz.device).repeat(num_batches, 1, 1)
+    mu = mu_init
+    source = xyz.clone()
+    weight = torch.ones(len(source), device=xyz.device)
+    eye = torch.eye(3, device=xyz.device)
+    for i in range(num_iter):
+        if i > 0 and i % 5 == 0:
+            mu /= 2.0
+        # The rows of each correspondence are weight * [-[source]_x, I] and weight * (target - source),
+        # the normal equations only depend on weighted sums of the moments of the correspondences
+        w2 = (weight ** 2).view(-1, 1)
+        moments = torch.cat(
+            [
+                w2,
+                w2 * source,
+                w2 * (source.unsqueeze(-1) * source.unsqueeze(1)).view(-1, 9),
+                w2 * torch.cross(source, xyz_target, dim=1),
+                w2 * (xyz_target - source),
+            ],
+            1,
+        )
+        moments = _batch_sum(moments, batch, num_batches)
+        sum_w2, sum_p, sum_ppt = moments[:, 0], moments[:, 1:4], moments[:, 4:13].view(-1, 3, 3)
+        zero = torch.zeros_like(sum_w2)
+        skew = torch.stack(
+            [zero, -sum_p[:, 2], sum_p[:, 1], sum_p[:, 2], zero, -sum_p[:, 0], -sum_p[:, 1], sum_p[:, 0], zero], 1
+        ).view(-1, 3, 3)
+        trace = torch.diagonal(sum_ppt, dim1=1, dim2=2).sum(-1).view(-1, 1, 1)
+        AtA = torch.cat(
+            [torch.cat([trace * eye - sum_ppt, skew], 2), torch.cat([-skew, sum_w2.view(-1, 1, 1) * eye], 2),], 1,
+        )
+        Atb = moments[:, 13:19].unsqueeze(-1)
+        AtA[empty] = torch.eye(6, device=xyz.device)
+        sol, _ = torch.solve(Atb, AtA)
+        T = get_trans_batch(sol.squeeze(-1))
+        source = _transform(source, T, batch)
+        T_res = T @ T_res
+        weight = get_geman_mclure_weight(source, xyz_target, mu).view(-1)
+    return T_res
+
+
+def compute_hit_ratio_batch(xyz, xyz_target, T_gt, batch, tau_1, num_batches=None):
+    """
+    compute proportion of point which are close for each of the B pairs, [B]
+    """
+    assert xyz.shape == xyz_target.shape
+    num_batches = _batch_size(batch, num_batches)
+    dist = torch.norm(_transform(xyz, T_gt, batch) - xyz_target, dim=1)
+    return _batch_mean((dist < tau_1).to(torch.float), batch, num_batches)
+
+
+def compute_transfo_error_batch(T_gt, T_pred):
+    """
+    translation and rotation errors (in degree) of [B, 4, 4] transformations, see compute_transfo_error
+    """
+    rte = torch.norm(T_gt[:, :3, 3] - T_pred[:, :3, 3], dim=1)
+    trace = torch.diagonal(T_gt[:, :3, :3] @ T_pred[:, :3, :3].transpose(1, 2), dim1=1, dim2=2).sum(-1)
+    cos_theta = torch.clamp((trace - 1) * 0.5, -1.0, 1.0)
+    rre = torch.acos(cos_theta) * 180 / np.pi
+    return rte, rre
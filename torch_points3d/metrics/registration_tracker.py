@@ -2,14 +2,15 @@ from typing import Dict
 import torchnet as tnt
 import torch
 
-from .base_tracker import BaseTracker
+from .base_tracker import BaseTracker, all_reduce_meters
 from .registration_metrics import compute_accuracy
-from .registration_metrics import estimate_transfo
-from .registration_metrics import fast_global_registration
-from .registration_metrics import compute_hit_ratio
-from .registration_metrics import compute_transfo_error
+from .registration_metrics import estimate_transfo_batch
+from .registration_metrics import fast_global_registration_batch
+from .registration_metrics import compute_hit_ratio_batch
+from .registration_metrics import compute_transfo_error_batch
 from .registration_metrics import get_matches
 from torch_points3d.models import model_interface
+from torch_points3d.utils.distributed import all_gather_object
 
 
 class PatchRegistrationTracker(BaseTracker):
@@ -37,6 +38,13 @@ class PatchRegistrationTracker(BaseTracker):
 
         self._acc = compute_accuracy(outputs[:N], outputs[N:])
 
+    def _all_reduce(self):
+        super()._all_reduce()
+        # Accuracy of the last batch of each process
+        accs = [acc for acc in all_gather_object(getattr(self, "_acc", None)) if acc is not None]
+        if accs:
+            self._acc = sum(accs) / len(accs)
+
     def get_metrics(self, verbose=False) -> Dict[str, float]:
         """ Returns a dictionnary of all metrics and losses being tracked
         """
@@ -88,55 +96,56 @@ it measures loss, feature match recall, hit ratio, rotation error, translation e
             # batch_ind, batch_ind_target, batch_size_ind = model.get_ind()  # type: ignore
             input, input_target = model.get_input()
             batch_xyz, batch_xyz_target = input.pos, input_target.pos
-            batch_ind, batch_ind_target, batch_size_ind = input.ind, input_target.ind, input.size
+            batch_ind, batch_ind_target = input.ind, input_target.ind
             batch_feat, batch_feat_target = model.get_output()
 
-            nb_batches = batch_idx.max() + 1
-            cum_sum = 0
-            cum_sum_target = 0
-            begin = 0
-            end = batch_size_ind[0].item()
-            for b in range(nb_batches):
-                xyz = batch_xyz[batch_idx == b]
-                xyz_target = batch_xyz_target[batch_idx_target == b]
-                feat = batch_feat[batch_idx == b]
-                feat_target = batch_feat_target[batch_idx_target == b]
-                # as we have concatenated ind,
-                # we need to substract the cum_sum because we deal
-                # with each batch independently
-                # ind = batch_ind[b * len(batch_ind) / nb_batches : (b + 1) * len(batch_ind) / nb_batches] - cum_sum
-                # ind_target = (batch_ind_target[b * len(batch_ind_target) / nb_batches : (b + 1) * len(batch_ind_target) / nb_batches]- cum_sum_target)
-                ind = batch_ind[begin:end] - cum_sum
-                ind_target = batch_ind_target[begin:end] - cum_sum_target
-                # print(begin, end)
-                if b < nb_batches - 1:
-                    begin = end
-                    end = begin + batch_size_ind[b + 1].item()
-                cum_sum += len(xyz)
-                cum_sum_target += len(xyz_target)
-                rand = torch.randperm(len(feat))[: self.num_points]
-                rand_target = torch.randperm(len(feat_target))[: self.num_points]
-
-                matches_gt = torch.stack([ind, ind_target]).transpose(0, 1)
-
-                # print(matches_gt.max(0), len(xyz), len(xyz_target), len(matches_gt))
-                # print(batch_ind.shape, nb_batches)
-                T_gt = estimate_transfo(xyz[matches_gt[:, 0]], xyz_target[matches_gt[:, 1]])
-
-                matches_pred = get_matches(feat[rand], feat_target[rand_target])
-                T_pred = fast_global_registration(
-                    xyz[rand][matches_pred[:, 0]], xyz_target[rand_target][matches_pred[:, 1]]
-                )
-
-                hit_ratio = compute_hit_ratio(
-                    xyz[rand][matches_pred[:, 0]], xyz_target[rand_target][matches_pred[:, 1]], T_gt, self.tau_1
-                )
-
-                trans_error, rot_error = compute_transfo_error(T_pred, T_gt)
-                self._hit_ratio.add(hit_ratio.item())
-                self._feat_match_ratio.add(float(hit_ratio.item() > self.tau_2))
-                self._trans_error.add(trans_error.item())
-                self._rot_error.add(rot_error.item())
+            nb_batches = int(batch_idx.max()) + 1
+            # ind and ind_target are already offset by the number of points of the previous pairs
+            matches_gt = torch.stack([batch_ind, batch_ind_target]).transpose(0, 1)
+            T_gt = estimate_transfo_batch(
+                batch_xyz[matches_gt[:, 0]], batch_xyz_target[matches_gt[:, 1]], batch_idx[matches_gt[:, 0]], nb_batches
+            )
+
+            rand = self._sample_per_batch(batch_idx, nb_batches)
+            rand_target = self._sample_per_batch(batch_idx_target, nb_batches)
+            xyz, xyz_target = batch_xyz[rand], batch_xyz_target[rand_target]
+            matches_pred = get_matches(
+                batch_feat[rand],
+                batch_feat_target[rand_target],
+                batch_source=batch_idx[rand],
+                batch_target=batch_idx_target[rand_target],
+            )
+            xyz_match, xyz_target_match = xyz[matches_pred[:, 0]], xyz_target[matches_pred[:, 1]]
+            batch_match = batch_idx[rand][matches_pred[:, 0]]
+            T_pred = fast_global_registration_batch(xyz_match, xyz_target_match, batch_match, nb_batches)
+
+            hit_ratio = compute_hit_ratio_batch(xyz_match, xyz_target_match, T_gt, batch_match, self.tau_1, nb_batches)
+            trans_error, rot_error = compute_transfo_error_batch(T_pred, T_gt)
+            for hit, trans, rot in zip(hit_ratio.tolist(), trans_error.tolist(), rot_error.tolist()):
+                self._hit_ratio.add(hit)
+                self._feat_match_ratio.add(float(hit > self.tau_2))
+                self._trans_error.add(trans)
+                self._rot_error.add(rot)
+
+    def _all_reduce(self):
+        super()._all_reduce()
+        all_reduce_meters(
+            {
+                "rot_error": self._rot_error,
+                "trans_error": self._trans_error,
+                "hit_ratio": self._hit_ratio,
+                "feat_match_ratio": self._feat_match_ratio,
+            }
+        )
+
+    def _sample_per_batch(self, batch, num_batches):
+        """ Indices of at most num_points random points of each batch element, sorted by batch element
+        """
+        order = torch.argsort(batch.double() + torch.rand(len(batch), dtype=torch.double, device=batch.device))
+        count = torch.bincount(batch, minlength=num_batches)
+        start = torch.cumsum(count, 0) - count
+        rank = torch.arange(len(batch), device=batch.device) - start[batch[order]]
+        return order[rank < self.num_points]
 
     def get_metrics(self, verbose=False):
         metrics = super().get_metrics(verbose)
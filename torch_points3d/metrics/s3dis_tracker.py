@@ -1,14 +1,15 @@
 from typing import Dict
 import logging
 import torch
-from torch_geometric.nn.unpool import knn_interpolate
 
 from torch_points3d.metrics.confusion_matrix import ConfusionMatrix
+from torch_points3d.metrics.voting import VoteAccumulator, NearestPredictionIndex
 from torch_points3d.metrics.segmentation_tracker import SegmentationTracker
 from torch_points3d.metrics.base_tracker import BaseTracker, meter_value
 from torch_points3d.datasets.segmentation import IGNORE_LABEL
 from torch_points3d.core.data_transform import SaveOriginalPosId
 from torch_points3d.models import model_interface
+from torch_points3d.utils.distributed import all_gather_object, is_main_process
 
 log = logging.getLogger(__name__)
 
@@ -17,11 +18,16 @@ class S3DISTracker(SegmentationTracker):
     def reset(self, *args, **kwargs):
         super().reset(*args, **kwargs)
         self._test_area = None
+        self._votes = None
         self._full_vote_miou = None
         self._vote_miou = None
         self._iou_per_class = {}
+        if not hasattr(self, "_nearest_prediction"):
+            # Survives resets, the test area and the points that get a prediction are the same from one epoch
+            # (or voting run) to the next
+            self._nearest_prediction = None
 
-    def track(self, model: model_interface.TrackerInterface, full_res=False, **kwargs):
+    def track(self, model: model_interface.TrackerInterface, full_res=False, sparse_votes=False, **kwargs):
         """ Add current model predictions (usually the result of a batch) to the tracking
         """
         super().track(model)
@@ -32,12 +38,7 @@ class S3DISTracker(SegmentationTracker):
 
         # Test mode, compute votes in order to get full res predictions
         if self._test_area is None:
-            self._test_area = self._dataset.test_data.clone()
-            if self._test_area.y is None:
-                raise ValueError("It seems that the test area data does not have labels (attribute y).")
-            self._test_area.prediction_count = torch.zeros(self._test_area.y.shape[0], dtype=torch.int)
-            self._test_area.votes = torch.zeros((self._test_area.y.shape[0], self._num_classes), dtype=torch.float)
-            self._test_area.to(model.device)
+            self._init_votes(model.device, sparse_votes)
 
         # Gather origin ids and check that it fits with the test set
         inputs = model.get_input()
@@ -52,54 +53,61 @@ class S3DISTracker(SegmentationTracker):
 
         # Set predictions
         outputs = model.get_output()
-        self._test_area.votes[originids] += outputs
-        self._test_area.prediction_count[originids] += 1
+        self._votes.add(originids, outputs)
+
+    def _init_votes(self, device, sparse_votes):
+        self._test_area = self._dataset.test_data.clone()
+        if self._test_area.y is None:
+            raise ValueError("It seems that the test area data does not have labels (attribute y).")
+        self._votes = VoteAccumulator(self._test_area.y.shape[0], self._num_classes, device=device, sparse=sparse_votes)
+
+    def _all_reduce(self):
+        super()._all_reduce()
+        # Each process voted for the spheres of its own shard of the test area
+        if not any(all_gather_object(self._votes is not None)):
+            return
+        if self._votes is None:
+            self._init_votes("cpu", sparse_votes=True)
+        self._votes.all_reduce()
 
     def finalise(self, full_res=False, vote_miou=True, ply_output="", **kwargs):
+        super().finalise()
         per_class_iou = self._confusion_matrix.get_intersection_union_per_class()[0]
         self._iou_per_class = {self._dataset.INV_OBJECT_LABEL[k]: v for k, v in enumerate(per_class_iou)}
 
         if vote_miou and self._test_area:
             # Complete for points that have a prediction
-            self._test_area = self._test_area.to("cpu")
+            predicted_ids, votes = self._votes.predicted()
             c = ConfusionMatrix(self._num_classes)
-            has_prediction = self._test_area.prediction_count > 0
-            gt = self._test_area.y[has_prediction].numpy()
-            pred = torch.argmax(self._test_area.votes[has_prediction], 1).numpy()
-            c.count_predicted_batch(gt, pred)
+            c.count_predicted_batch(self._test_area.y.to(votes.device)[predicted_ids], torch.argmax(votes, 1))
             self._vote_miou = c.get_average_intersection_union() * 100
 
         if full_res:
             self._compute_full_miou()
 
-        if ply_output:
-            has_prediction = self._test_area.prediction_count > 0
+        if ply_output and is_main_process():
+            predicted_ids, votes = self._votes.predicted()
             self._dataset.to_ply(
-                self._test_area.pos[has_prediction].cpu(),
-                torch.argmax(self._test_area.votes[has_prediction], 1).cpu().numpy(),
-                ply_output,
+                self._test_area.pos[predicted_ids.cpu()], torch.argmax(votes, 1).cpu().numpy(), ply_output,
             )
 
     def _compute_full_miou(self):
         if self._full_vote_miou is not None:
             return
 
-        has_prediction = self._test_area.prediction_count > 0
+        predicted_ids, votes = self._votes.predicted()
         log.info(
             "Computing full res mIoU, we have predictions for %.2f%% of the points."
-            % (torch.sum(has_prediction) / (1.0 * has_prediction.shape[0]) * 100)
+            % (predicted_ids.shape[0] / (1.0 * self._test_area.y.shape[0]) * 100)
         )
 
-        self._test_area = self._test_area.to("cpu")
-
-        # Full res interpolation
-        full_pred = knn_interpolate(
-            self._test_area.votes[has_prediction], self._test_area.pos[has_prediction], self._test_area.pos, k=1,
-        )
+        # Full res pred, the closest predicted point of each point is only searched once per test area
+        if self._nearest_prediction is None:
+            self._nearest_prediction = NearestPredictionIndex(self._test_area.pos)
+        full_pred = self._nearest_prediction.interpolate(predicted_ids, torch.argmax(votes, 1))
 
-        # Full res pred
         c = ConfusionMatrix(self._num_classes)
-        c.count_predicted_batch(self._test_area.y.numpy(), torch.argmax(full_pred, 1).numpy())
+        c.count_predicted_batch(self._test_area.y.to(full_pred.device), full_pred)
         self._full_vote_miou = c.get_average_intersection_union() * 100
 
     def get_metrics(self, verbose=False) -> Dict[str, float]:
@@ -1,6 +1,5 @@
 from typing import Dict
 import torch
-import numpy as np
 
 from torch_points3d.metrics.confusion_matrix import ConfusionMatrix
 from torch_points3d.metrics.base_tracker import BaseTracker, meter_value
@@ -50,23 +49,29 @@ class SegmentationTracker(BaseTracker):
         """
         super().track(model)
 
-        outputs = model.get_output()
-        targets = model.get_labels()
+        outputs = self.detach_tensor(model.get_output())
+        targets = torch.as_tensor(self.detach_tensor(model.get_labels()))
 
-        # Mask ignored label
-        mask = targets != self._ignore_label
-        outputs = outputs[mask]
-        targets = targets[mask]
-
-        outputs = self._convert(outputs)
-        targets = self._convert(targets)
+        # Ignored labels are moved out of [0, num_classes) and skipped by the confusion matrix, masking
+        # them out would wait for the device to know the number of remaining points
+        if self._ignore_label >= 0:
+            targets = torch.where(targets == self._ignore_label, torch.full_like(targets, -1), targets)
 
         if len(targets) == 0:
             return
 
         assert outputs.shape[0] == len(targets)
-        self._confusion_matrix.count_predicted_batch(targets, np.argmax(outputs, 1))
+        # Predictions stay on the device of the model, metrics are computed in get_metrics
+        self._confusion_matrix.count_predicted_batch(targets, outputs.argmax(1))
+
+    def _all_reduce(self):
+        super()._all_reduce()
+        self._confusion_matrix.all_reduce()
 
+    def _compute_metrics(self):
+        if self._confusion_matrix.confusion_matrix is None:
+            self._acc, self._macc, self._miou = 0, 0, 0
+            return
         self._acc = 100 * self._confusion_matrix.get_overall_accuracy()
         self._macc = 100 * self._confusion_matrix.get_mean_class_accuracy()
         self._miou = 100 * self._confusion_matrix.get_average_intersection_union()
@@ -76,6 +81,7 @@ class SegmentationTracker(BaseTracker):
         """
         metrics = super().get_metrics(verbose)
 
+        self._compute_metrics()
         metrics["{}_acc".format(self._stage)] = self._acc
         metrics["{}_macc".format(self._stage)] = self._macc
         metrics["{}_miou".format(self._stage)] = self._miou
@@ -4,6 +4,7 @@ import numpy as np
 from .confusion_matrix import ConfusionMatrix
 from .base_tracker import meter_value, BaseTracker
 from torch_points3d.models import model_interface
+from torch_points3d.utils.distributed import all_gather_object
 
 
 class ShapenetPartTracker(BaseTracker):
@@ -68,6 +69,16 @@ class ShapenetPartTracker(BaseTracker):
 
         self._miou_per_class, self._Cmiou, self._Imiou = self._get_metrics_per_class()
 
+    def _all_reduce(self):
+        super()._all_reduce()
+        shape_ious = {cat: [] for cat in self._class_seg_map.keys()}
+        for process_ious in all_gather_object(self._shape_ious):
+            for cat, ious in process_ious.items():
+                shape_ious[cat] += ious
+        self._shape_ious = shape_ious
+        if any(len(ious) for ious in self._shape_ious.values()):
+            self._miou_per_class, self._Cmiou, self._Imiou = self._get_metrics_per_class()
+
     def _get_metrics_per_class(self):
         instance_ious = []
         cat_ious = {}
@@ -0,0 +1,180 @@
+import logging
+import torch
+
+from torch_points3d.utils.kdtree_cache import get_kdtree
+from torch_points3d.utils.distributed import is_distributed, all_reduce_sum
+
+log = logging.getLogger(__name__)
+
+# Votes are reduced across processes by chunks of points to bound the memory used by sparse votes
+REDUCE_CHUNK_POINTS = 1 << 20
+
+
+class VoteAccumulator:
+    """ Accumulates per point predictions (votes) of a large point cloud in place, on any device.
+    With ``sparse=True`` memory is only allocated for points that received at least one vote,
+    which is preferable when the predictions only cover a small fraction of the point cloud.
+
+    Parameters
+    ----------
+    num_points : int
+        Number of points in the full point cloud
+    num_classes : int
+        Size of the prediction vector of each point
+    device : torch.device, optional
+        Device on which votes are accumulated
+    sparse : bool, optional
+        Allocates vote rows on demand instead of for every point
+    """
+
+    def __init__(self, num_points, num_classes, device="cpu", sparse=False):
+        self.num_points = num_points
+        self.num_classes = num_classes
+        self.sparse = sparse
+        if sparse:
+            self._slots = torch.full((num_points,), -1, dtype=torch.long, device=device)
+            self._ids = torch.empty((0,), dtype=torch.long, device=device)
+            self._votes = torch.empty((0, num_classes), dtype=torch.float, device=device)
+            self._counts = torch.empty((0,), dtype=torch.int, device=device)
+        else:
+            self._votes = torch.zeros((num_points, num_classes), dtype=torch.float, device=device)
+            self._counts = torch.zeros((num_points,), dtype=torch.int, device=device)
+
+    @property
+    def device(self):
+        return self._votes.device
+
+    def _rows(self, origin_ids):
+        if not self.sparse:
+            return origin_ids
+        new_ids = torch.unique(origin_ids[self._slots[origin_ids] < 0])
+        if new_ids.shape[0]:
+            start = self._ids.shape[0]
+            self._slots[new_ids] = torch.arange(start, start + new_ids.shape[0], device=self.device)
+            self._ids = torch.cat([self._ids, new_ids])
+            self._votes = torch.cat([self._votes, self._votes.new_zeros((new_ids.shape[0], self.num_classes))])
+            self._counts = torch.cat([self._counts, self._counts.new_zeros(new_ids.shape[0])])
+        return self._slots[origin_ids]
+
+    def add(self, origin_ids, outputs):
+        """ Adds the predictions ``outputs`` [N, num_classes] of the points ``origin_ids`` [N],
+        points that appear several times get one vote per occurence
+        """
+        origin_ids = origin_ids.to(self.device).long()
+        rows = self._rows(origin_ids)
+        self._votes.index_add_(0, rows, outputs.detach().to(self._votes))
+        self._counts.index_add_(0, rows, torch.ones_like(rows, dtype=self._counts.dtype))
+
+    @property
+    def has_prediction(self):
+        """ [num_points] boolean mask of the points that received at least one vote
+        """
+        if not self.sparse:
+            return self._counts > 0
+        mask = torch.zeros(self.num_points, dtype=torch.bool, device=self.device)
+        mask[self._ids] = True
+        return mask
+
+    def predicted(self):
+        """ Returns the indices of the points that received a vote and their accumulated votes
+        """
+        if self.sparse:
+            order = torch.argsort(self._ids)
+            return self._ids[order], self._votes[order]
+        ids = torch.nonzero(self._counts > 0).flatten()
+        return ids, self._votes[ids]
+
+    def all_reduce(self, chunk_points=REDUCE_CHUNK_POINTS):
+        """ Sums the votes of all the processes of a distributed evaluation, every process must call it.
+        Sparse votes are densified one chunk of points at a time and only the points that received a vote
+        in at least one process are kept.
+        """
+        if not is_distributed():
+            return
+        if not self.sparse:
+            for start in range(0, self.num_points, chunk_points):
+                end = min(start + chunk_points, self.num_points)
+                self._votes[start:end] = all_reduce_sum(self._votes[start:end])
+                self._counts[start:end] = all_reduce_sum(self._counts[start:end])
+            return
+
+        ids, votes, counts = [self._ids[:0]], [self._votes[:0]], [self._counts[:0]]
+        for start in range(0, self.num_points, chunk_points):
+            end = min(start + chunk_points, self.num_points)
+            in_chunk = (self._ids >= start) & (self._ids < end)
+            rows = self._ids[in_chunk] - start
+            chunk_votes = self._votes.new_zeros((end - start, self.num_classes))
+            chunk_votes[rows] = self._votes[in_chunk]
+            chunk_counts = self._counts.new_zeros(end - start)
+            chunk_counts[rows] = self._counts[in_chunk]
+            chunk_votes = all_reduce_sum(chunk_votes)
+            chunk_counts = all_reduce_sum(chunk_counts)
+            voted = torch.nonzero(chunk_counts > 0).flatten()
+            ids.append(voted + start)
+            votes.append(chunk_votes[voted])
+            counts.append(chunk_counts[voted])
+        self._ids = torch.cat(ids)
+        self._votes = torch.cat(votes)
+        self._counts = torch.cat(counts)
+        self._slots.fill_(-1)
+        self._slots[self._ids] = torch.arange(self._ids.shape[0], device=self.device)
+
+    def __repr__(self):
+        return "{}(num_points={}, num_classes={}, sparse={})".format(
+            self.__class__.__name__, self.num_points, self.num_classes, self.sparse
+        )
+
+
+class NearestPredictionIndex:
+    """ For every point of a point cloud, index of the closest point that has a prediction.
+    Full resolution predictions are then a gather of the predictions, which is equivalent
+    to a ``knn_interpolate`` with ``k=1`` but the search is only done once for a given set of
+    predicted points and only for the points that do not have a prediction.
+
+    Parameters
+    ----------
+    pos : torch.Tensor
+        [N, 3] positions of the full point cloud
+    """
+
+    def __init__(self, pos):
+        self._pos = pos.detach().cpu()
+        self._predicted_ids = None
+        self._index = None
+
+    def _build(self, predicted_ids):
+        num_points = self._pos.shape[0]
+        index = torch.empty(num_points, dtype=torch.long)
+        missing = torch.ones(num_points, dtype=torch.bool)
+        missing[predicted_ids] = False
+        # Points with a prediction are their own nearest predicted point
+        index[predicted_ids] = torch.arange(predicted_ids.shape[0])
+        if missing.any():
+            tree = get_kdtree(self._pos[predicted_ids].numpy())
+            _, nearest = tree.query(self._pos[missing].numpy(), k=1)
+            index[missing] = torch.from_numpy(nearest[:, 0]).long()
+        log.info(
+            "Nearest prediction index built, %.2f%% of the points have a prediction",
+            100.0 * predicted_ids.shape[0] / max(1, num_points),
+        )
+        return index
+
+    def get(self, predicted_ids):
+        """ Returns for each point the row in ``predicted_ids`` of its nearest predicted point.
+        The index is rebuilt only if the set of predicted points changes.
+
+        Parameters
+        ----------
+        predicted_ids : torch.Tensor
+            Sorted indices of the points that have a prediction
+        """
+        predicted_ids = predicted_ids.cpu()
+        if self._predicted_ids is None or not torch.equal(self._predicted_ids, predicted_ids):
+            self._index = self._build(predicted_ids)
+            self._predicted_ids = predicted_ids
+        return self._index
+
+    def interpolate(self, predicted_ids, values):
+        """ Full resolution values, ``values`` being given for the points ``predicted_ids``
+        """
+        return values[self.get(predicted_ids).to(values.device)]
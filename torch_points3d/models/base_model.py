@@ -14,6 +14,8 @@ from torch_points3d.core.regularizer import *
 from torch_points3d.core.losses import instantiate_loss_or_miner
 from torch_points3d.utils.config import is_dict
 from torch_points3d.utils.colors import colored_print, COLORS
+from torch_points3d.utils.profiler import profile_stage
+from torch_points3d.utils.distributed import is_distributed, all_reduce_gradients
 from .model_interface import TrackerInterface, DatasetInterface, CheckpointInterface
 
 log = logging.getLogger(__name__)
@@ -165,15 +167,20 @@ class BaseModel(torch.nn.Module, TrackerInterface, DatasetInterface, CheckpointI
         self._num_batches += 1
         self._num_samples += batch_size
 
-        self.forward()  # first call forward to calculate intermediate results
+        with profile_stage("forward"):
+            self.forward()  # first call forward to calculate intermediate results
         make_optimizer_step = self._manage_optimizer_zero_grad()  # Accumulate gradient if option is up
-        self.backward()  # calculate gradients
+        with profile_stage("backward"):
+            self.backward()  # calculate gradients
 
-        if self._grad_clip > 0:
-            torch.nn.utils.clip_grad_value_(self.parameters(), self._grad_clip)
+        with profile_stage("optimizer_step"):
+            if make_optimizer_step and is_distributed():
+                all_reduce_gradients(self.parameters())  # average the gradients of all the processes
+            if self._grad_clip > 0:
+                torch.nn.utils.clip_grad_value_(self.parameters(), self._grad_clip)
 
-        if make_optimizer_step:
-            self._optimizer.step()  # update parameters
+            if make_optimizer_step:
+                self._optimizer.step()  # update parameters
 
         if self._lr_scheduler:
             lr_scheduler_step = self._collect_scheduler_step("_update_lr_scheduler_on")
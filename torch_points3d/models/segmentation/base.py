@@ -44,7 +44,7 @@ class Segmentation_MP(UnetBasedModel):
 
     def forward(self, *args, **kwargs) -> Any:
         """Run forward pass. This will be called by both functions <optimize_parameters> and <test>."""
-        data = self.model(self.input)
+        data = self.model(self.input, precomputed=getattr(self.input, "multiscale", None))
         x = F.relu(self.lin1(data.x))
         x = F.dropout(x, p=self.dropout, training=bool(self.training))
         x = self.lin2(x)
@@ -34,6 +34,8 @@ class SimpleBlock(BaseModule):
         bn=FastBatchNorm1d,
         deformable=False,
         add_one=False,
+        max_memory=None,
+        neighbour_backend="default",
         **kwargs,
     ):
         super(SimpleBlock, self).__init__()
@@ -42,13 +44,17 @@ class SimpleBlock(BaseModule):
         if deformable:
             density_parameter = self.DEFORMABLE_DENSITY
             self.kp_conv = KPConvDeformableLayer(
-                num_inputs, num_outputs, point_influence=prev_grid_size * sigma, add_one=add_one
+                num_inputs, num_outputs, point_influence=prev_grid_size * sigma, add_one=add_one, max_memory=max_memory
             )
         else:
             density_parameter = self.RIGID_DENSITY
-            self.kp_conv = KPConvLayer(num_inputs, num_outputs, point_influence=prev_grid_size * sigma, add_one=add_one)
+            self.kp_conv = KPConvLayer(
+                num_inputs, num_outputs, point_influence=prev_grid_size * sigma, add_one=add_one, max_memory=max_memory
+            )
         search_radius = density_parameter * sigma * prev_grid_size
-        self.neighbour_finder = RadiusNeighbourFinder(search_radius, max_num_neighbors, conv_type=self.CONV_TYPE)
+        self.neighbour_finder = RadiusNeighbourFinder(
+            search_radius, max_num_neighbors, conv_type=self.CONV_TYPE, backend=neighbour_backend
+        )
 
         if bn:
             self.bn = bn(num_outputs, momentum=bn_momentum)
@@ -112,6 +118,8 @@ class ResnetBBlock(BaseModule):
         grid_size : size of the grid,
         prev_grid_size : size of the grid at previous step.
                         In case of a strided block, this is different than grid_size
+        max_memory : memory budget in bytes of the KPConv intermediate tensors (see KPConvLayer)
+        neighbour_backend : backend of the radius search (see torch_points3d.core.spatial_ops.neighbour_backends)
     """
 
     CONV_TYPE = ConvolutionFormat.PARTIAL_DENSE.value
@@ -129,6 +137,8 @@ class ResnetBBlock(BaseModule):
         bn=FastBatchNorm1d,
         deformable=False,
         add_one=False,
+        max_memory=None,
+        neighbour_backend="default",
         **kwargs,
     ):
         super(ResnetBBlock, self).__init__()
@@ -158,6 +168,8 @@ class ResnetBBlock(BaseModule):
             bn=bn,
             deformable=deformable,
             add_one=add_one,
+            max_memory=max_memory,
+            neighbour_backend=neighbour_backend,
         )
 
         if self.has_bottleneck:
@@ -234,6 +246,8 @@ class KPDualBlock(BaseModule):
         max_num_neighbors: Max number of neighboors for the radius search,
         deformable: Is deformable,
         add_one: Add one as a feature,
+        max_memory: Memory budget in bytes of the KPConv intermediate tensors,
+        neighbour_backend: Backend of the radius search (e.g. hash_grid),
     """
 
     def __init__(
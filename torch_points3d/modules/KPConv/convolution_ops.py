@@ -2,7 +2,12 @@
 # Adaptation of https://github.com/HuguesTHOMAS/KPConv/
 # Adaption from https://github.com/humanpose1/KPConvTorch/
 
+import inspect
 import torch
+from torch.utils.checkpoint import checkpoint
+
+# Recent versions of pytorch ask for the checkpointing implementation explicitly
+_CHECKPOINT_KWARGS = {"use_reentrant": False} if "use_reentrant" in inspect.signature(checkpoint).parameters else {}
 
 
 def gather(x, idx, method=2):
@@ -14,7 +19,7 @@ def gather(x, idx, method=2):
     :param method: Choice of the method
     :return: x[idx] with shape [n_1, ..., n_m, D_1, ... D_d]
     """
-    idx[idx == -1] = x.shape[0] - 1  # Shadow point
+    idx = idx.masked_fill(idx == -1, x.shape[0] - 1)  # Shadow point
     if method == 0:
         return x[idx]
     elif method == 1:
@@ -50,6 +55,61 @@ def radius_gaussian(sq_r, sig, eps=1e-9):
     return torch.exp(-sq_r / (2 * sig ** 2 + eps))
 
 
+def add_shadow(support_points, features):
+    """ Adds the shadow point in the last row of the support points (far away from every query point)
+    and a zero feature for it. Neighbors equal to -1 point to it.
+    """
+    shadow_point = torch.ones_like(support_points[:1, :]) * 1e6
+    support_points = torch.cat([support_points, shadow_point], dim=0)
+    features = torch.cat([features, torch.zeros_like(features[:1, :])], dim=0)
+    return support_points, features
+
+
+def kpconv_chunk_size(
+    n_neighbors, n_kpoints, dim, in_fdim, out_fdim, max_memory, deformable=False, dtype=torch.float32
+):
+    """
+    Number of query points that can be convolved at once with intermediate tensors (neighbors, differences,
+    distances, kernel weights, gathered and weighted features) that fit in max_memory bytes.
+    :param max_memory: int - memory budget in bytes
+    :param deformable: bool - the deformable convolution has twice as many [n_neighbors, n_kpoints, dim] tensors
+    :return: int >= 1
+    """
+    element_size = torch.empty((), dtype=dtype).element_size()
+    n_diff = 2 if deformable else 1
+    per_point = (
+        n_neighbors * dim  # neighbors
+        + n_neighbors * n_kpoints * (n_diff * dim + 3)  # differences, square distances and weights
+        + n_neighbors * in_fdim  # neighborhood features
+        + n_kpoints * (in_fdim + out_fdim)  # weighted features and kernel outputs
+    )
+    return max(1, int(max_memory // (per_point * element_size)))
+
+
+def KPConv_chunked(conv, per_query, shared, chunk_size):
+    """
+    Runs conv on chunks of chunk_size query points and concatenates the outputs. When gradients are required
+    each chunk is checkpointed: its intermediate tensors are freed after the forward pass and recomputed during
+    the backward pass, peak memory is then bounded by the size of one chunk.
+    :param conv: function(*per_query_chunks, *shared) returning a tensor or a tuple of tensors of n_points rows
+    :param per_query: list of tensors with one row per query point, they are split in chunks
+    :param shared: list of tensors used as is by every chunk
+    :param chunk_size: int - number of query points per chunk
+    :return: tuple of tensors
+    """
+    n_points = per_query[0].shape[0]
+    recompute = torch.is_grad_enabled() and any(t.requires_grad for t in per_query + shared)
+    outputs = []
+    for start in range(0, max(n_points, 1), chunk_size):
+        chunks = [t[start : start + chunk_size] for t in per_query]
+        if recompute:
+            output = checkpoint(conv, *chunks, *shared, **_CHECKPOINT_KWARGS)
+        else:
+            output = conv(*chunks, *shared)
+        outputs.append(output if isinstance(output, tuple) else (output,))
+    return tuple(torch.cat(out, dim=0) for out in zip(*outputs))
+
+
 def KPConv_ops(
     query_points,
     support_points,
@@ -60,6 +120,7 @@ def KPConv_ops(
     KP_extent,
     KP_influence,
     aggregation_mode,
+    max_memory=None,
 ):
     """
     This function creates a graph of operations to define Kernel Point Convolution in tensorflow. See KPConv function
@@ -73,18 +134,64 @@ def KPConv_ops(
     :param KP_extent: float32 - influence radius of each kernel point
     :param KP_influence: string in ('constant', 'linear', 'gaussian') - influence function of the kernel points
     :param aggregation_mode: string in ('closest', 'sum') - whether to sum influences, or only keep the closest
+    :param max_memory: int or None - if set, query points are processed in chunks whose intermediate tensors
+                       fit in max_memory bytes, see KPConv_chunked
     :return:                    [n_points, out_fdim]
     """
-
-    # Get variables
-    int(K_points.shape[0])
-
-    # Add a fake point in the last row for shadow neighbors
-    shadow_point = torch.ones_like(support_points[:1, :]) * 1e6
-    support_points = torch.cat([support_points, shadow_point], dim=0)
+    support_points, features = add_shadow(support_points, features)
+
+    # The backward of gather method 2 allocates a [n0_points, n_neighbors, in_fdim] gradient whatever the number
+    # of query points, chunks use plain indexing which accumulates in [n0_points, in_fdim]
+    gather_method = 2 if max_memory is None else 0
+
+    def conv(query_points, neighbors_indices, support_points, features, K_points, K_values):
+        return _KPConv_ops(
+            query_points,
+            support_points,
+            neighbors_indices,
+            features,
+            K_points,
+            K_values,
+            KP_extent,
+            KP_influence,
+            aggregation_mode,
+            gather_method=gather_method,
+        )
+
+    if max_memory is None:
+        return conv(query_points, neighbors_indices, support_points, features, K_points, K_values)
+
+    chunk_size = kpconv_chunk_size(
+        neighbors_indices.shape[1],
+        K_points.shape[0],
+        query_points.shape[1],
+        K_values.shape[1],
+        K_values.shape[2],
+        max_memory,
+        dtype=features.dtype,
+    )
+    return KPConv_chunked(
+        conv, [query_points, neighbors_indices], [support_points, features, K_points, K_values], chunk_size
+    )[0]
+
+
+def _KPConv_ops(
+    query_points,
+    support_points,
+    neighbors_indices,
+    features,
+    K_points,
+    K_values,
+    KP_extent,
+    KP_influence,
+    aggregation_mode,
+    gather_method=2,
+):
+    """ KPConv_ops on support points and features that already contain the shadow point (see add_shadow)
+    """
 
     # Get neighbor points [n_points, n_neighbors, dim]
-    neighbors = gather(support_points, neighbors_indices)
+    neighbors = gather(support_points, neighbors_indices, method=gather_method)
 
     # Center every neighborhood
     neighbors = neighbors - query_points.unsqueeze(1)
@@ -123,10 +230,8 @@ def KPConv_ops(
     elif aggregation_mode != "sum":
         raise ValueError("Unknown convolution mode. Should be 'closest' or 'sum'")
 
-    features = torch.cat([features, torch.zeros_like(features[:1, :])], dim=0)
-
     # Get the features of each neighborhood [n_points, n_neighbors, in_fdim]
-    neighborhood_features = gather(features, neighbors_indices)
+    neighborhood_features = gather(features, neighbors_indices, method=gather_method)
 
     # Apply distance weights [n_points, n_kpoints, in_fdim]
     weighted_features = torch.matmul(all_weights, neighborhood_features)
@@ -153,6 +258,7 @@ def KPConv_deform_ops(
     KP_extent,
     KP_influence,
     aggregation_mode,
+    max_memory=None,
 ):
     """
     This function creates a graph of operations to define Deformable Kernel Point Convolution in tensorflow. See
@@ -168,17 +274,72 @@ def KPConv_deform_ops(
     :param KP_extent:           float32
     :param KP_influence:        string
     :param aggregation_mode:    string in ('closest', 'sum') - whether to sum influences, or only keep the closest
+    :param max_memory:          int or None - if set, query points are processed in chunks whose intermediate
+                                tensors fit in max_memory bytes, see KPConv_chunked
 
     :return features, square_distances, deformed_K_points
     """
+    shadow_ind = support_points.shape[0]
+    support_points, features = add_shadow(support_points, features)
+
+    def conv(query_points, neighbors_indices, offsets, *tensors):
+        modulations = tensors[0] if len(tensors) == 5 else None
+        support_points, features, K_points, K_values = tensors[-4:]
+        return _KPConv_deform_ops(
+            query_points,
+            support_points,
+            neighbors_indices,
+            features,
+            K_points,
+            offsets,
+            modulations,
+            K_values,
+            KP_extent,
+            KP_influence,
+            aggregation_mode,
+            shadow_ind,
+        )
+
+    per_query = [query_points, neighbors_indices, offsets]
+    if modulations is not None:
+        per_query.append(modulations)
+    shared = [support_points, features, K_points, K_values]
+    if max_memory is None:
+        return conv(*per_query, *shared)
+
+    chunk_size = kpconv_chunk_size(
+        neighbors_indices.shape[1],
+        K_points.shape[0],
+        query_points.shape[1],
+        K_values.shape[1],
+        K_values.shape[2],
+        max_memory,
+        deformable=True,
+        dtype=features.dtype,
+    )
+    return KPConv_chunked(conv, per_query, shared, chunk_size)
+
+
+def _KPConv_deform_ops(
+    query_points,
+    support_points,
+    neighbors_indices,
+    features,
+    K_points,
+    offsets,
+    modulations,
+    K_values,
+    KP_extent,
+    KP_influence,
+    aggregation_mode,
+    shadow_ind,
+):
+    """ KPConv_deform_ops on support points and features that already contain the shadow point (see add_shadow),
+    shadow_ind is the index of the shadow point
+    """
 
     # Get variables
     n_kp = int(K_points.shape[0])
-    shadow_ind = support_points.shape[0]
-
-    # Add a fake point in the last row for shadow neighbors
-    shadow_point = torch.ones_like(support_points[:1, :]) * 1e6
-    support_points = torch.cat([support_points, shadow_point], axis=0)
 
     # Get neighbor points [n_points, n_neighbors, dim]
     neighbors = support_points[neighbors_indices]
@@ -245,8 +406,6 @@ def KPConv_deform_ops(
     elif aggregation_mode != "sum":
         raise ValueError("Unknown convolution mode. Should be 'closest' or 'sum'")
 
-    features = torch.cat([features, torch.zeros_like(features[:1, :])], axis=0)
-
     # Get the features of each neighborhood [n_points, new_max_neighb, in_fdim]
     neighborhood_features = features[new_neighbors_indices]
 
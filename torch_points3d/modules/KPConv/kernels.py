@@ -30,6 +30,8 @@ class KPConvLayer(torch.nn.Module):
     KP_influence="linear"
     aggregation_mode="sum"
     dimension=3
+    max_memory=None : if set, query points are processed in chunks whose intermediate tensors fit in max_memory bytes.
+                      Intermediate tensors are recomputed during the backward pass instead of being stored
     """
 
     _INFLUENCE_TO_RADIUS = 1.5
@@ -45,6 +47,7 @@ class KPConvLayer(torch.nn.Module):
         aggregation_mode="sum",
         dimension=3,
         add_one=False,
+        max_memory=None,
     ):
         super(KPConvLayer, self).__init__()
         self.kernel_radius = self._INFLUENCE_TO_RADIUS * point_influence
@@ -56,6 +59,7 @@ class KPConvLayer(torch.nn.Module):
         self.KP_influence = KP_influence
         self.n_kernel_points = n_kernel_points
         self.aggregation_mode = aggregation_mode
+        self.max_memory = max_memory
 
         # Initial kernel extent for this layer
         K_points_numpy = load_kernels(
@@ -89,6 +93,7 @@ class KPConvLayer(torch.nn.Module):
             self.point_influence,
             self.KP_influence,
             self.aggregation_mode,
+            max_memory=self.max_memory,
         )
         return new_feat
 
@@ -117,6 +122,8 @@ class KPConvDeformableLayer(BaseInternalLossModule):
     aggregation_mode="sum"
     dimension=3
     modulated = False :   If deformable conv should be modulated
+    max_memory=None : if set, query points are processed in chunks whose intermediate tensors fit in max_memory bytes.
+                      Intermediate tensors are recomputed during the backward pass instead of being stored
     """
 
     PERMISSIVE_LOSS_KEY = "permissive_loss"
@@ -138,6 +145,7 @@ class KPConvDeformableLayer(BaseInternalLossModule):
         modulated=False,
         loss_mode="fitting",
         add_one=False,
+        max_memory=None,
     ):
         super(KPConvDeformableLayer, self).__init__()
         self.kernel_radius = self._INFLUENCE_TO_RADIUS * point_influence
@@ -152,6 +160,7 @@ class KPConvDeformableLayer(BaseInternalLossModule):
         self.modulated = modulated
         self.internal_losses = {self.PERMISSIVE_LOSS_KEY: 0.0, self.FITTING_LOSS_KEY: 0.0, self.REPULSION_LOSS_KEY: 0.0}
         self.loss_mode = loss_mode
+        self.max_memory = max_memory
 
         # Initial kernel extent for this layer
         K_points_numpy = load_kernels(
@@ -197,6 +206,7 @@ class KPConvDeformableLayer(BaseInternalLossModule):
                 self.point_influence,
                 self.KP_influence,
                 self.aggregation_mode,
+                max_memory=self.max_memory,
             )
             + self.offset_bias
         )
@@ -228,6 +238,7 @@ class KPConvDeformableLayer(BaseInternalLossModule):
             self.point_influence,
             self.KP_influence,
             self.aggregation_mode,
+            max_memory=self.max_memory,
         )
 
         if self.loss_mode == "fitting":
@@ -94,9 +94,17 @@ class DilatedResidualBlock(BaseResnetBlock):
             ratio2, 16, point_pos_nn=point_pos_nn2, attention_nn=attention_nn2, down_conv_nn=global_nn2, *args, **kwargs
         )
 
-    def convs(self, data):
-        data = self.conv1(data)
-        data = self.conv2(data)
+    @property
+    def sampler(self):
+        return [self.conv1.sampler, self.conv2.sampler]
+
+    @property
+    def neighbour_finder(self):
+        return [self.conv1.neighbour_finder, self.conv2.neighbour_finder]
+
+    def convs(self, data, **kwargs):
+        data = self.conv1(data, **kwargs)
+        data = self.conv2(data, **kwargs)
         return data
 
 
@@ -119,5 +127,13 @@ class RandLANetRes(torch.nn.Module):
             **kwargs
         )
 
-    def forward(self, data):
-        return self._conv.forward(data)
+    @property
+    def sampler(self):
+        return self._conv.sampler
+
+    @property
+    def neighbour_finder(self):
+        return self._conv.neighbour_finder
+
+    def forward(self, data, **kwargs):
+        return self._conv.forward(data, **kwargs)
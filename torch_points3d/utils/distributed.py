@@ -0,0 +1,259 @@
+import os
+import sys
+import time
+import pickle
+import socket
+import argparse
+import logging
+import subprocess
+import numpy as np
+import torch
+import torch.distributed as dist
+from torch._utils import _flatten_dense_tensors, _unflatten_dense_tensors
+
+log = logging.getLogger(__name__)
+
+# Gradients are all reduced in buckets of about 25MB, as in DistributedDataParallel
+BUCKET_BYTES = 25 * 1024 * 1024
+
+
+def init_distributed(backend=None, init_method="env://"):
+    """ Initialises the default process group when the process was started by a launcher (see :func:`launch`,
+    or ``torch.distributed.launch --use_env``) that sets the ``WORLD_SIZE``, ``RANK``, ``MASTER_ADDR`` and
+    ``MASTER_PORT`` environment variables.
+
+    Parameters
+    ----------
+    backend : str, optional
+        ``gloo`` (CPU) or ``nccl`` (GPU), picked from the availability of CUDA if not given
+    init_method : str, optional
+        URL used to find the other processes
+
+    Returns
+    -------
+    bool
+        True if the process is one of several training processes
+    """
+    if int(os.environ.get("WORLD_SIZE", 1)) <= 1 or not dist.is_available():
+        return False
+    if not dist.is_initialized():
+        if not backend:
+            backend = "nccl" if torch.cuda.is_available() else "gloo"
+        dist.init_process_group(backend, init_method=init_method)
+        log.info("Process %i of %i started with the %s backend", get_rank(), get_world_size(), backend)
+    return True
+
+
+def is_distributed():
+    return dist.is_available() and dist.is_initialized() and dist.get_world_size() > 1
+
+
+def get_rank():
+    return dist.get_rank() if is_distributed() else 0
+
+
+def get_world_size():
+    return dist.get_world_size() if is_distributed() else 1
+
+
+def get_local_rank():
+    """ Rank of the process on its node, used to pick its GPU
+    """
+    return int(os.environ.get("LOCAL_RANK", 0))
+
+
+def is_main_process():
+    return get_rank() == 0
+
+
+def _comm_device():
+    # nccl only communicates tensors that are on the GPU
+    if dist.get_backend() == "nccl":
+        return torch.device("cuda", torch.cuda.current_device())
+    return torch.device("cpu")
+
+
+def all_reduce_sum(tensor):
+    """ Sum of a tensor over all processes, the tensor is returned as it is when not distributed
+    """
+    if not is_distributed():
+        return tensor
+    reduced = tensor.to(_comm_device()).clone()
+    dist.all_reduce(reduced, op=dist.ReduceOp.SUM)
+    return reduced.to(tensor.device)
+
+
+def all_gather_object(obj):
+    """ Gathers a picklable object from all processes
+
+    Returns
+    -------
+    list
+        Objects of the processes, ordered by rank
+    """
+    if not is_distributed():
+        return [obj]
+    device = _comm_device()
+    data = torch.from_numpy(np.frombuffer(pickle.dumps(obj), dtype=np.uint8).copy()).to(device)
+    size = torch.tensor([data.numel()], dtype=torch.long, device=device)
+    sizes = [torch.zeros_like(size) for _ in range(get_world_size())]
+    dist.all_gather(sizes, size)
+    sizes = [int(s.item()) for s in sizes]
+    max_size = max(sizes)
+    padded = torch.zeros(max_size, dtype=torch.uint8, device=device)
+    padded[: data.numel()] = data
+    gathered = [torch.zeros_like(padded) for _ in sizes]
+    dist.all_gather(gathered, padded)
+    return [pickle.loads(g[:s].cpu().numpy().tobytes()) for g, s in zip(gathered, sizes)]
+
+
+def broadcast_module(module, buffers_only=False, src=0):
+    """ Copies the parameters and buffers of a module from the process ``src`` to the other processes
+    """
+    if not is_distributed():
+        return
+    tensors = list(module.buffers())
+    if not buffers_only:
+        tensors = list(module.parameters()) + tensors
+    with torch.no_grad():
+        for tensor in tensors:
+            data = tensor.data.to(_comm_device())
+            dist.broadcast(data, src)
+            tensor.data.copy_(data)
+
+
+def _buckets(tensors, bucket_bytes):
+    buckets = {}
+    for tensor in tensors:
+        key = (tensor.dtype, tensor.device)
+        if key not in buckets or buckets[key][1] >= bucket_bytes:
+            if key in buckets:
+                yield buckets[key][0]
+            buckets[key] = ([], 0)
+        bucket, size = buckets[key]
+        bucket.append(tensor)
+        buckets[key] = (bucket, size + tensor.numel() * tensor.element_size())
+    for bucket, _ in buckets.values():
+        yield bucket
+
+
+def all_reduce_gradients(parameters, bucket_bytes=BUCKET_BYTES):
+    """ Averages the gradients over all processes, the equivalent of the gradient synchronisation of
+    ``DistributedDataParallel`` for models that are not called through ``forward``. A parameter that did not
+    get a gradient in some processes gets a zero gradient there, it keeps no gradient if it got none anywhere.
+    """
+    if not is_distributed():
+        return
+    parameters = [p for p in parameters if p.requires_grad]
+    has_grad = torch.tensor([float(p.grad is not None) for p in parameters])
+    has_grad = all_reduce_sum(has_grad) > 0
+    grads = []
+    for p, used in zip(parameters, has_grad.tolist()):
+        if not used:
+            continue
+        if p.grad is None:
+            p.grad = torch.zeros_like(p)
+        grads.append(p.grad.data)
+
+    world_size = get_world_size()
+    for bucket in _buckets(grads, bucket_bytes):
+        flat = _flatten_dense_tensors(bucket)
+        flat = all_reduce_sum(flat) / world_size
+        for grad, reduced in zip(bucket, _unflatten_dense_tensors(flat, bucket)):
+            grad.copy_(reduced)
+
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("", 0))
+        return s.getsockname()[1]
+
+
+def launch(command, nproc_per_node, nnodes=1, node_rank=0, master_addr="127.0.0.1", master_port=None):
+    """ Starts ``nproc_per_node`` copies of a command on this node with the environment read by
+    :func:`init_distributed`, then waits for them. All the processes are stopped as soon as one fails.
+
+    Parameters
+    ----------
+    command : list
+        Command of a training process, ``[sys.executable, "train.py", ...]`` for example
+    nproc_per_node : int
+        Number of processes on this node, usually the number of GPUs
+    nnodes : int, optional
+        Number of nodes
+    node_rank : int, optional
+        Rank of this node
+    master_addr, master_port : optional
+        Address of the node of rank 0, a free port is picked on a single node
+
+    Returns
+    -------
+    int
+        Exit code, 0 if all the processes succeeded
+    """
+    if master_port is None:
+        if nnodes > 1:
+            raise ValueError("The port of the master node must be given when training on several nodes")
+        master_port = _free_port()
+    world_size = nproc_per_node * nnodes
+    processes = []
+    for local_rank in range(nproc_per_node):
+        env = dict(os.environ)
+        env.update(
+            {
+                "MASTER_ADDR": master_addr,
+                "MASTER_PORT": str(master_port),
+                "WORLD_SIZE": str(world_size),
+                "RANK": str(node_rank * nproc_per_node + local_rank),
+                "LOCAL_RANK": str(local_rank),
+            }
+        )
+        processes.append(subprocess.Popen(command, env=env))
+
+    return_code = 0
+    try:
+        while processes:
+            for process in list(processes):
+                code = process.poll()
+                if code is None:
+                    continue
+                processes.remove(process)
+                if code != 0:
+                    log.error("Process %i exited with code %i, stopping the others", process.pid, code)
+                    return_code = code
+                    for other in processes:
+                        other.terminate()
+            time.sleep(0.1)
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        raise
+    return return_code
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Starts the processes of a distributed training, for example "
+        "python -m torch_points3d.utils.distributed --nproc_per_node 2 train.py task=segmentation ..."
+    )
+    parser.add_argument("--nproc_per_node", type=int, default=1, help="Number of processes on this node")
+    parser.add_argument("--nnodes", type=int, default=1, help="Number of nodes")
+    parser.add_argument("--node_rank", type=int, default=0, help="Rank of this node")
+    parser.add_argument("--master_addr", default="127.0.0.1", help="Address of the node of rank 0")
+    parser.add_argument("--master_port", type=int, default=None, help="Port of the node of rank 0")
+    parser.add_argument("script", help="Training script, train.py")
+    parser.add_argument("script_args", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+    return launch(
+        [sys.executable, "-u", args.script] + args.script_args,
+        args.nproc_per_node,
+        nnodes=args.nnodes,
+        node_rank=args.node_rank,
+        master_addr=args.master_addr,
+        master_port=args.master_port,
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
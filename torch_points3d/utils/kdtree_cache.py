@@ -0,0 +1,98 @@
+import os
+import hashlib
+import logging
+from collections import OrderedDict
+import numpy as np
+import joblib
+from sklearn.neighbors import KDTree
+
+log = logging.getLogger(__name__)
+
+DEFAULT_LEAF_SIZE = 50
+MAX_TREES_IN_MEMORY = 8
+
+_TREES: "OrderedDict[str, KDTree]" = OrderedDict()
+
+
+def kdtree_key(pos, leaf_size=DEFAULT_LEAF_SIZE):
+    """ Content hash identifying the KDTree built on ``pos`` with a given leaf size
+
+    Parameters
+    ----------
+    pos : torch.Tensor or np.array
+        [N, 3] positions the tree is built on
+    leaf_size : int
+        Leaf size of the tree
+    """
+    pos = np.ascontiguousarray(np.asarray(pos))
+    hasher = hashlib.sha1()
+    hasher.update(str((pos.shape, pos.dtype.str, int(leaf_size))).encode())
+    hasher.update(memoryview(pos).cast("B"))
+    return hasher.hexdigest()
+
+
+def kdtree_path(cache_dir, key):
+    return os.path.join(cache_dir, "kdtree_{}.joblib".format(key))
+
+
+def _remember(key, tree):
+    _TREES[key] = tree
+    _TREES.move_to_end(key)
+    while len(_TREES) > MAX_TREES_IN_MEMORY:
+        _TREES.popitem(last=False)
+    return tree
+
+
+def _load(path):
+    # Copy on write memory mapping: the arrays of the tree live in the page cache and are shared by
+    # every process that maps the same file (e.g. DataLoader workers), queries never write to them.
+    return joblib.load(path, mmap_mode="c")
+
+
+def _dump(tree, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    joblib.dump(tree, tmp_path)
+    os.replace(tmp_path, path)  # Atomic, concurrent writers of the same key are harmless
+
+
+def get_kdtree(pos, leaf_size=DEFAULT_LEAF_SIZE, cache_dir=None):
+    """ Returns a KDTree built on ``pos``. Trees are cached in memory for the current process
+    and, if ``cache_dir`` is provided, serialised on disk and loaded back as memory mapped arrays.
+    The cache is keyed on the content of ``pos`` and the leaf size so it never returns a stale tree.
+
+    Parameters
+    ----------
+    pos : torch.Tensor or np.array
+        [N, 3] positions
+    leaf_size : int
+        Leaf size of the tree
+    cache_dir : str, optional
+        Directory where the trees are saved
+    """
+    pos = np.asarray(pos)
+    key = kdtree_key(pos, leaf_size)
+    if key in _TREES:
+        _TREES.move_to_end(key)
+        return _TREES[key]
+
+    if cache_dir is None:
+        return _remember(key, KDTree(pos, leaf_size=leaf_size))
+
+    path = kdtree_path(cache_dir, key)
+    if not os.path.exists(path):
+        log.debug("Building KDTree %s for %i points", key, pos.shape[0])
+        _dump(KDTree(pos, leaf_size=leaf_size), path)
+    try:
+        tree = _load(path)
+    except Exception as e:
+        log.warning("Could not load cached KDTree %s (%s), rebuilding it", path, e)
+        tree = KDTree(pos, leaf_size=leaf_size)
+        _dump(tree, path)
+    return _remember(key, tree)
+
+
+def clear_kdtree_cache():
+    """ Drops the trees held in memory by the current process, files on disk are kept
+    """
+    _TREES.clear()
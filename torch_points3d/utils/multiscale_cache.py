@@ -0,0 +1,109 @@
+import os
+import hashlib
+import logging
+from collections import OrderedDict
+import numpy as np
+import torch
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MAX_ITEMS = 256
+
+
+def strategies_hash(strategies):
+    """ Hash identifying a set of spatial operations as returned by ``BaseModel.get_spatial_ops``.
+    Two sets of operations of the same classes with the same parameters share the same hash.
+    """
+
+    def describe(op):
+        if op is None:
+            return "None"
+        params = sorted((k, repr(v)) for k, v in vars(op).items())
+        return "{}.{}{}".format(op.__class__.__module__, op.__class__.__name__, params)
+
+    hasher = hashlib.sha1()
+    for name in sorted(strategies.keys()):
+        hasher.update(name.encode())
+        for op in strategies[name]:
+            hasher.update(describe(op).encode())
+    return hasher.hexdigest()
+
+
+def sample_key(pos):
+    """ Content hash of the positions of a sample, the multiscale indices only depend on them
+    """
+    pos = np.ascontiguousarray(pos.detach().cpu().numpy() if torch.is_tensor(pos) else np.asarray(pos))
+    hasher = hashlib.sha1()
+    hasher.update(str((pos.shape, pos.dtype.str)).encode())
+    hasher.update(memoryview(pos).cast("B"))
+    return hasher.hexdigest()
+
+
+class MultiScaleCache:
+    """ Two tier cache of precomputed multiscale indices: a LRU in memory and optionally
+    one torch file per sample on disk. The memory tier is local to the process (each data loader
+    worker has its own), the disk tier is shared between processes and runs.
+
+    Parameters
+    ----------
+    cache_dir : str, optional
+        Directory where the entries are saved, nothing is written on disk if None
+    max_items : int, optional
+        Maximum number of entries kept in memory
+    """
+
+    def __init__(self, cache_dir=None, max_items=DEFAULT_MAX_ITEMS):
+        self.cache_dir = cache_dir
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, "{}.pt".format(key))
+
+    def _remember(self, key, value):
+        if self.max_items <= 0:
+            return
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+
+    def get(self, key):
+        if key in self._items:
+            self._items.move_to_end(key)
+            self.hits += 1
+            return self._items[key]
+        if self.cache_dir is not None and os.path.exists(self._path(key)):
+            try:
+                value = torch.load(self._path(key))
+            except Exception as e:
+                log.warning("Could not load cached multiscale data %s (%s)", self._path(key), e)
+            else:
+                self._remember(key, value)
+                self.hits += 1
+                return value
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self._remember(key, value)
+        if self.cache_dir is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        torch.save(value, tmp_path)
+        os.replace(tmp_path, path)
+
+    def clear(self):
+        """ Drops the entries held in memory, files on disk are kept
+        """
+        self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __repr__(self):
+        return "{}(cache_dir={}, max_items={})".format(self.__class__.__name__, self.cache_dir, self.max_items)
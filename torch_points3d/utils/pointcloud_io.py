@@ -0,0 +1,438 @@
+import sys
+import logging
+import numpy as np
+from numba import njit
+
+log = logging.getLogger(__name__)
+
+PLY_DTYPES = {
+    "int8": "i1",
+    "char": "i1",
+    "uint8": "u1",
+    "uchar": "u1",
+    "int16": "i2",
+    "short": "i2",
+    "uint16": "u2",
+    "ushort": "u2",
+    "int32": "i4",
+    "int": "i4",
+    "uint32": "u4",
+    "uint": "u4",
+    "float32": "f4",
+    "float": "f4",
+    "float64": "f8",
+    "double": "f8",
+}
+
+PLY_TYPE_NAMES = {"i1": "char", "u1": "uchar", "i2": "short", "u2": "ushort", "i4": "int", "u4": "uint"}
+PLY_TYPE_NAMES.update({"f4": "float", "f8": "double"})
+
+PLY_FORMATS = {"ascii": "", "binary_big_endian": ">", "binary_little_endian": "<"}
+
+_POW10 = 10.0 ** np.arange(23)
+
+###################################### ASCII ######################################
+
+
+@njit
+def _is_separator(c):
+    return c == 32 or c == 9 or c == 13 or c == 44  # space, tab, \r and comma
+
+
+@njit
+def _count_tokens(buf):
+    """ Counts the numbers in buf and checks that all non empty lines have the same number of columns
+    """
+    num_tokens = 0
+    num_cols = -1
+    current = 0
+    in_separator = True
+    consistent = True
+    for i in range(buf.shape[0]):
+        c = buf[i]
+        if c == 10:
+            if not in_separator:
+                current += 1
+            if current > 0:
+                if num_cols == -1:
+                    num_cols = current
+                elif current != num_cols:
+                    consistent = False
+            num_tokens += current
+            current = 0
+            in_separator = True
+        elif _is_separator(c):
+            if not in_separator:
+                current += 1
+            in_separator = True
+        else:
+            in_separator = False
+    if not in_separator:
+        current += 1
+    if current > 0:
+        if num_cols == -1:
+            num_cols = current
+        elif current != num_cols:
+            consistent = False
+    num_tokens += current
+    return num_tokens, num_cols, consistent
+
+
+@njit
+def _parse_floats(buf, out, pow10):
+    """ Parses the decimal numbers of buf in out. Mantissas are accumulated as integers and scaled by
+    an exact power of ten, the result is therefore correctly rounded (same as strtod).
+    Returns the number of values parsed or -1 if something can't be parsed exactly (more than
+    15 significant digits, large exponents, nan, inf, ...).
+    """
+    n = buf.shape[0]
+    i = 0
+    k = 0
+    while i < n:
+        c = buf[i]
+        if c == 10 or _is_separator(c):
+            i += 1
+            continue
+        negative = False
+        if c == 45 or c == 43:
+            negative = c == 45
+            i += 1
+        mantissa = 0
+        num_digits = 0
+        num_decimals = 0
+        seen_dot = False
+        seen_digit = False
+        while i < n:
+            c = buf[i]
+            if c >= 48 and c <= 57:
+                seen_digit = True
+                if mantissa != 0 or c != 48:
+                    mantissa = mantissa * 10 + (c - 48)
+                    num_digits += 1
+                if seen_dot:
+                    num_decimals += 1
+            elif c == 46 and not seen_dot:
+                seen_dot = True
+            else:
+                break
+            i += 1
+        exponent = 0
+        if i < n and (buf[i] == 101 or buf[i] == 69):
+            i += 1
+            negative_exponent = False
+            if i < n and (buf[i] == 45 or buf[i] == 43):
+                negative_exponent = buf[i] == 45
+                i += 1
+            exponent_digits = 0
+            while i < n and buf[i] >= 48 and buf[i] <= 57:
+                exponent = exponent * 10 + (buf[i] - 48)
+                exponent_digits += 1
+                i += 1
+            if exponent_digits == 0:
+                return -1
+            if negative_exponent:
+                exponent = -exponent
+        if not seen_digit or num_digits > 15:
+            return -1
+        if i < n and not (buf[i] == 10 or _is_separator(buf[i])):
+            return -1
+        exponent -= num_decimals
+        if exponent < -22 or exponent > 22:
+            return -1
+        if exponent < 0:
+            value = mantissa / pow10[-exponent]
+        else:
+            value = mantissa * pow10[exponent]
+        out[k] = -value if negative else value
+        k += 1
+    return k
+
+
+def parse_txt(buf):
+    """ Parses a buffer containing a table of decimal numbers separated by spaces, tabs or commas.
+
+    Parameters
+    ----------
+    buf : bytes or np.ndarray
+        Content of the text file
+
+    Returns
+    -------
+    np.ndarray or None
+        [num_rows, num_cols] float64 array or None if the buffer does not contain a table of numbers
+    """
+    buf = np.frombuffer(buf, dtype=np.uint8) if isinstance(buf, (bytes, bytearray, memoryview)) else buf
+    if buf.shape[0] == 0:
+        return np.zeros((0, 0))
+    num_tokens, num_cols, consistent = _count_tokens(buf)
+    if not consistent or num_cols <= 0:
+        return None
+    out = np.empty(num_tokens, dtype=np.float64)
+    if _parse_floats(buf, out, _POW10) != num_tokens:
+        # Numbers the fast parser can't round exactly (long mantissas, nan, ...), let python parse them
+        try:
+            out = np.array(buf.tobytes().replace(b",", b" ").split(), dtype=np.float64)
+        except ValueError:
+            return None
+    return out.reshape(-1, num_cols)
+
+
+def read_txt(path, sep=" "):
+    """ Reads a text file containing a table of numbers, equivalent to
+    ``pd.read_csv(path, sep=sep, header=None).values`` for numerical files.
+    Files that the fast parser does not support (corrupted lines, text, ...) go through pandas.
+    """
+    with open(path, "rb") as f:
+        values = parse_txt(f.read())
+    if values is None:
+        import pandas as pd
+
+        log.debug("Falling back to pandas for %s", path)
+        values = pd.read_csv(path, sep=sep, header=None).values
+    return values
+
+
+###################################### PLY ######################################
+
+
+def parse_ply_header(f):
+    """ Parses the header of a ply file
+
+    Returns
+    -------
+    (str, list, int)
+        format, list of elements as (name, count, properties) and size of the header in bytes.
+        Properties are (name, dtype) tuples or (name, count dtype, item dtype) for lists
+    """
+    if not f.readline().startswith(b"ply"):
+        raise ValueError("The file does not start with the word ply")
+    fmt = None
+    elements = []
+    while True:
+        line = f.readline()
+        if line == b"":
+            raise ValueError("Unexpected end of file in ply header")
+        words = line.decode("ascii", errors="replace").split()
+        if not words or words[0] in ["comment", "obj_info"]:
+            continue
+        if words[0] == "end_header":
+            break
+        if words[0] == "format":
+            fmt = words[1]
+            if fmt not in PLY_FORMATS:
+                raise ValueError("Unsupported ply format %s" % fmt)
+        elif words[0] == "element":
+            elements.append((words[1], int(words[2]), []))
+        elif words[0] == "property":
+            if words[1] == "list":
+                elements[-1][2].append((words[4], PLY_DTYPES[words[2]], PLY_DTYPES[words[3]]))
+            else:
+                elements[-1][2].append((words[2], PLY_DTYPES[words[1]]))
+    return fmt, elements, f.tell()
+
+
+def _element_dtype(properties, ext, list_sizes=None):
+    dtype = []
+    for prop in properties:
+        if len(prop) == 2:
+            dtype.append((prop[0], ext + prop[1]))
+        else:
+            if list_sizes is None or prop[0] not in list_sizes:
+                return None
+            dtype.append((prop[0] + "_count", ext + prop[1]))
+            dtype.append((prop[0], ext + prop[2], (list_sizes[prop[0]],)))
+    return np.dtype(dtype)
+
+
+def _read_binary_element(path, offset, count, properties, ext, mmap):
+    """ Reads a binary element, returns the structured array and the offset of the next element
+    """
+    dtype = _element_dtype(properties, ext)
+    if dtype is None:
+        # List properties: only lists of constant length are supported (e.g. triangular faces)
+        with open(path, "rb") as f:
+            f.seek(offset)
+            list_sizes = {}
+            for prop in properties:
+                if len(prop) == 2:
+                    f.seek(np.dtype(prop[1]).itemsize, 1)
+                else:
+                    size = int(np.frombuffer(f.read(np.dtype(prop[1]).itemsize), dtype=ext + prop[1])[0])
+                    list_sizes[prop[0]] = size
+                    f.seek(size * np.dtype(prop[2]).itemsize, 1)
+        dtype = _element_dtype(properties, ext, list_sizes)
+    if count == 0:
+        return np.zeros(0, dtype=dtype), offset
+    if mmap:
+        array = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(count,))
+    else:
+        array = np.fromfile(path, dtype=dtype, count=count, offset=offset)
+    for name in dtype.names:
+        if name.endswith("_count") and name[: -len("_count")] in dtype.names:
+            if np.any(array[name] != dtype[name[: -len("_count")]].shape[0]):
+                raise ValueError("Lists of variable length are not supported (%s)" % name)
+    return array, offset + count * dtype.itemsize
+
+
+def _read_ascii_elements(content, elements):
+    lines = np.append(np.flatnonzero(np.frombuffer(content, dtype=np.uint8) == 10), len(content))
+    out = {}
+    start = 0
+    line_idx = 0
+    for name, count, properties in elements:
+        end = int(lines[line_idx + count - 1]) + 1 if count > 0 else start
+        values = parse_txt(content[start:end])
+        if values is None:
+            raise ValueError("Could not parse element %s" % name)
+        list_sizes = None
+        if any([len(p) == 3 for p in properties]):
+            # Constant length lists only, the size is read from the first row
+            list_sizes = {}
+            col = 0
+            for prop in properties:
+                if len(prop) == 2:
+                    col += 1
+                else:
+                    list_sizes[prop[0]] = int(values[0, col])
+                    col += 1 + list_sizes[prop[0]]
+        dtype = _element_dtype(properties, "", list_sizes)
+        array = np.zeros(count, dtype=dtype)
+        col = 0
+        for field in dtype.names:
+            width = dtype[field].shape[0] if dtype[field].shape else 1
+            column = values[:, col : col + width]
+            array[field] = column if dtype[field].shape else column[:, 0]
+            col += width
+        out[name] = array
+        start = end
+        line_idx += count
+    return out
+
+
+def read_ply(path, mmap=True):
+    """ Reads a ply file. Binary elements are memory mapped straight into numpy structured arrays (no copy
+    and no per vertex parsing), ascii files go through the fast text parser.
+
+    Parameters
+    ----------
+    path : str
+        path to the ply file
+    mmap : bool, optional
+        If False, binary elements are read in memory instead of being memory mapped
+
+    Returns
+    -------
+    dict
+        structured array for each element (e.g. ``vertex`` and ``face``). Lists of constant length such as
+        triangular faces are returned as a ``(count, length)`` field
+    """
+    with open(path, "rb") as f:
+        fmt, elements, offset = parse_ply_header(f)
+        if fmt == "ascii":
+            return _read_ascii_elements(f.read(), elements)
+
+    out = {}
+    ext = PLY_FORMATS[fmt]
+    for name, count, properties in elements:
+        out[name], offset = _read_binary_element(path, offset, count, properties, ext, mmap)
+    return out
+
+
+def read_ply_fields(path, fields, element="vertex", dtype=np.float32):
+    """ Reads some fields of an element of a ply file into a [N, len(fields)] array
+    """
+    vertex = read_ply(path)[element]
+    out = np.empty((vertex.shape[0], len(fields)), dtype=dtype)
+    for i, field in enumerate(fields):
+        out[:, i] = vertex[field]
+    return out
+
+
+def write_ply(filename, field_list, field_names, triangular_faces=None, byte_order="=", element="vertex"):
+    """ Writes a binary ply file
+
+    Parameters
+    ----------
+    filename : str
+        the name of the file to which the data is saved. A '.ply' extension will be appended to the
+        file name if it does no already have one.
+    field_list : list, tuple, numpy array
+        the fields to be saved in the ply file. Either a numpy array, a list of numpy arrays or a
+        tuple of numpy arrays. Each 1D numpy array and each column of 2D numpy arrays are considered
+        as one field.
+    field_names : list
+        the name of each fields as a list of strings. Has to be the same length as the number of
+        fields.
+    triangular_faces : np.ndarray, optional
+        [F, 3] indices of the vertices of each face
+    byte_order : str, optional
+        ``<``, ``>`` or ``=`` for native
+    element : str, optional
+        name of the element holding the fields
+
+    Returns
+    -------
+    bool
+        False if the fields are inconsistent
+    """
+    field_list = list(field_list) if isinstance(field_list, (list, tuple)) else [field_list]
+    for i, field in enumerate(field_list):
+        field = np.asarray(field)
+        if field.ndim < 2:
+            field = field.reshape(-1, 1)
+        if field.ndim > 2:
+            log.info("fields have more than 2 dimensions")
+            return False
+        field_list[i] = field
+
+    n_points = [field.shape[0] for field in field_list]
+    if not np.all(np.equal(n_points, n_points[0])):
+        log.info("wrong field dimensions")
+        return False
+
+    n_fields = np.sum([field.shape[1] for field in field_list])
+    if n_fields != len(field_names):
+        log.info("wrong number of field names")
+        return False
+
+    if not filename.endswith(".ply"):
+        filename += ".ply"
+
+    if byte_order == "=":
+        byte_order = "<" if sys.byteorder == "little" else ">"
+
+    type_list = []
+    i = 0
+    for fields in field_list:
+        if fields.dtype.str[1:] not in PLY_TYPE_NAMES:
+            raise ValueError("Type %s can't be saved in a ply file" % fields.dtype)
+        for _ in range(fields.shape[1]):
+            type_list.append((field_names[i], byte_order + fields.dtype.str[1:]))
+            i += 1
+    data = np.empty(n_points[0], dtype=type_list)
+    i = 0
+    for fields in field_list:
+        for field in fields.T:
+            data[field_names[i]] = field
+            i += 1
+
+    header = ["ply", "format binary_{}_endian 1.0".format("little" if byte_order == "<" else "big")]
+    header.append("element {} {:d}".format(element, n_points[0]))
+    for name, dtype in type_list:
+        header.append("property {} {}".format(PLY_TYPE_NAMES[dtype[1:]], name))
+    if triangular_faces is not None:
+        header.append("element face {:d}".format(triangular_faces.shape[0]))
+        header.append("property list uchar int vertex_indices")
+    header.append("end_header")
+
+    with open(filename, "wb") as plyfile:
+        plyfile.write(("\n".join(header) + "\n").encode("ascii"))
+        data.tofile(plyfile)
+        if triangular_faces is not None:
+            faces = np.empty(
+                triangular_faces.shape[0], dtype=[("k", "u1"), ("vertex_indices", byte_order + "i4", (3,))]
+            )
+            faces["k"] = 3
+            faces["vertex_indices"] = triangular_faces
+            faces.tofile(plyfile)
+    return True
@@ -0,0 +1,86 @@
+import os
+import queue
+import logging
+import threading
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+
+class PredictionWriter:
+    """ Saves predictions on a background thread as soon as they are available, one ``.npy`` file
+    per input file. Files are written to a temporary name and renamed once complete so that an
+    interrupted run never leaves a truncated prediction behind, :meth:`exists` can be used to skip
+    the files that were already predicted.
+
+    Parameters
+    ----------
+    output_dir : str
+        Directory the predictions are written to
+    suffix : str, optional
+        Appended to the name of the input file (without its extension)
+    max_pending : int, optional
+        Maximum number of predictions waiting to be written, :meth:`write` blocks beyond that
+    """
+
+    _STOP = None
+
+    def __init__(self, output_dir, suffix="_pred", max_pending=16):
+        self.output_dir = output_dir
+        self.suffix = suffix
+        self.num_written = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        os.makedirs(output_dir, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="PredictionWriter", daemon=True)
+        self._thread.start()
+
+    def path(self, filename):
+        """ Path of the prediction of the input file ``filename``
+        """
+        return os.path.join(self.output_dir, os.path.splitext(os.path.basename(filename))[0] + self.suffix + ".npy")
+
+    def exists(self, filename):
+        return os.path.exists(self.path(filename))
+
+    def write(self, filename, prediction):
+        """ Schedules the writing of the prediction of ``filename``, the array must not be modified afterwards
+        """
+        self._raise_error()
+        self._queue.put((filename, prediction))
+
+    def close(self):
+        """ Waits until every prediction is written and stops the thread
+        """
+        if self._thread.is_alive():
+            self._queue.put(self._STOP)
+            self._thread.join()
+        self._raise_error()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("Prediction could not be written to {}".format(self.output_dir)) from error
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is self._STOP:
+                return
+            filename, prediction = item
+            path = self.path(filename)
+            tmp_path = "{}.{}.tmp".format(path, os.getpid())
+            try:
+                with open(tmp_path, "wb") as f:
+                    np.save(f, prediction)
+                os.replace(tmp_path, path)
+                self.num_written += 1
+            except Exception as e:
+                log.exception("Failed to write prediction %s", path)
+                self._error = e
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,242 @@
+import os
+import json
+import math
+import time
+import logging
+import numpy as np
+import torch
+from torch_geometric.transforms import Compose
+
+log = logging.getLogger(__name__)
+
+# Durations are accumulated in log spaced bins from 1us to 1000s
+_MIN_DURATION = 1e-6
+_BINS_PER_DECADE = 20
+_NUM_BINS = 9 * _BINS_PER_DECADE
+
+_ACTIVE_PROFILER = None
+
+
+class StageProfiler:
+    """ Low overhead profiler of the stages of a data and training pipeline. Durations are accumulated in
+    histograms held in shared memory, with one row per data loader worker so that the transforms and the
+    collate function that run in the workers are aggregated with the stages of the main process.
+    Percentiles are interpolated in the log spaced bins (about 6% resolution).
+
+    Stages must be registered (with :meth:`stage`, :meth:`wrap` or :meth:`wrap_transform`) before the data
+    loader workers are started.
+
+    Parameters
+    ----------
+    num_workers : int, optional
+        Number of data loader workers
+    max_stages : int, optional
+        Maximum number of stages
+    synchronize : bool, optional
+        Waits for the CUDA kernels at the end of each stage timed in the main process
+    """
+
+    def __init__(self, num_workers=0, max_stages=64, synchronize=False):
+        self.synchronize = synchronize
+        self._names = []
+        self._counts = torch.zeros((num_workers + 1, max_stages, _NUM_BINS), dtype=torch.float64).share_memory_()
+        self._totals = torch.zeros((num_workers + 1, max_stages), dtype=torch.float64).share_memory_()
+        self._history = []
+        self._set_views()
+
+    def _set_views(self):
+        # numpy views of the shared tensors, much cheaper to index than the tensors
+        self._counts_np = self._counts.numpy()
+        self._totals_np = self._totals.numpy()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_counts_np"], state["_totals_np"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._set_views()
+
+    @property
+    def stages(self):
+        return list(self._names)
+
+    def stage(self, name):
+        """ Index of the stage called ``name``, registered if needed
+        """
+        if name in self._names:
+            return self._names.index(name)
+        if len(self._names) == self._counts.shape[1]:
+            raise ValueError(
+                "Cannot register stage {}, the profiler is limited to {} stages".format(name, len(self._names))
+            )
+        self._names.append(name)
+        return len(self._names) - 1
+
+    def record(self, stage, duration):
+        """ Adds a duration in seconds to a stage (name or index)
+        """
+        if not isinstance(stage, int):
+            stage = self.stage(stage)
+        worker_info = torch.utils.data.get_worker_info()
+        row = 0 if worker_info is None else worker_info.id + 1
+        if duration > _MIN_DURATION:
+            b = min(int((math.log10(duration) - math.log10(_MIN_DURATION)) * _BINS_PER_DECADE), _NUM_BINS - 1)
+        else:
+            b = 0
+        self._counts_np[row, stage, b] += 1
+        self._totals_np[row, stage] += duration
+
+    def time(self, name):
+        """ Context manager timing a stage
+        """
+        return _StageTimer(self, self.stage(name))
+
+    def wrap(self, fn, name):
+        """ Callable that times each call of ``fn`` under ``name``, picklable if fn is
+        """
+        if isinstance(fn, ProfiledCall):
+            return fn
+        return ProfiledCall(fn, self, self.stage(name))
+
+    def wrap_transform(self, transform, prefix="transform"):
+        """ Times each transform of a ``Compose`` separately, stages are named after the class of the transforms
+        """
+        if transform is None or isinstance(transform, ProfiledCall):
+            return transform
+        if isinstance(transform, Compose):
+            wrapped = []
+            names = set()
+            for t in transform.transforms:
+                base_name = "{}/{}".format(prefix, t.__class__.__name__)
+                name, suffix = base_name, 1
+                while name in names:
+                    suffix += 1
+                    name = "{}_{}".format(base_name, suffix)
+                names.add(name)
+                wrapped.append(self.wrap(t, name))
+            return Compose(wrapped)
+        return self.wrap(transform, "{}/{}".format(prefix, transform.__class__.__name__))
+
+    def reset(self):
+        self._counts.zero_()
+        self._totals.zero_()
+
+    def summary(self, percentiles=(50, 90, 99)):
+        """ Statistics of the stages recorded since the last reset, durations in milliseconds
+
+        Returns
+        -------
+        dict
+            For each stage with at least one record: count, total, mean and the percentiles (``p50``...)
+        """
+        counts = self._counts_np.sum(0)
+        totals = self._totals_np.sum(0)
+        edges = _MIN_DURATION * 10 ** (np.arange(_NUM_BINS + 1) / _BINS_PER_DECADE)
+        summary = {}
+        for i, name in enumerate(self._names):
+            count = counts[i].sum()
+            if count == 0:
+                continue
+            stats = {"count": int(count), "total": totals[i] * 1e3, "mean": totals[i] / count * 1e3}
+            cumulative = np.cumsum(counts[i])
+            for p in percentiles:
+                target = p / 100.0 * count
+                b = int(np.searchsorted(cumulative, target))
+                before = cumulative[b - 1] if b > 0 else 0
+                fraction = (target - before) / counts[i, b]
+                # Log linear interpolation in the bin
+                stats["p{}".format(p)] = edges[b] * (edges[b + 1] / edges[b]) ** fraction * 1e3
+            summary[name] = stats
+        return summary
+
+    def publish(self, epoch, stage, tracker=None, path=None):
+        """ Publishes the summary of an epoch to the tracker and appends it to a JSON file, then resets the profiler
+        """
+        summary = self.summary()
+        if tracker is not None:
+            tracker.publish_profile(summary, epoch)
+        if path is not None:
+            self._history.append({"epoch": epoch, "stage": stage, "stages": summary})
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self._history, f, indent=1)
+            os.replace(tmp_path, path)
+        if len(summary):
+            log.info(
+                "Profile of %s: %s",
+                stage,
+                ", ".join(
+                    "{} {:.2f}ms (p90 {:.2f}ms)".format(name, s["mean"], s["p90"])
+                    for name, s in sorted(summary.items(), key=lambda item: -item[1]["total"])
+                ),
+            )
+        self.reset()
+        return summary
+
+
+class ProfiledCall:
+    """ Callable timing each call of the wrapped function or transform
+    """
+
+    def __init__(self, fn, profiler, stage_index):
+        self.fn = fn
+        self.profiler = profiler
+        self.stage_index = stage_index
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        out = self.fn(*args, **kwargs)
+        self.profiler.record(self.stage_index, time.perf_counter() - start)
+        return out
+
+    def __repr__(self):
+        return repr(self.fn)
+
+
+class _StageTimer:
+    __slots__ = ["profiler", "stage_index", "start"]
+
+    def __init__(self, profiler, stage_index):
+        self.profiler = profiler
+        self.stage_index = stage_index
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        if self.profiler.synchronize:
+            torch.cuda.synchronize()
+        self.profiler.record(self.stage_index, time.perf_counter() - self.start)
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def set_profiler(profiler):
+    """ Sets the profiler used by :func:`profile_stage`, None disables profiling
+    """
+    global _ACTIVE_PROFILER
+    _ACTIVE_PROFILER = profiler
+
+
+def get_profiler():
+    return _ACTIVE_PROFILER
+
+
+def profile_stage(name):
+    """ Context manager timing a stage with the active profiler, does nothing when profiling is disabled
+    """
+    if _ACTIVE_PROFILER is None:
+        return _NULL_TIMER
+    return _ACTIVE_PROFILER.time(name)
@@ -21,10 +21,29 @@ from torch_points3d.metrics.model_checkpoint import ModelCheckpoint
 # Utils import
 from torch_points3d.utils.colors import COLORS
 from torch_points3d.utils.config import launch_wandb
+from torch_points3d.utils.profiler import StageProfiler, set_profiler, get_profiler, profile_stage
+from torch_points3d.utils.distributed import init_distributed, get_local_rank, is_main_process, broadcast_module
 from torch_points3d.visualization import Visualizer
 
 log = logging.getLogger(__name__)
 
+PROFILE_FILE = "profile.json"
+# Metrics shown in the progress bars are refreshed every few iterations, computing them copies them to the host
+METRICS_REFRESH_ITERATIONS = 10
+
+
+def _reset_profile():
+    profiler = get_profiler()
+    if profiler is not None:
+        profiler.reset()
+
+
+def _publish_profile(epoch, stage, tracker):
+    profiler = get_profiler()
+    if profiler is not None:
+        path = os.path.join(os.getcwd(), PROFILE_FILE) if is_main_process() else None
+        profiler.publish(epoch, stage, tracker, path)
+
 
 def train_epoch(
     epoch: int,
@@ -44,19 +63,26 @@ def train_epoch(
     tracker.reset("train")
     visualizer.reset(epoch, "train")
     train_loader = dataset.train_dataloader
+    _reset_profile()
 
     iter_data_time = time.time()
     with Ctq(train_loader) as tq_train_loader:
         for i, data in enumerate(tq_train_loader):
             t_data = time.time() - iter_data_time
+            if get_profiler() is not None:
+                get_profiler().record("data_loading", t_data)
             iter_start_time = time.time()
-            model.set_input(data, device)
-            model.optimize_parameters(epoch, dataset.batch_size)
-            if i % 10 == 0:
-                tracker.track(model)
+            num_samples = dataset.get_batch_num_samples(data)
+            with profile_stage("set_input"):
+                model.set_input(data, device)
+            model.optimize_parameters(epoch, num_samples)
+            if i % METRICS_REFRESH_ITERATIONS == 0:
+                with profile_stage("track"):
+                    tracker.track(model)
+                metrics = tracker.get_metrics()
 
             tq_train_loader.set_postfix(
-                **tracker.get_metrics(),
+                **metrics,
                 data_loading=float(t_data),
                 iteration=float(time.time() - iter_start_time),
                 color=COLORS.TRAIN_COLOR
@@ -74,8 +100,11 @@ def train_epoch(
                 if i > getattr(debugging, "num_batches", 50):
                     return 0
 
+    # Running statistics of the batch norms are taken from the main process, as DistributedDataParallel does
+    broadcast_module(model, buffers_only=True)
     tracker.finalise()
     metrics = tracker.publish(epoch)
+    _publish_profile(epoch, "train", tracker)
     checkpoint.save_best_models_under_current_metrics(model, metrics, tracker.metric_func)
     log.info("Learning rate = %f" % model.learning_rate)
 
@@ -97,14 +126,19 @@ def eval_epoch(
     tracker.reset("val")
     visualizer.reset(epoch, "val")
     loader = dataset.val_dataloader
+    _reset_profile()
     with Ctq(loader) as tq_val_loader:
-        for data in tq_val_loader:
+        for i, data in enumerate(tq_val_loader):
             with torch.no_grad():
-                model.set_input(data, device)
-                model.forward()
+                with profile_stage("set_input"):
+                    model.set_input(data, device)
+                with profile_stage("forward"):
+                    model.forward()
 
-            tracker.track(model)
-            tq_val_loader.set_postfix(**tracker.get_metrics(), color=COLORS.VAL_COLOR)
+            with profile_stage("track"):
+                tracker.track(model)
+            if i % METRICS_REFRESH_ITERATIONS == 0:
+                tq_val_loader.set_postfix(**tracker.get_metrics(), color=COLORS.VAL_COLOR)
 
             if visualizer.is_active:
                 visualizer.save_visuals(model.get_current_visuals())
@@ -114,6 +148,7 @@ def eval_epoch(
 
     tracker.finalise()
     metrics = tracker.publish(epoch)
+    _publish_profile(epoch, "val", tracker)
     tracker.print_summary()
     checkpoint.save_best_models_under_current_metrics(model, metrics, tracker.metric_func)
 
@@ -137,14 +172,19 @@ def test_epoch(
         stage_name = loader.dataset.name
         tracker.reset(stage_name)
         visualizer.reset(epoch, stage_name)
+        _reset_profile()
         with Ctq(loader) as tq_test_loader:
-            for data in tq_test_loader:
+            for i, data in enumerate(tq_test_loader):
                 with torch.no_grad():
-                    model.set_input(data, device)
-                    model.forward()
+                    with profile_stage("set_input"):
+                        model.set_input(data, device)
+                    with profile_stage("forward"):
+                        model.forward()
 
-                tracker.track(model)
-                tq_test_loader.set_postfix(**tracker.get_metrics(), color=COLORS.TEST_COLOR)
+                with profile_stage("track"):
+                    tracker.track(model)
+                if i % METRICS_REFRESH_ITERATIONS == 0:
+                    tq_test_loader.set_postfix(**tracker.get_metrics(), color=COLORS.TEST_COLOR)
 
                 if visualizer.is_active:
                     visualizer.save_visuals(model.get_current_visuals())
@@ -154,6 +194,7 @@ def test_epoch(
 
         tracker.finalise()
         metrics = tracker.publish(epoch)
+        _publish_profile(epoch, stage_name, tracker)
         tracker.print_summary()
         checkpoint.save_best_models_under_current_metrics(model, metrics, tracker.metric_func)
 
@@ -166,6 +207,7 @@ def run(
 
     for epoch in range(checkpoint.start_epoch, cfg.training.epochs):
         log.info("EPOCH %i / %i", epoch, cfg.training.epochs)
+        dataset.set_epoch(epoch)
         train_epoch(epoch, model, dataset, device, tracker, checkpoint, visualizer, cfg.debugging)
         if profiling:
             return 0
@@ -180,6 +222,9 @@ def run(
         if dataset.has_test_loaders:
             test_epoch(epoch, model, dataset, device, tracker, checkpoint, visualizer, cfg.debugging)
 
+    # Checkpoints are written in the background
+    checkpoint.flush()
+
 
 @hydra.main(config_path="conf/config.yaml")
 def main(cfg):
@@ -189,6 +234,18 @@ def main(cfg):
 
     # Get device
     device = torch.device("cuda" if (torch.cuda.is_available() and cfg.training.cuda) else "cpu")
+
+    # Distributed training, one process per device when started by torch_points3d.utils.distributed
+    distributed_opt = getattr(cfg.training, "distributed", None)
+    backend = getattr(distributed_opt, "backend", None)
+    if init_distributed(backend or ("nccl" if device.type == "cuda" else "gloo")):
+        if device.type == "cuda":
+            device = torch.device("cuda", get_local_rank())
+            torch.cuda.set_device(device)
+        # Only the main process logs to wandb, tensorboard and saves visuals
+        cfg.wandb.log = cfg.wandb.log and is_main_process()
+        cfg.tensorboard.log = cfg.tensorboard.log and is_main_process()
+        cfg.visualization.activate = cfg.visualization.activate and is_main_process()
     log.info("DEVICE : {}".format(device))
 
     # Enable CUDNN BACKEND
@@ -234,6 +291,13 @@ def main(cfg):
     )
     log.info(dataset)
 
+    # Per stage timings of the data pipeline and of the training loop
+    if getattr(cfg.debugging, "stage_profiling", False):
+        profiler = StageProfiler(cfg.training.num_workers, synchronize=device.type == "cuda")
+        dataset.set_profiler(profiler)
+        set_profiler(profiler)
+        log.info("Stage timings are saved in %s", os.path.join(os.getcwd(), PROFILE_FILE))
+
     # Choose selection stage
     selection_stage = getattr(cfg, "selection_stage", "")
     checkpoint.selection_stage = dataset.resolve_saving_stage(selection_stage)
@@ -243,6 +307,7 @@ def main(cfg):
 
     # Run training / evaluation
     model = model.to(device)
+    broadcast_module(model)  # all the processes start from the weights of the main process
     visualizer = Visualizer(cfg.visualization, dataset.num_batches, dataset.batch_size, os.getcwd())
     run(cfg, model, dataset, device, tracker, checkpoint, visualizer)
 